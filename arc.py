@@ -1,36 +1,984 @@
 import sys
-from PyQt6.QtWidgets import (
-    QApplication, 
-    QWidget, 
-    QPushButton, 
-    QLabel, 
-    QLineEdit, 
-    QTreeWidget, 
-    QTreeWidgetItem, 
-    QFileDialog,
-    QMessageBox,
-    QInputDialog,
-    QProgressBar,
-    QHeaderView,
-    QHBoxLayout,
-    QVBoxLayout
-)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
-from PyQt6.QtGui import QIcon
 import os
-import py7zr
+import argparse
+import re
+import time
+import array
 import zipfile
-import rarfile
-import tarfile
+import zlib
+import struct
+import copy
+import io
+import errno
+import mmap
+import json
+import base64
+import hashlib
+import queue
+import tempfile
+import threading
+import heapq
+import bisect
+import collections
+import contextlib
+import functools
+import itertools
+import importlib
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
 import gzip
 import bz2
-import keyring
+from stat import S_IFDIR, S_IFLNK, S_IFREG, S_IMODE, S_ISLNK
 from abc import ABC, abstractmethod  # Import abstractmethod
 
+
+class LazyModule:
+    # Stands in for a module that is imported on first attribute lookup, so
+    # a backend's import cost is only paid once an archive needs it.
+    def __init__(self, name):
+        self.module_name = name
+
+    def __getattr__(self, attribute):
+        return getattr(importlib.import_module(self.module_name), attribute)
+
+
+rarfile = LazyModule('rarfile')
+tarfile = LazyModule('tarfile')
+multiprocessing = LazyModule('multiprocessing')
+lzma = LazyModule('lzma')
+
+LISTING_CACHE_VERSION = 3
+LISTING_CACHE_BUDGET = 256 * 1024 * 1024
+LISTING_CACHE_FILES = 256
+
+
+class ListingCache:
+    # Archive listings keyed by (path, size, mtime, inode), held in an LRU
+    # bounded by an estimate of their memory use and written to one JSON file
+    # per archive so reopening an archive seen before skips parsing it. Each
+    # listing records the format it was read as.
+    def __init__(self, directory, budget=LISTING_CACHE_BUDGET, max_files=LISTING_CACHE_FILES):
+        self.directory = directory
+        self.budget = budget
+        self.max_files = max_files
+        self.entries = collections.OrderedDict()
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def key(self, filename):
+        stat = os.stat(filename)
+        return [os.path.realpath(filename), stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+    def path(self, realpath):
+        return os.path.join(self.directory, hashlib.sha1(realpath.encode('utf-8', 'surrogateescape')).hexdigest() + '.json')
+
+    def get(self, filename, format=None):
+        key = self.key(filename)
+        with self.lock:
+            entry = self.entries.get(key[0])
+            if entry is not None and entry[0] == key and format in (None, entry[3]):
+                self.entries.move_to_end(key[0])
+                return entry[1]
+        try:
+            with open(self.path(key[0])) as f:
+                stored = json.load(f)
+            if (stored['version'], stored['key']) != (LISTING_CACHE_VERSION, key):
+                return None
+            if format not in (None, stored['format']):
+                return None
+            listing = [tuple(member) for member in stored['members']]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        self.remember(key, listing, stored['format'])
+        return listing
+
+    def format(self, filename):
+        # Only the in-memory entries are consulted: a header read is cheaper
+        # than loading a listing file just for this.
+        key = self.key(filename)
+        with self.lock:
+            entry = self.entries.get(key[0])
+            return entry[3] if entry is not None and entry[0] == key else None
+
+    def put(self, filename, listing, format=None):
+        key = self.key(filename)
+        listing = list(listing)
+        self.remember(key, listing, format)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.path(key[0])
+            with open(path + '.temp', 'w') as f:
+                json.dump({'version': LISTING_CACHE_VERSION, 'key': key, 'format': format, 'members': listing}, f)
+            os.replace(path + '.temp', path)
+            self.prune()
+        except OSError:
+            pass
+
+    def discard(self, filename):
+        realpath = os.path.realpath(filename)
+        with self.lock:
+            entry = self.entries.pop(realpath, None)
+            if entry is not None:
+                self.used -= entry[2]
+        try:
+            os.remove(self.path(realpath))
+        except OSError:
+            pass
+
+    def remember(self, key, listing, format=None):
+        cost = sum(len(member[0]) + 100 for member in listing)
+        with self.lock:
+            entry = self.entries.pop(key[0], None)
+            if entry is not None:
+                self.used -= entry[2]
+            if cost > self.budget:
+                return
+            self.entries[key[0]] = (key, listing, cost, format)
+            self.used += cost
+            while self.used > self.budget:
+                _, (_, _, evicted, _) = self.entries.popitem(last=False)
+                self.used -= evicted
+
+    def prune(self):
+        prune_cache_dir(self.directory, self.max_files)
+
+
+def prune_cache_dir(directory, max_files):
+    # Keeps the `max_files` most recently written .json files.
+    files = [entry for entry in os.scandir(directory) if entry.name.endswith('.json')]
+    if len(files) <= max_files:
+        return
+    files.sort(key=lambda entry: entry.stat().st_mtime_ns)
+    for entry in files[:len(files) - max_files]:
+        os.remove(entry.path)
+
+
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'arc')
+LISTING_CACHE = ListingCache(os.path.join(CACHE_DIR, 'listings'))
+
+
+PROGRESS_INTERVAL = 0.1
+
+
+class TransferMetrics:
+    # Byte counts and timings for one operation. Handlers report bytes read
+    # from the archive (`bytes_in`) and bytes written out (`bytes_out`), and
+    # progress is emitted against whichever side `total` was measured on, so
+    # one large member moves the bar while it is being decoded.
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.total = 0
+        self.basis = 'out'
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.phases = collections.defaultdict(float)
+        self.members = []
+        self.name = ""
+        self.started = time.perf_counter()
+        self.finished = None
+        self.last_report = 0.0
+
+    def begin(self, total, basis='out'):
+        self.total = total
+        self.basis = basis
+        self.started = time.perf_counter()
+
+    def advance(self, bytes_out=0, bytes_in=0):
+        with self.lock:
+            self.bytes_out += bytes_out
+            self.bytes_in += bytes_in
+            now = time.perf_counter()
+            if now - self.last_report < PROGRESS_INTERVAL:
+                return
+            self.last_report = now
+        self.report()
+
+    def report(self):
+        if self.callback is not None:
+            self.callback.emit(self.done(), self.total, self.name)
+
+    def done(self):
+        # Read-ahead can reach the end of the input before the last bytes
+        # are out; completion is only reported by finish().
+        done = self.bytes_out if self.basis == 'out' else self.bytes_in
+        return min(done, max(self.total - 1, 0))
+
+    def finish(self):
+        self.finished = time.perf_counter()
+        if self.callback is not None:
+            self.callback.emit(self.total, self.total, self.name)
+
+    def start_member(self, name):
+        self.name = name
+
+    def end_member(self, name, seconds, bytes_in, bytes_out):
+        with self.lock:
+            self.members.append((name, seconds, bytes_in, bytes_out))
+
+    @contextlib.contextmanager
+    def member(self, name):
+        self.start_member(name)
+        started = time.perf_counter()
+        bytes_in, bytes_out = self.bytes_in, self.bytes_out
+        yield
+        self.end_member(name, time.perf_counter() - started, self.bytes_in - bytes_in, self.bytes_out - bytes_out)
+        self.advance()
+
+    @contextlib.contextmanager
+    def timed(self, phase):
+        # Phases nest exclusively: time spent in an inner phase (a read
+        # inside a decode) is not counted again in the outer one.
+        stack = self.local.__dict__.setdefault('stack', [])
+        stack.append(0.0)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            inner = stack.pop()
+            with self.lock:
+                self.phases[phase] += elapsed - inner
+            if stack:
+                stack[-1] += elapsed
+
+    def add_phases(self, phases):
+        with self.lock:
+            for phase, seconds in phases.items():
+                self.phases[phase] += seconds
+
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def rate(self):
+        elapsed = self.elapsed()
+        done = self.bytes_out if self.basis == 'out' else self.bytes_in
+        return done / elapsed if elapsed > 0 else 0.0
+
+    def eta(self):
+        rate = self.rate()
+        if not rate or not self.total:
+            return None
+        return max(self.total - self.done(), 0) / rate
+
+    def trace(self):
+        elapsed = self.elapsed()
+        return {
+            'elapsed': elapsed,
+            'total': self.total,
+            'basis': self.basis,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'rate_in': self.bytes_in / elapsed if elapsed > 0 else 0.0,
+            'rate_out': self.bytes_out / elapsed if elapsed > 0 else 0.0,
+            'phases': dict(self.phases),
+            'members': [
+                {'name': name, 'seconds': seconds, 'bytes_in': bytes_in, 'bytes_out': bytes_out}
+                for name, seconds, bytes_in, bytes_out in self.members
+            ],
+        }
+
+    def dump(self, path, **fields):
+        trace = dict(fields)
+        trace.update(self.trace())
+        with open(path, 'w') as f:
+            json.dump(trace, f, indent=1)
+
+
+class QueueMetrics(TransferMetrics):
+    # TransferMetrics for a pool worker: counts are batched and posted to
+    # `progress` for the parent's metrics to fold in. Once the parent sets
+    # `abort`, the next report stops the worker.
+    def __init__(self, progress, abort=None):
+        super().__init__()
+        self.progress = progress
+        self.abort = abort
+        self.sent_in = 0
+        self.sent_out = 0
+
+    def report(self):
+        if self.abort is not None and self.abort.is_set():
+            raise OperationCancelled()
+        self.progress.put(('bytes', self.name, self.bytes_out - self.sent_out, self.bytes_in - self.sent_in))
+        self.sent_in = self.bytes_in
+        self.sent_out = self.bytes_out
+
+    def end_member(self, name, seconds, bytes_in, bytes_out):
+        self.report()
+        self.progress.put(('member', name, seconds, bytes_in, bytes_out))
+
+    def close(self):
+        self.report()
+        self.progress.put(('closed', dict(self.phases)))
+
+
+def transfer_metrics(callback):
+    # Jobs carry their own metrics; any other progress callback gets a
+    # fresh set.
+    if isinstance(callback, TransferMetrics):
+        return callback
+    metrics = getattr(callback, 'metrics', None)
+    return metrics if metrics is not None else TransferMetrics(callback)
+
+
+class MeteredReader(io.RawIOBase):
+    # Counts the bytes read from an archive file, and the time spent
+    # reading them, into `metrics`.
+    def __init__(self, raw, metrics):
+        self.raw = raw
+        self.metrics = metrics
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return self.raw.seekable()
+
+    def readinto(self, b):
+        with self.metrics.timed('read'):
+            n = self.raw.readinto(b)
+        self.metrics.advance(bytes_in=n or 0)
+        return n
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self.raw.seek(offset, whence)
+
+    def tell(self):
+        return self.raw.tell()
+
+
+class MappedMember(io.RawIOBase):
+    # Reader over `length` bytes stored as-is at `offset` in a file. The
+    # range is memory-mapped, so only the pages actually read are loaded.
+    def __init__(self, filename, offset, length):
+        self.length = length
+        self.position = 0
+        self.map = None
+        self.mapped = self.view = memoryview(b"")
+        if length:
+            start = offset - offset % mmap.ALLOCATIONGRANULARITY
+            with open(filename, 'rb') as f:
+                self.map = mmap.mmap(f.fileno(), offset + length - start, offset=start, access=mmap.ACCESS_READ)
+            self.mapped = memoryview(self.map)
+            self.view = self.mapped[offset - start:offset - start + length]
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = max(0, min(len(b), self.length - self.position))
+        b[:n] = self.view[self.position:self.position + n]
+        self.position += n
+        return n
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += self.length
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self.position = offset
+        return offset
+
+    def close(self):
+        if self.map is not None:
+            self.view.release()
+            self.mapped.release()
+            self.map.close()
+            self.map = None
+        super().close()
+
+
+class MemberStream(io.RawIOBase):
+    # Seekable reader over a member that can only be decoded front to back.
+    # `opener(stack)` opens it from the start and registers whatever it had
+    # to open on the ExitStack. Seeking forward decodes and drops the bytes
+    # in between; seeking back starts over.
+    def __init__(self, opener, size=None):
+        self.opener = opener
+        self.size = size
+        self.stack = None
+        self.restart()
+
+    def restart(self):
+        if self.stack is not None:
+            self.stack.close()
+        self.stack = contextlib.ExitStack()
+        try:
+            self.stream = self.opener(self.stack)
+        except BaseException:
+            self.stack.close()
+            raise
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        data = self.stream.read(len(b))
+        n = len(data)
+        b[:n] = data
+        self.position += n
+        return n
+
+    def tell(self):
+        return self.position
+
+    def skip(self, offset):
+        while offset is None or self.position < offset:
+            data = self.stream.read(COPY_CHUNK_SIZE if offset is None else min(COPY_CHUNK_SIZE, offset - self.position))
+            if not data:
+                return
+            self.position += len(data)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            if self.size is None:
+                # Only known once the whole member has been decoded.
+                self.skip(None)
+                self.size = self.position
+            offset += self.size
+        if offset < 0:
+            raise ValueError("negative seek position")
+        if offset < self.position:
+            self.restart()
+        self.skip(offset)
+        return self.position
+
+    def close(self):
+        if self.stack is not None:
+            self.stack.close()
+            self.stack = None
+        super().close()
+
+
+# Chunks a pipe between two threads holds before the writer has to wait.
+PIPE_DEPTH = 16
+
+
+class PipeReader(io.BufferedIOBase):
+    # Reading end of a pipe of chunks that ends with None. If the writer
+    # failed, its error (`source.error`) is raised at the end. writef() and
+    # the like size their input with seek(0, SEEK_END)/tell(), so `size` is
+    # reported that way; the data itself can only be read forward.
+    def __init__(self, name, size, chunks, source):
+        self.name = name
+        self.expected_size = size
+        self.chunks = chunks
+        self.source = source
+        self.pending = memoryview(b"")
+        self.position = 0
+        self.eof = False
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_END:
+            self.position = self.expected_size + offset
+        elif whence == os.SEEK_SET:
+            self.position = offset
+        else:
+            self.position += offset
+        return self.position
+
+    def read(self, size=-1):
+        parts = []
+        count = 0
+        while size is None or size < 0 or count < size:
+            if not len(self.pending):
+                if self.eof:
+                    break
+                chunk = self.chunks.get()
+                if chunk is None:
+                    self.eof = True
+                    if self.source.error is not None:
+                        raise self.source.error
+                    break
+                self.pending = memoryview(chunk)
+            n = len(self.pending) if size is None or size < 0 else min(len(self.pending), size - count)
+            parts.append(self.pending[:n].tobytes())
+            self.pending = self.pending[n:]
+            count += n
+        return b"".join(parts)
+
+
+# What a member is, as far as converting it to another format goes. `kind`
+# is 'file', 'dir' or 'link' (a symlink, whose data is its target); `mtime`
+# is seconds since the epoch and `mode` the permission bits, either of them
+# None when the source format does not record it.
+ArchiveMember = collections.namedtuple('ArchiveMember', 'name size mtime mode kind')
+
+MEMBER_KINDS = {'file': (S_IFREG, 0o644), 'dir': (S_IFDIR, 0o755), 'link': (S_IFLNK, 0o777)}
+
+
+def member_mode(member):
+    # st_mode for `member`, with the usual permissions when it has none.
+    kind, default = MEMBER_KINDS[member.kind]
+    return kind | (default if member.mode is None else S_IMODE(member.mode))
+
+
+def zip_date_time(mtime):
+    date_time = time.localtime(time.time() if mtime is None else mtime)[:6]
+    return min(max(date_time, (1980, 1, 1, 0, 0, 0)), (2107, 12, 31, 23, 59, 58))
+
+
+class MemberPipe:
+    # Runs a handler's read_members() on a thread of its own and hands the
+    # members on as PipeReaders, so the source decodes while the target
+    # encodes. At most PIPE_DEPTH chunks are in flight. With `sized`, members
+    # of unknown size are measured first (a separate decoding pass) for
+    # targets that need the size up front.
+    def __init__(self, handler, metrics, sized=False):
+        self.handler = handler
+        self.metrics = metrics
+        self.sized = sized
+        self.chunks = queue.Queue(maxsize=PIPE_DEPTH)
+        self.abort = threading.Event()
+        self.error = None
+
+    def put(self, item):
+        while not self.abort.is_set():
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def run(self):
+        # Every member is sent as the ArchiveMember, its chunks and a None;
+        # one more None ends the lot (two after an error, in case it cut a
+        # member short).
+        members = self.handler.read_members()
+        try:
+            for member, stream in members:
+                if member.size is None and member.kind == 'file' and self.sized:
+                    with self.handler.open_member(member.name) as measured:
+                        member = member._replace(size=measured.seek(0, os.SEEK_END))
+                if not self.put(member):
+                    return
+                while stream is not None:
+                    with self.metrics.timed('decode'):
+                        chunk = stream.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if not self.put(chunk):
+                        return
+                    self.metrics.advance(bytes_out=len(chunk))
+                if not self.put(None):
+                    return
+        except Exception as e:
+            self.error = e
+            self.put(None)
+        finally:
+            members.close()
+        self.put(None)
+
+    def __iter__(self):
+        reader = threading.Thread(target=self.run, daemon=True)
+        reader.start()
+        try:
+            for member in iter(self.chunks.get, None):
+                pipe = PipeReader(member.name, member.size, self.chunks, self)
+                yield member, pipe
+                while not pipe.eof:
+                    pipe.read(COPY_CHUNK_SIZE)
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.abort.set()
+            reader.join()
+
+
+class ArchiveTransaction:
+    # Collects edits against the archive as it is now and applies them all
+    # with a single commit, so N edits cost one rewrite instead of N.
+    def __init__(self, handler):
+        self.handler = handler
+        self.files_to_delete = set()
+        self.renames = {}
+        # New name -> archive name, for every queued rename.
+        self.renamed_from = {}
+        self.files_to_add = []
+        self.arcnames = []
+        self.added_names = set()
+        self.passwords = {}
+        self.archive_names = None
+
+    def _original_name(self, name):
+        return self.renamed_from.get(name, name)
+
+    def _taken(self, name):
+        # Whether a member is called `name` once the queued edits are made.
+        # The archive is only listed when this is first asked.
+        if name in self.renamed_from or name in self.added_names:
+            return True
+        if self.archive_names is None:
+            self.archive_names = {member[0] for member in self.handler.file_list()}
+        return name in self.archive_names and name not in self.files_to_delete and name not in self.renames
+
+    def _drop_add(self, arcname):
+        kept = [(file_path, name) for file_path, name in zip(self.files_to_add, self.arcnames) if name != arcname]
+        self.files_to_add = [file_path for file_path, _ in kept]
+        self.arcnames = [name for _, name in kept]
+        self.added_names.discard(arcname)
+
+    def delete(self, files_to_delete):
+        for name in files_to_delete:
+            if name in self.added_names:
+                # Deleting a file queued for adding just drops the add, unless
+                # the archive still has a member of that name as well.
+                self._drop_add(name)
+                if not self._taken(name):
+                    continue
+            name = self._original_name(name)
+            new_name = self.renames.pop(name, None)
+            if new_name is not None:
+                del self.renamed_from[new_name]
+            self.passwords.pop(name, None)
+            self.files_to_delete.add(name)
+
+    def rename(self, old_name, new_name):
+        if new_name != old_name and self._taken(new_name):
+            raise ValueError(f"{new_name} already exists")
+        if old_name in self.added_names:
+            self.arcnames = [new_name if name == old_name else name for name in self.arcnames]
+            self.added_names.discard(old_name)
+            self.added_names.add(new_name)
+            return
+        old_name = self._original_name(old_name)
+        previous = self.renames.pop(old_name, None)
+        if previous is not None:
+            del self.renamed_from[previous]
+        if old_name != new_name:
+            self.renames[old_name] = new_name
+            self.renamed_from[new_name] = old_name
+
+    def add(self, files_to_add, arcnames=None):
+        arcnames = arcnames or [os.path.basename(file_path) for file_path in files_to_add]
+        self.files_to_add.extend(files_to_add)
+        self.arcnames.extend(arcnames)
+        self.added_names.update(arcnames)
+
+    def encrypt(self, passwords):
+        for name, password in passwords.items():
+            self.passwords[self._original_name(name)] = password
+
+    def __len__(self):
+        return (len(self.files_to_delete) + len(self.renames)
+                + len(self.files_to_add) + len(self.passwords))
+
+    def commit(self):
+        if len(self):
+            self.handler.apply_edit(
+                functools.partial(
+                    self.handler.commit_edits,
+                    files_to_delete=self.files_to_delete,
+                    renames=self.renames,
+                    files_to_add=self.files_to_add,
+                    passwords=self.passwords,
+                    arcnames=self.arcnames,
+                ),
+                files_to_delete=self.files_to_delete,
+                renames=self.renames,
+                files_to_add=self.files_to_add,
+                passwords=self.passwords,
+                arcnames=self.arcnames,
+            )
+        self.__init__(self.handler)
+
+
+class OperationCancelled(Exception):
+    # Raised from a progress callback to stop the operation it is reporting
+    # on; unlike other errors it is never recorded and carried on from.
+    pass
+
+
+class NullSink(io.RawIOBase):
+    # Write-only file that keeps nothing but a count, for decoding archives
+    # just to check them.
+    def __init__(self):
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        n = len(b)
+        self.position += n
+        return n
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self.position = offset
+        return offset
+
+    def truncate(self, size=None):
+        return self.position
+
+
+def read_to_end(stream, metrics):
+    # Decodes `stream` into nothing; returns how many bytes came out.
+    total = 0
+    while True:
+        with metrics.timed('decode'):
+            chunk = stream.read(COPY_CHUNK_SIZE)
+        if not chunk:
+            return total
+        total += len(chunk)
+        metrics.advance(bytes_out=len(chunk))
+
+
+class TestReport:
+    # What test_archive() found: a status per member ('ok', 'failed', or
+    # 'skipped' for members that could not be checked) plus the run's
+    # throughput. as_dict() is its JSON form.
+    def __init__(self, filename, format, metrics):
+        self.filename = filename
+        self.format = format
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.members = []
+        # Set when the archive as a whole could not be read.
+        self.error = None
+
+    def record(self, name, status, size=0, seconds=0.0, error=None):
+        with self.lock:
+            self.members.append((name, status, size, seconds, None if error is None else str(error)))
+
+    def run(self, name, test):
+        # Calls `test()`, which returns the bytes it decoded, and records
+        # how it went.
+        started = time.perf_counter()
+        try:
+            size = test()
+        except OperationCancelled:
+            raise
+        except Exception as e:
+            self.record(name, 'failed', 0, time.perf_counter() - started, e)
+        else:
+            self.record(name, 'ok', size, time.perf_counter() - started)
+
+    @property
+    def ok(self):
+        return self.error is None and all(status != 'failed' for _, status, _, _, _ in self.members)
+
+    def count(self, status):
+        return sum(1 for member in self.members if member[1] == status)
+
+    def failures(self):
+        failures = [(name, error) for name, status, _, _, error in self.members if status == 'failed']
+        if self.error is not None:
+            failures.append((None, self.error))
+        return failures
+
+    def as_dict(self):
+        trace = self.metrics.trace()
+        return {
+            'archive': self.filename,
+            'format': self.format,
+            'ok': self.ok,
+            'error': self.error,
+            'elapsed': trace['elapsed'],
+            'bytes_in': trace['bytes_in'],
+            'bytes_out': trace['bytes_out'],
+            'rate': trace['rate_out'],
+            'members': [
+                {'name': name, 'status': status, 'bytes': size, 'seconds': seconds,
+                 'rate': size / seconds if seconds > 0 else None, 'error': error}
+                for name, status, size, seconds, error in self.members
+            ],
+        }
+
+
 class ArchiveHandler:
+    # The ARCHIVE_HANDLERS name of the format, recorded with cached listings.
+    format = None
+    # Threads test_archive() decodes members on when it is not handed a
+    # pool (None: one per CPU).
+    test_workers = None
+    # Whether write_members() has to know every member's size before its
+    # data arrives.
+    write_needs_sizes = False
+    # How far apart (in seconds) a member's recorded mtime and the file's
+    # may be for sync() to take them as the same.
+    mtime_resolution = 1
+
     def __init__(self, filename):
         self.filename = filename
 
+    def begin_edit(self):
+        return ArchiveTransaction(self)
+
+    def file_list(self):
+        listing = LISTING_CACHE.get(self.filename, self.format)
+        if listing is None:
+            listing = [tuple(member) for member in self.get_file_list()]
+            LISTING_CACHE.put(self.filename, listing, self.format)
+        return listing
+
+    def iter_file_list(self):
+        # get_file_list() as a generator. Handlers whose reader walks the
+        # archive member by member override it, so a listing can be shown
+        # while it is still being read.
+        yield from self.get_file_list()
+
+    def file_list_chunks(self, chunk_size):
+        # file_list() in chunks of at most chunk_size members, each handed
+        # on once it is full or has been filling for PROGRESS_INTERVAL; the
+        # cache gets the listing once it is complete.
+        listing = LISTING_CACHE.get(self.filename, self.format)
+        if listing is not None:
+            for start in range(0, len(listing), chunk_size):
+                yield listing[start:start + chunk_size]
+            return
+        listing = []
+        chunk = []
+        for member in self.iter_file_list():
+            if not chunk:
+                started = time.perf_counter()
+            chunk.append(tuple(member))
+            if len(chunk) >= chunk_size or time.perf_counter() - started >= PROGRESS_INTERVAL:
+                listing.extend(chunk)
+                yield chunk
+                chunk = []
+        if chunk:
+            listing.extend(chunk)
+            yield chunk
+        LISTING_CACHE.put(self.filename, listing, self.format)
+
+    def apply_edit(self, edit, files_to_delete=(), renames=None, files_to_add=(), passwords=None, arcnames=None):
+        # Runs `edit` and carries the cached listing over to the edited
+        # archive, so the next file_list() does not have to reopen it.
+        # Encrypting changes compressed sizes, so that listing is reread.
+        listing = LISTING_CACHE.get(self.filename, self.format)
+        try:
+            edit()
+        except Exception:
+            LISTING_CACHE.discard(self.filename)
+            raise
+        if listing is None or passwords:
+            LISTING_CACHE.discard(self.filename)
+        else:
+            LISTING_CACHE.put(self.filename,
+                              self.edited_listing(listing, files_to_delete, renames, files_to_add, arcnames),
+                              self.format)
+
+    def edited_listing(self, listing, files_to_delete=(), renames=None, files_to_add=(), arcnames=None):
+        renames = renames or {}
+        arcnames = arcnames or [os.path.basename(file_path) for file_path in files_to_add]
+        listing = [(renames.get(name, name), size, compressed)
+                   for name, size, compressed in listing if name not in files_to_delete]
+        listing.extend((arcname, os.path.getsize(file_path), None) for file_path, arcname in zip(files_to_add, arcnames))
+        return listing
+
+    def commit_edits(self, files_to_delete=(), renames=None, files_to_add=(), passwords=None, arcnames=None):
+        # Formats without a single-pass rewrite apply the batch one edit at
+        # a time.
+        if files_to_delete:
+            self.delete_files(list(files_to_delete))
+        for old_name, new_name in (renames or {}).items():
+            self.rename_file(old_name, new_name)
+        if passwords:
+            self.encrypt_files(list(passwords), passwords)
+        if files_to_add:
+            self.add_files(list(files_to_add), arcnames)
+
+    def test_archive(self, callback=None, executor=None):
+        # Decodes every member into nothing, letting the format's own checks
+        # (CRCs, digests) run, and returns a TestReport. Members are spread
+        # over `executor`, which several archives can share.
+        metrics = transfer_metrics(callback)
+        report = TestReport(self.filename, self.format, metrics)
+        listing = sorted(((name, size or 0) for name, size, _ in self.file_list() if not name.endswith('/')),
+                         key=lambda member: member[1], reverse=True)
+        metrics.begin(sum(size for _, size in listing))
+        self.run_tests(report, [(name, functools.partial(self.test_member, name, metrics)) for name, _ in listing],
+                       executor)
+        metrics.finish()
+        return report
+
+    def test_member(self, name, metrics):
+        with self.open_member(name) as member:
+            return read_to_end(member, metrics)
+
+    def run_tests(self, report, tests, executor=None):
+        # Runs every (name, test) pair on `executor`, or on a pool of its
+        # own; the decoders release the GIL, so threads keep the cores busy.
+        if executor is None:
+            with ThreadPoolExecutor(max_workers=self.test_workers or os.cpu_count() or 1) as executor:
+                return self.run_tests(report, tests, executor)
+        futures = [executor.submit(report.run, name, test) for name, test in tests]
+        try:
+            for future in futures:
+                future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def open_member(self, name):
+        # Buffered, seekable binary reader over one member, decoded as it is
+        # read instead of being extracted first.
+        raise NotImplementedError(f"Reading members in place is not supported for {self.format} archives")
+
+    def read_members(self):
+        # (ArchiveMember, stream) for every member in archive order; each
+        # stream (None for directories) is only good until the next member
+        # is asked for. Formats that record times and permissions override
+        # this to pass them on.
+        for name, size, _ in self.file_list():
+            if name.endswith('/'):
+                yield ArchiveMember(name.rstrip('/'), 0, None, None, 'dir'), None
+                continue
+            with self.open_member(name) as stream:
+                yield ArchiveMember(name, size, None, None, 'file'), stream
+
+    def member_stamps(self):
+        # {name: (size, mtime, crc32)} for every member, read from the member
+        # table alone; directories have a size of None.
+        raise NotImplementedError(f"Syncing is not supported for {self.format} archives")
+
+    def sync(self, directory, dry_run=False):
+        # Brings the archive in line with `directory` in one commit: new files
+        # are added, changed ones replaced and members whose file is gone
+        # removed. Unchanged members are left to the format's cheapest
+        # rewrite (a raw copy for zip).
+        plan = plan_sync(self, directory)
+        if not dry_run and (plan.added or plan.replaced or plan.removed):
+            transaction = self.begin_edit()
+            transaction.delete(plan.removed + [arcname for _, arcname in plan.replaced])
+            files = plan.added + plan.replaced
+            transaction.add([file_path for file_path, _ in files], [arcname for _, arcname in files])
+            transaction.commit()
+        return plan
+
+    def write_members(self, members):
+        # Builds the archive afresh from (ArchiveMember, stream) pairs like
+        # the ones read_members() yields; returns the member names.
+        raise NotImplementedError(f"Writing {self.format} archives is not supported")
+
     @abstractmethod
     def get_file_list(self):
         pass
@@ -75,7 +1023,7 @@ class ArchiveHandler:
         pass
 
     @abstractmethod
-    def add_files(self, files_to_add):
+    def add_files(self, files_to_add, arcnames=None):
         pass
 
     @property
@@ -89,107 +1037,918 @@ class ArchiveHandler:
         pass
 
 
-class SevenZipHandler(ArchiveHandler):
-    def get_file_list(self):
-        with py7zr.SevenZipFile(self.filename, mode='r') as archive:
-            return archive.getnames()
+COPY_CHUNK_SIZE = 1024 * 1024
 
-    def extract_files(self, files_to_extract, extract_dir, callback):
-        with py7zr.SevenZipFile(self.filename, mode='r') as archive:
-            for i, file in enumerate(files_to_extract, 1):
-                archive.extract(path=extract_dir, targets=[file])
-                callback.emit(i, len(files_to_extract), file)
-
-    def delete_files(self, files_to_delete):
-        temp_filename = self.filename + '.temp'
-        with py7zr.SevenZipFile(self.filename, mode='r') as archive_read:
-            with py7zr.SevenZipFile(temp_filename, mode='w') as archive_write:
-                for file_info in archive_read.list():
-                    if file_info.filename not in files_to_delete:
-                        archive_write.write({file_info.filename: archive_read.read([file_info.filename])[file_info.filename]})
-        os.remove(self.filename)
-        os.rename(temp_filename, self.filename)
-
-    @property
-    def supports_deletion(self):
-        return True
 
-    def rename_file(self, old_name, new_name):
-        temp_filename = self.filename + '.temp'
-        with py7zr.SevenZipFile(self.filename, mode='r') as archive_read:
-            with py7zr.SevenZipFile(temp_filename, mode='w') as archive_write:
-                for file_info in archive_read.list():
-                    if file_info.filename == old_name:
-                        archive_write.writestr({new_name: archive_read.read([old_name])[old_name]})
-                    else:
-                        archive_write.writestr({file_info.filename: archive_read.read([file_info.filename])[file_info.filename]})
-        os.remove(self.filename)
-        os.rename(temp_filename, self.filename)
+# Trial compressors CompressionPolicy probes with, by codec name.
+PROBE_CODECS = {
+    'deflate': lambda data, level: zlib.compress(data, level),
+    'bzip2': lambda data, level: bz2.compress(data, level),
+    'lzma': lambda data, level: lzma.compress(data, preset=level),
+}
+ZIP_CODECS = {
+    'stored': zipfile.ZIP_STORED,
+    'deflate': zipfile.ZIP_DEFLATED,
+    'bzip2': zipfile.ZIP_BZIP2,
+    'lzma': zipfile.ZIP_LZMA,
+}
 
-    @property
-    def supports_renaming(self):
-        return True
 
-    def encrypt_archive(self, password):
-        return
+def file_sample(file_path, size):
+    # The head and the middle of the file; the head alone is often just a
+    # header.
+    with open(file_path, 'rb') as f:
+        head = f.read(size // 2)
+        length = os.fstat(f.fileno()).st_size
+        if length <= size:
+            return head + f.read()
+        f.seek(length // 2)
+        return head + f.read(size - len(head))
+
+
+class CompressionPolicy:
+    # Picks the codec and level for each new member from trial compressions
+    # of a sample of it. The budget's codecs (or `codecs`, as (name, level)
+    # pairs) are tried cheapest first; a costlier one is only taken when it
+    # beats the pick so far by `min_gain`, and a sample that does not get
+    # below `stored_ratio` of its size with the cheapest (JPEGs, videos,
+    # archives) is stored. Verdicts are kept by extension and leading bytes,
+    # and once one has come out the same `confirmations` times in a row,
+    # files like it are no longer probed.
+    BUDGETS = {
+        'fast': (('deflate', 1),),
+        'balanced': (('deflate', 6),),
+        'small': (('deflate', 9), ('bzip2', 9), ('lzma', 6)),
+    }
+
+    def __init__(self, budget='balanced', codecs=None, sample_size=16 * 1024, stored_ratio=0.95, min_gain=0.1,
+                 confirmations=3):
+        if budget not in self.BUDGETS:
+            raise ValueError(f"Unknown compression budget: {budget}")
+        self.budget = budget
+        self.codecs = codecs or self.BUDGETS[budget]
+        self.sample_size = sample_size
+        self.stored_ratio = stored_ratio
+        self.min_gain = min_gain
+        self.confirmations = confirmations
+        # Members are compressed on worker threads, and handler classes share
+        # one policy, so the verdicts are only touched under the lock.
+        self.verdicts = {}
+        self.lock = threading.Lock()
+
+    def choose(self, name, sample):
+        # (codec, level) for a member called `name` that starts like `sample`.
+        key = (os.path.splitext(name)[1].lower(), bytes(sample[:4]))
+        with self.lock:
+            verdict, count = self.verdicts.get(key, (None, 0))
+        if count >= self.confirmations:
+            return verdict
+        choice = self.probe(sample)
+        with self.lock:
+            verdict, count = self.verdicts.get(key, (None, 0))
+            self.verdicts[key] = (choice, count + 1 if choice == verdict else 1)
+        return choice
+
+    def probe(self, sample):
+        best = ('stored', None)
+        target = len(sample) * self.stored_ratio
+        for codec, level in self.codecs:
+            size = len(PROBE_CODECS[codec](sample, level))
+            if size < target:
+                best = (codec, level)
+                target = size * (1 - self.min_gain)
+            elif best[0] == 'stored':
+                break
+        return best
+
+
+def zip_codec(compression, name, sample):
+    # (compress_type, compresslevel) for a new zip member: `compression` is
+    # a zipfile constant or a CompressionPolicy; `sample` is only needed for
+    # the latter and may be a callable producing it.
+    if not isinstance(compression, CompressionPolicy):
+        return compression, None
+    codec, level = compression.choose(name, sample() if callable(sample) else sample)
+    return ZIP_CODECS[codec], level
+
+
+# Compressed members up to this size stay in memory until they are written.
+ZIP_SPOOL_SIZE = 8 * 1024 * 1024
+# Dictionary sizes of the xz presets 0-9, which zip's LZMA properties name
+# explicitly.
+LZMA_DICT_SIZES = (1 << 18, 1 << 20, 1 << 21, 1 << 22, 1 << 22, 1 << 23, 1 << 23, 1 << 24, 1 << 25, 1 << 26)
+
+
+class ZipLZMACompressor:
+    # Raw LZMA behind the 9-byte header zip expects: the LZMA SDK version,
+    # the properties' length, then lc/lp/pb in one byte and the dictionary
+    # size.
+    def __init__(self, level=None):
+        level = 6 if level is None else level
+        dict_size = LZMA_DICT_SIZES[level]
+        self.header = struct.pack('<BBHBI', 9, 4, 5, (2 * 5 + 0) * 9 + 3, dict_size)
+        self.compressor = lzma.LZMACompressor(lzma.FORMAT_RAW, filters=[
+            {'id': lzma.FILTER_LZMA1, 'preset': level, 'dict_size': dict_size, 'lc': 3, 'lp': 0, 'pb': 2}])
+
+    def compress(self, data):
+        header, self.header = self.header, b""
+        return header + self.compressor.compress(data)
+
+    def flush(self):
+        header, self.header = self.header, b""
+        return header + self.compressor.flush()
+
+
+def zip_compressor(compress_type, compresslevel):
+    # The codecs CompressionPolicy probes with, framed the way zip stores
+    # them; None for stored members.
+    if compress_type == zipfile.ZIP_STORED:
+        return None
+    if compress_type == zipfile.ZIP_DEFLATED:
+        return zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION if compresslevel is None else compresslevel,
+                                zlib.DEFLATED, -15)
+    if compress_type == zipfile.ZIP_BZIP2:
+        return bz2.BZ2Compressor(9 if compresslevel is None else compresslevel)
+    if compress_type == zipfile.ZIP_LZMA:
+        return ZipLZMACompressor(compresslevel)
+    raise NotImplementedError(f"Unsupported zip compression method: {compress_type}")
+
+
+def compress_zip_chunks(info, chunks, f_out, compresslevel):
+    # Compresses `chunks` into f_out with info's method and fills in its CRC
+    # and sizes.
+    if info.compress_type == zipfile.ZIP_LZMA:
+        # LZMA is written with an end-of-stream marker, and zip says so.
+        info.flag_bits |= 0x02
+    compressor = zip_compressor(info.compress_type, compresslevel)
+    start = f_out.tell()
+    crc = 0
+    size = 0
+    for chunk in chunks:
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+        f_out.write(compressor.compress(chunk) if compressor else chunk)
+    if compressor:
+        f_out.write(compressor.flush())
+    info.CRC = crc
+    info.file_size = size
+    info.compress_size = f_out.tell() - start
+
+
+def compress_zip_file(file_path, arcname, compression):
+    # Compresses one file into a spooled buffer, ready to be appended with
+    # append_zip_files(); the local header is filled in from what was read.
+    info = zipfile.ZipInfo.from_file(file_path, arcname)
+    spool = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_SIZE)
+    if info.is_dir():
+        info.CRC = 0
+        return info, spool
+    info.compress_type, compresslevel = zip_codec(compression, file_path,
+                                                  lambda: file_sample(file_path, compression.sample_size))
+    with open(file_path, 'rb') as f:
+        compress_zip_chunks(info, read_chunks(f, COPY_CHUNK_SIZE), spool, compresslevel)
+    return info, spool
+
+
+def append_zip_files(archive, files_to_add, arcnames, workers, compression):
+    # deflate, bzip2 and lzma release the GIL, so the files are compressed
+    # (and probed, with a CompressionPolicy) on a thread pool into spooled
+    # buffers and written to the archive in order, each right behind the
+    # one before.
+    output = archive.fp
+    members = ordered_parallel_map(lambda member: compress_zip_file(*member, compression),
+                                   zip(files_to_add, arcnames), workers)
+    for info, spool in members:
+        with spool:
+            output.seek(archive.start_dir)
+            info.header_offset = archive.start_dir
+            output.write(info.FileHeader(info.file_size > zipfile.ZIP64_LIMIT
+                                         or info.compress_size > zipfile.ZIP64_LIMIT))
+            spool.seek(0)
+            _copy_bytes(spool, output, info.compress_size)
+        _append_zip_entry(archive, info)
+        # Marks the archive modified, so close() writes the central directory.
+        archive.comment = archive.comment
+
+
+def write_zip_member(archive, info, chunks, compresslevel, zip64):
+    # Compresses `chunks` straight into the archive behind a local header
+    # that is rewritten with the CRC and sizes once they are known.
+    output = archive.fp
+    output.seek(archive.start_dir)
+    info.header_offset = archive.start_dir
+    info.CRC = 0
+    output.write(info.FileHeader(zip64))
+    compress_zip_chunks(info, chunks, output, compresslevel)
+    if not zip64 and (info.file_size > zipfile.ZIP64_LIMIT or info.compress_size > zipfile.ZIP64_LIMIT):
+        raise zipfile.LargeZipFile(f"{info.filename} needed ZIP64 extensions it was not written with")
+    end = output.tell()
+    output.seek(info.header_offset)
+    output.write(info.FileHeader(zip64))
+    output.seek(end)
+    _append_zip_entry(archive, info)
+    archive.comment = archive.comment
+
+
+def _copy_bytes(source, target, length):
+    while length > 0:
+        chunk = source.read(min(COPY_CHUNK_SIZE, length))
+        if not chunk:
+            raise EOFError("Archive ended before the member data did")
+        target.write(chunk)
+        length -= len(chunk)
+
+
+# Largest single kernel copy; keeps each call short enough for progress.
+COPY_RANGE_CHUNK = 64 * 1024 * 1024
+# errnos meaning "this kernel/filesystem can't do that copy", not a real
+# I/O failure.
+_COPY_RANGE_UNSUPPORTED = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EBADF,
+                           errno.EPERM, errno.EOPNOTSUPP, errno.ENOTSUP}
+
+
+def copy_range(source, offset, length, target, metrics=None):
+    # Copies `length` bytes at `offset` in `source` to the current position
+    # of `target` without bringing them through Python: copy_file_range(),
+    # then sendfile(), then an mmap of the source.
+    target.flush()
+    in_fd, out_fd = source.fileno(), target.fileno()
+    calls = []
+    if hasattr(os, 'copy_file_range'):
+        calls.append(lambda count, at: os.copy_file_range(in_fd, out_fd, count, at))
+    if hasattr(os, 'sendfile'):
+        calls.append(lambda count, at: os.sendfile(out_fd, in_fd, at, count))
+    while length > 0:
+        count = min(COPY_RANGE_CHUNK, length)
+        n = None
+        while calls and n is None:
+            try:
+                if metrics is None:
+                    n = calls[0](count, offset)
+                else:
+                    with metrics.timed('copy'):
+                        n = calls[0](count, offset)
+            except OSError as e:
+                if e.errno not in _COPY_RANGE_UNSUPPORTED:
+                    raise
+                calls.pop(0)
+        if n is None:
+            _copy_range_mapped(in_fd, out_fd, offset, length, metrics)
+            return
+        if n == 0:
+            raise EOFError("Archive ended before the member data did")
+        offset += n
+        length -= n
+        if metrics is not None:
+            metrics.advance(bytes_out=n, bytes_in=n)
+
+
+def _copy_range_mapped(in_fd, out_fd, offset, length, metrics):
+    start = offset - offset % mmap.ALLOCATIONGRANULARITY
+    with mmap.mmap(in_fd, offset + length - start, offset=start, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        position = offset - start
+        try:
+            while length > 0:
+                if metrics is None:
+                    n = os.write(out_fd, view[position:position + min(COPY_RANGE_CHUNK, length)])
+                else:
+                    with metrics.timed('copy'):
+                        n = os.write(out_fd, view[position:position + min(COPY_RANGE_CHUNK, length)])
+                    metrics.advance(bytes_out=n, bytes_in=n)
+                position += n
+                length -= n
+        finally:
+            view.release()
+
+
+def _strip_zip64_extra(extra):
+    # The zip64 sizes/offset field is regenerated by zipfile when the entry is
+    # written out again, so drop any copy carried over from the source.
+    kept = b""
+    while len(extra) >= 4:
+        header_id, size = struct.unpack('<HH', extra[:4])
+        if header_id != 1:
+            kept += extra[:4 + size]
+        extra = extra[4 + size:]
+    return kept
+
+
+_ZIPCRYPTO_TABLE = None
+_ZIPCRYPTO_STREAM = None
+# Every ZipCrypto key update depends on the byte before it, so encryption is
+# a Python loop over the data (roughly 1-2 MB/s); bigger members are refused
+# rather than tying up a worker for minutes.
+ZIPCRYPTO_MAX_BYTES = 32 * 1024 * 1024
+
+
+class ZipCryptoEncrypter:
+    # Traditional PKWARE encryption, the only scheme zipfile can read back.
+    def __init__(self, password):
+        global _ZIPCRYPTO_TABLE, _ZIPCRYPTO_STREAM
+        if _ZIPCRYPTO_TABLE is None:
+            _ZIPCRYPTO_TABLE = [
+                zlib.crc32(bytes((b,)), 0xFFFFFFFF) ^ 0xFFFFFFFF
+                for b in range(256)
+            ]
+            # Keystream byte for each value of the low half of key2.
+            _ZIPCRYPTO_STREAM = bytes((((k | 2) * ((k | 2) ^ 1)) >> 8) & 0xFF for k in range(0x10000))
+        self.key0, self.key1, self.key2 = 305419896, 591751049, 878082192
+        for b in password:
+            self._update_keys(b)
+
+    def _update_keys(self, b):
+        table = _ZIPCRYPTO_TABLE
+        self.key0 = (self.key0 >> 8) ^ table[(self.key0 ^ b) & 0xFF]
+        self.key1 = ((self.key1 + (self.key0 & 0xFF)) * 134775813 + 1) & 0xFFFFFFFF
+        self.key2 = (self.key2 >> 8) ^ table[(self.key2 ^ (self.key1 >> 24)) & 0xFF]
+
+    def encrypt(self, data):
+        table = _ZIPCRYPTO_TABLE
+        stream = _ZIPCRYPTO_STREAM
+        key0, key1, key2 = self.key0, self.key1, self.key2
+        out = bytearray(len(data))
+        for i, b in enumerate(data):
+            out[i] = b ^ stream[key2 & 0xFFFF]
+            key0 = (key0 >> 8) ^ table[(key0 ^ b) & 0xFF]
+            key1 = ((key1 + (key0 & 0xFF)) * 134775813 + 1) & 0xFFFFFFFF
+            key2 = (key2 >> 8) ^ table[(key2 ^ (key1 >> 24)) & 0xFF]
+        self.key0, self.key1, self.key2 = key0, key1, key2
+        return bytes(out)
+
+
+def _zip_data_offset(source, item):
+    source.seek(item.header_offset)
+    header = source.read(zipfile.sizeFileHeader)
+    if len(header) != zipfile.sizeFileHeader or header[:4] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Bad local file header for {item.filename!r}")
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    return item.header_offset + zipfile.sizeFileHeader + name_length + extra_length
+
+
+def _append_zip_entry(archive_write, entry):
+    archive_write.filelist.append(entry)
+    archive_write.NameToInfo[entry.filename] = entry
+    archive_write.start_dir = archive_write.fp.tell()
+
+
+def copy_zip_member_raw(source, archive_write, item, arcname):
+    # Copy the still-compressed bytes of `item` from the open source file into
+    # archive_write, only writing a fresh local header (with the new name).
+    source.seek(_zip_data_offset(source, item))
+    entry = copy.copy(item)
+    entry.filename = arcname
+    entry.extra = _strip_zip64_extra(item.extra)
+    zip64 = item.file_size > zipfile.ZIP64_LIMIT or item.compress_size > zipfile.ZIP64_LIMIT
+    descriptor = bool(item.flag_bits & 0x08)
+    if descriptor and not item.flag_bits & 0x01:
+        # Sizes and CRC are known now, so they can go in the local header.
+        # Encrypted entries keep the descriptor because their check byte
+        # depends on it.
+        entry.flag_bits &= ~0x08
+        descriptor = False
+    output = archive_write.fp
+    entry.header_offset = output.tell()
+    output.write(entry.FileHeader(zip64))
+    try:
+        output.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        _copy_bytes(source, output, item.compress_size)
+    else:
+        # Straight from file to file; the writer's position is set past the
+        # copy by hand since the kernel moved it behind Python's back.
+        end = output.tell() + item.compress_size
+        copy_range(source, source.tell(), item.compress_size, output)
+        output.seek(end)
+    if descriptor:
+        fmt = '<LLQQ' if zip64 else '<LLLL'
+        output.write(struct.pack(fmt, 0x08074b50, item.CRC, item.compress_size, item.file_size))
+    _append_zip_entry(archive_write, entry)
+
+
+def zip64_for(size):
+    # Whether a member of `size` bytes (None when unknown) is written with a
+    # ZIP64 header. The codecs grow incompressible data by well under 5%;
+    # the writers check the real sizes once the data is out.
+    return size is None or size * 1.05 > zipfile.ZIP64_LIMIT
+
+
+def write_zip_member_encrypted(archive_read, archive_write, item, password, arcname):
+    entry = copy.copy(item)
+    entry.filename = arcname
+    entry.extra = _strip_zip64_extra(item.extra)
+    entry.compress_type = zipfile.ZIP_DEFLATED
+    entry.flag_bits = (item.flag_bits & ~0x08) | 0x01
+    zip64 = zip64_for(item.file_size)
+    output = archive_write.fp
+    entry.header_offset = output.tell()
+    output.write(entry.FileHeader(zip64))
+    encrypter = ZipCryptoEncrypter(password.encode())
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    compress_size = 12
+    output.write(encrypter.encrypt(os.urandom(11) + bytes((item.CRC >> 24,))))
+    with archive_read.open(item) as member:
+        while True:
+            chunk = member.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            data = encrypter.encrypt(compressor.compress(chunk))
+            compress_size += len(data)
+            output.write(data)
+    data = encrypter.encrypt(compressor.flush())
+    compress_size += len(data)
+    output.write(data)
+    entry.compress_size = compress_size
+    if not zip64 and compress_size > zipfile.ZIP64_LIMIT:
+        raise zipfile.LargeZipFile(f"{arcname} needed ZIP64 extensions it was not written with")
+    end = output.tell()
+    output.seek(entry.header_offset)
+    output.write(entry.FileHeader(zip64))
+    output.seek(end)
+    _append_zip_entry(archive_write, entry)
+
+
+PARALLEL_EXTRACT_MIN_BYTES = 8 * 1024 * 1024
+# Spawning worker processes and their Manager takes the better part of a
+# second (and GUI children import Qt again), so a process pool is only used
+# for selections this big; smaller ones go to threads.
+PROCESS_EXTRACT_MIN_BYTES = 128 * 1024 * 1024
+
+_EXTRACT_POOLS = {}
+_EXTRACT_POOLS_LOCK = threading.Lock()
+
+
+def extract_pool(kind, workers):
+    # One pool of each kind ('thread' or 'process') is kept for the life of
+    # the program and replaced by a bigger one when a call asks for more
+    # workers. Returns the executor and, for processes, the Manager that
+    # hands out their shared queues and events.
+    with _EXTRACT_POOLS_LOCK:
+        executor, size, manager = _EXTRACT_POOLS.get(kind, (None, 0, None))
+        if size < workers:
+            if executor is not None:
+                executor.shutdown(wait=False)
+            if kind == 'thread':
+                executor = ThreadPoolExecutor(max_workers=workers)
+            else:
+                # Forking a process that is running Qt threads is unsafe, so
+                # the workers are spawned fresh.
+                context = multiprocessing.get_context('spawn')
+                if manager is None:
+                    manager = context.Manager()
+                executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            _EXTRACT_POOLS[kind] = executor, workers, manager
+        return executor, manager
+
+
+def balanced_groups(members, count, weight):
+    # Longest-first greedy packing: every member goes to the lightest group.
+    groups = [[] for _ in range(count)]
+    loads = [(0, i) for i in range(count)]
+    for member in sorted(members, key=weight, reverse=True):
+        load, i = heapq.heappop(loads)
+        groups[i].append(member)
+        heapq.heappush(loads, (load + weight(member), i))
+    return [group for group in groups if group]
+
+
+def zip_target_path(extract_dir, name):
+    # The same sanitising zipfile's own extract() does: no drive letters,
+    # no absolute paths and no '..' components.
+    arcname = name.replace('/', os.path.sep)
+    if os.path.altsep:
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    parts = [part for part in arcname.split(os.path.sep) if part not in ('', os.path.curdir, os.path.pardir)]
+    if os.path.sep == '\\':
+        parts = [re.sub(r'[:<>|"?*]', '_', part).rstrip('.') for part in parts]
+        parts = [part for part in parts if part]
+    return os.path.normpath(os.path.join(extract_dir, *parts))
+
+
+def extract_zip_member(archive, item, extract_dir, metrics, source=None):
+    # Copies the member a chunk at a time so the bytes show up in `metrics`
+    # while it is being inflated, not once it is done. Given the raw archive
+    # file as `source`, stored members are copied straight out of it instead,
+    # which skips the CRC check.
+    target = zip_target_path(extract_dir, item.filename)
+    with metrics.member(item.filename):
+        if item.is_dir():
+            os.makedirs(target, exist_ok=True)
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if source is not None and item.compress_type == zipfile.ZIP_STORED and not item.flag_bits & 0x1:
+            offset = _zip_data_offset(source, item)
+            with open(target, 'wb') as f_out:
+                copy_range(source, offset, item.compress_size, f_out, metrics)
+            return
+        with archive.open(item) as source, open(target, 'wb') as f_out:
+            while True:
+                with metrics.timed('decode'):
+                    chunk = source.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                with metrics.timed('write'):
+                    f_out.write(chunk)
+                metrics.advance(bytes_out=len(chunk))
+
+
+def extract_zip_group(filename, names, extract_dir, progress, copy_stored=True, abort=None):
+    # Runs in a pool worker, on its own handle to the archive.
+    metrics = QueueMetrics(progress, abort)
+    with open(filename, 'rb') as raw, zipfile.ZipFile(MeteredReader(raw, metrics), 'r') as archive:
+        members = sorted((archive.getinfo(name) for name in names), key=lambda item: item.header_offset)
+        for item in members:
+            if abort is not None and abort.is_set():
+                raise OperationCancelled()
+            extract_zip_member(archive, item, extract_dir, metrics, raw if copy_stored else None)
+    metrics.close()
+
+
+def test_zip_member(archive, item, metrics):
+    # zipfile checks the CRC once the member has been read to the end.
+    with archive.open(item) as member:
+        return read_to_end(member, metrics)
+
+
+class _OffsetBuffer(io.BytesIO):
+    # In-memory file that pretends to start at `base`, so zipfile can lay out
+    # a central directory for a position inside an existing archive.
+    def __init__(self, base):
+        super().__init__()
+        self.base = base
 
-    def encrypt_files(self, files_to_encrypt, passwords):
-        return
+    def tell(self):
+        return self.base + super().tell()
 
-    @property
-    def supports_encryption(self):
-        return False
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            offset -= self.base
+        return self.base + super().seek(offset, whence)
 
-    def create_archive(self):
-        with py7zr.SevenZipFile(self.filename, 'w') as _:
-            pass
 
-    def add_files(self, files_to_add):
-        with py7zr.SevenZipFile(self.filename, 'a') as archive:
-            for file_path in files_to_add:
-                archive.write(file_path, os.path.basename(file_path))
+def _encode_zip_name(name, flag_bits):
+    try:
+        return name.encode('ascii'), flag_bits & ~0x800
+    except UnicodeEncodeError:
+        return name.encode('utf-8'), flag_bits | 0x800
 
-    @property
-    def supports_creation(self):
-        return True
 
-    @property
-    def supports_adding(self):
-        return True
+class ZipHandler(ArchiveHandler):
+    format = 'zip'
+    # DOS times count in two-second steps.
+    mtime_resolution = 2
+    # Try to apply deletes/renames to the archive file itself before falling
+    # back to writing a full copy.
+    in_place = True
+    # Worker count (None: one per CPU) and pool type ('thread' or 'process')
+    # for extracting large selections in parallel. zlib, bz2 and lzma let go
+    # of the GIL while they decompress, so threads are usually enough.
+    extract_workers = None
+    extract_pool = 'thread'
+    # Threads new members are compressed on (None: one per CPU), and how:
+    # a zipfile constant, or a CompressionPolicy choosing for each member.
+    add_workers = None
+    compression = CompressionPolicy()
+    # Stored members are copied out of the archive file by the kernel, which
+    # means their CRC is not checked; set this to check it and copy through
+    # zipfile instead.
+    verify_stored_crc = False
 
+    def __init__(self, filename):
+        super().__init__(filename)
+        # Redo log of an in-place edit; a crashed edit is finished by the next
+        # write, never by a read.
+        self.journal_filename = filename + '.journal'
 
-class ZipHandler(ArchiveHandler):
     def get_file_list(self):
         with zipfile.ZipFile(self.filename, 'r') as archive:
             return [
-                (os.path.basename(item.filename), item.file_size)
+                (item.filename, item.file_size, item.compress_size)
                 for item in archive.infolist()
             ]
 
+    def open_member(self, name):
+        with open(self.filename, 'rb') as source, zipfile.ZipFile(source, 'r') as archive:
+            item = archive.getinfo(name)
+            if item.is_dir():
+                raise ValueError(f"{name} is a directory")
+            if item.compress_type == zipfile.ZIP_STORED and not item.flag_bits & 0x1:
+                return io.BufferedReader(MappedMember(self.filename, _zip_data_offset(source, item), item.file_size))
+
+        def opener(stack):
+            archive = stack.enter_context(zipfile.ZipFile(self.filename, 'r'))
+            return stack.enter_context(archive.open(item))
+        return io.BufferedReader(MemberStream(opener, item.file_size))
+
     def extract_files(self, files_to_extract, extract_dir, callback):
-        with zipfile.ZipFile(self.filename, 'r') as archive:
-            for i, file in enumerate(files_to_extract, 1):
-                archive.extract(file, path=extract_dir)
-                callback.emit(i, len(files_to_extract), file)
+        metrics = transfer_metrics(callback)
+        with open(self.filename, 'rb') as raw, zipfile.ZipFile(MeteredReader(raw, metrics), 'r') as archive:
+            members = [archive.getinfo(file) for file in files_to_extract]
+            metrics.begin(sum(item.file_size for item in members))
+            # Walk the members in on-disk order so the whole batch is a single
+            # forward sweep over the file.
+            members.sort(key=lambda item: item.header_offset)
+            workers = min(self.extract_workers or os.cpu_count() or 1, len(members))
+            if workers > 1 and sum(item.compress_size for item in members) >= PARALLEL_EXTRACT_MIN_BYTES:
+                self.extract_parallel(members, extract_dir, metrics, workers)
+            else:
+                for item in members:
+                    extract_zip_member(archive, item, extract_dir, metrics,
+                                       None if self.verify_stored_crc else raw)
+        metrics.finish()
 
-    def delete_files(self, files_to_delete):
+    def read_members(self):
+        with zipfile.ZipFile(self.filename, 'r') as archive:
+            for item in archive.infolist():
+                mode = item.external_attr >> 16 if item.create_system == 3 else 0
+                mtime = time.mktime(item.date_time + (0, 0, -1))
+                if item.is_dir():
+                    yield ArchiveMember(item.filename.rstrip('/'), 0, mtime, S_IMODE(mode) or None, 'dir'), None
+                    continue
+                with archive.open(item) as stream:
+                    yield ArchiveMember(item.filename, item.file_size, mtime, S_IMODE(mode) or None,
+                                        'link' if S_ISLNK(mode) else 'file'), stream
+
+    def write_members(self, members):
+        # Unix modes go in the high half of the external attributes, the
+        # way Info-ZIP stores them (symlinks included).
+        names = []
+        with zipfile.ZipFile(self.filename, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for member, stream in members:
+                item = zipfile.ZipInfo(member.name + '/' if member.kind == 'dir' else member.name,
+                                       zip_date_time(member.mtime))
+                item.create_system = 3
+                item.external_attr = member_mode(member) << 16
+                if member.kind == 'dir':
+                    item.external_attr |= 0x10
+                    archive.writestr(item, b"")
+                else:
+                    # The policy sees the start of the member.
+                    chunk = stream.read(COPY_CHUNK_SIZE)
+                    item.compress_type, compresslevel = zip_codec(
+                        self.compression, member.name, lambda: chunk[:self.compression.sample_size])
+                    write_zip_member(archive, item, itertools.chain([chunk], read_chunks(stream, COPY_CHUNK_SIZE)),
+                                     compresslevel, zip64_for(member.size))
+                names.append(member.name)
+        return names
+
+    def test_archive(self, callback=None, executor=None):
+        # Every member gets its own decompressor on the pool; the reads
+        # share one handle to the file.
+        metrics = transfer_metrics(callback)
+        report = TestReport(self.filename, self.format, metrics)
+        with open(self.filename, 'rb') as raw, zipfile.ZipFile(MeteredReader(raw, metrics), 'r') as archive:
+            members = sorted((item for item in archive.infolist() if not item.is_dir()),
+                             key=lambda item: item.file_size, reverse=True)
+            metrics.begin(sum(item.file_size for item in members))
+            tests = []
+            for item in members:
+                if item.flag_bits & 0x1:
+                    report.record(item.filename, 'skipped', error="encrypted")
+                else:
+                    tests.append((item.filename, functools.partial(test_zip_member, archive, item, metrics)))
+            self.run_tests(report, tests, executor)
+        metrics.finish()
+        return report
+
+    def extract_parallel(self, members, extract_dir, metrics, workers):
+        # Zip members are compressed independently, so they are split into
+        # groups of similar compressed size and inflated side by side.
+        # A cancel raised by the progress callback (or a failed worker) sets
+        # `abort`, which the workers check between members and at every
+        # progress report, so they stop within a chunk or so.
+        groups = balanced_groups(members, workers, lambda item: item.compress_size)
+        kind = self.extract_pool
+        if sum(item.compress_size for item in members) < PROCESS_EXTRACT_MIN_BYTES:
+            kind = 'thread'
+        executor, manager = extract_pool(kind, workers)
+        if manager is None:
+            progress = queue.Queue()
+            abort = threading.Event()
+        else:
+            progress = manager.Queue()
+            abort = manager.Event()
+        futures = [
+            executor.submit(extract_zip_group, self.filename,
+                            [item.filename for item in group], extract_dir, progress,
+                            not self.verify_stored_crc, abort)
+            for group in groups
+        ]
+        try:
+            self.collect_progress(futures, progress, metrics)
+        except BaseException:
+            abort.set()
+            for future in futures:
+                future.cancel()
+            concurrent.futures.wait(futures)
+            raise
+
+    def collect_progress(self, futures, progress, metrics):
+        # Folds the workers' progress messages into `metrics` until every
+        # worker has closed.
+        closed = 0
+        while closed < len(futures):
+            try:
+                message = progress.get(timeout=0.1)
+            except queue.Empty:
+                for future in futures:
+                    if future.done() and future.exception() is not None:
+                        raise future.exception()
+                continue
+            if message[0] == 'bytes':
+                metrics.start_member(message[1])
+                metrics.advance(bytes_out=message[2], bytes_in=message[3])
+            elif message[0] == 'member':
+                metrics.end_member(*message[1:])
+            else:
+                metrics.add_phases(message[1])
+                closed += 1
+        for future in futures:
+            future.result()
+
+    def rewrite(self, files_to_delete=(), renames=None, passwords=None, files_to_add=(), arcnames=None):
+        # Untouched members are copied as raw compressed bytes; only members
+        # that get encrypted are decompressed and compressed again.
+        renames = renames or {}
+        passwords = passwords or {}
+        arcnames = arcnames or [os.path.basename(file_path) for file_path in files_to_add]
+        self.recover_journal()
+        if self.in_place and not passwords and self.edit_in_place(files_to_delete, renames):
+            if files_to_add:
+                self.add_files(files_to_add, arcnames)
+            return
         temp_filename = self.filename + '.temp'
-        with zipfile.ZipFile(self.filename, 'r') as archive_read:
+        with zipfile.ZipFile(self.filename, 'r') as archive_read, open(self.filename, 'rb') as source:
+            for item in archive_read.infolist():
+                if item.filename in passwords and item.file_size > ZIPCRYPTO_MAX_BYTES:
+                    raise ValueError(f"{item.filename} is too large to encrypt "
+                                     f"(ZipCrypto is limited to {ZIPCRYPTO_MAX_BYTES // (1024 * 1024)} MiB)")
             with zipfile.ZipFile(temp_filename, 'w') as archive_write:
+                archive_write.comment = archive_read.comment
                 for item in archive_read.infolist():
-                    if item.filename not in files_to_delete:
-                        archive_write.writestr(item, archive_read.read(item.filename))
+                    if item.filename in files_to_delete:
+                        continue
+                    arcname = renames.get(item.filename, item.filename)
+                    if item.filename in passwords and not item.is_dir():
+                        write_zip_member_encrypted(archive_read, archive_write, item,
+                                                   passwords[item.filename], arcname)
+                    else:
+                        copy_zip_member_raw(source, archive_write, item, arcname)
+                append_zip_files(archive_write, files_to_add, arcnames,
+                                 self.add_workers or os.cpu_count() or 1, self.compression)
         os.remove(self.filename)
         os.rename(temp_filename, self.filename)
 
+    def commit_edits(self, files_to_delete=(), renames=None, files_to_add=(), passwords=None, arcnames=None):
+        if files_to_delete or renames or passwords:
+            self.rewrite(files_to_delete=files_to_delete, renames=renames,
+                         passwords=passwords, files_to_add=files_to_add, arcnames=arcnames)
+        elif files_to_add:
+            self.add_files(files_to_add, arcnames)
+
+    def member_stamps(self):
+        # Zip times are local, to the even second below the file's.
+        with zipfile.ZipFile(self.filename, 'r') as archive:
+            return {item.filename: (None, None, None) if item.is_dir()
+                    else (item.file_size, time.mktime(item.date_time + (0, 0, -1)), item.CRC)
+                    for item in archive.infolist()}
+
+    def edit_in_place(self, files_to_delete=(), renames=None):
+        # Handles the edits that leave every kept member where it is: deleting
+        # members at the end of the data region (the file is truncated) and
+        # renames that keep the encoded name length (the local header is
+        # patched). The central directory is then rewritten at the new end.
+        # Returns False when the edit needs a full rewrite instead.
+        renames = renames or {}
+        self.recover_journal()
+        with zipfile.ZipFile(self.filename, 'r') as archive:
+            items = archive.infolist()
+            comment = archive.comment
+            start_dir = archive.start_dir
+        by_offset = sorted(items, key=lambda item: item.header_offset)
+        deleted = sum(1 for item in items if item.filename in files_to_delete)
+        if any(item.filename in files_to_delete for item in by_offset[:len(items) - deleted]):
+            return False
+        new_start = by_offset[len(items) - deleted].header_offset if deleted else start_dir
+
+        writes = []
+        entries = []
+        with open(self.filename, 'rb') as source:
+            for item in items:
+                if item.filename in files_to_delete:
+                    continue
+                if item.filename not in renames:
+                    entries.append(item)
+                    continue
+                source.seek(item.header_offset)
+                header = source.read(zipfile.sizeFileHeader)
+                if header[:4] != zipfile.stringFileHeader:
+                    raise zipfile.BadZipFile(f"Bad local file header for {item.filename!r}")
+                local_flags, = struct.unpack('<H', header[6:8])
+                name_length, = struct.unpack('<H', header[26:28])
+                name, local_flags = _encode_zip_name(renames[item.filename], local_flags)
+                if len(name) != name_length:
+                    return False
+                writes.append((item.header_offset + 6, struct.pack('<H', local_flags)))
+                writes.append((item.header_offset + zipfile.sizeFileHeader, name))
+                entry = copy.copy(item)
+                entry.filename = renames[item.filename]
+                entries.append(entry)
+
+        buffer = _OffsetBuffer(new_start)
+        with zipfile.ZipFile(buffer, 'w') as directory:
+            directory.filelist = entries
+            directory.comment = comment
+        tail = buffer.getvalue()
+        writes.append((new_start, tail))
+        self.write_journal(writes, new_start + len(tail))
+        self.recover_journal()
+        return True
+
+    def write_journal(self, writes, length):
+        # Redo log: every write is independent of the bytes it replaces, so
+        # replaying the whole journal after a crash always finishes the edit.
+        # The file's size and the bytes each write replaces are kept as well,
+        # so a journal is never replayed onto some other file.
+        old = []
+        with open(self.filename, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            for offset, data in writes:
+                f.seek(offset)
+                old.append(f.read(len(data)))
+        journal = {
+            'size': size,
+            'writes': [(offset, base64.b64encode(data).decode('ascii'), base64.b64encode(before).decode('ascii'))
+                       for (offset, data), before in zip(writes, old)],
+            'length': length,
+        }
+        temp_filename = self.journal_filename + '.temp'
+        with open(temp_filename, 'w') as f:
+            json.dump(journal, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_filename, self.journal_filename)
+
+    def recover_journal(self):
+        # Finishes an in-place edit a crash interrupted. A journal that does
+        # not belong to the file as it is now (it was restored or replaced
+        # since) is stale and only removed.
+        try:
+            with open(self.journal_filename) as f:
+                journal = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            journal = None
+        writes = None
+        if isinstance(journal, dict) and 'size' in journal:
+            writes = [(offset, base64.b64decode(data), base64.b64decode(before))
+                      for offset, data, before in journal['writes']]
+        if writes is not None and self.journal_applies(journal['size'], journal['length'], writes):
+            with open(self.filename, 'r+b') as target:
+                for offset, data, _ in writes:
+                    target.seek(offset)
+                    target.write(data)
+                target.truncate(journal['length'])
+                target.flush()
+                os.fsync(target.fileno())
+        os.remove(self.journal_filename)
+
+    def journal_applies(self, size, length, writes):
+        # Writes are replayed in order, so every region holds its old bytes,
+        # its new ones, or new bytes up to where the crash cut the write off
+        # and old ones after; the file is between its old size and its
+        # final one.
+        try:
+            with open(self.filename, 'rb') as f:
+                current_size = os.fstat(f.fileno()).st_size
+                end = max([size] + [offset + len(data) for offset, data, _ in writes])
+                if not min(size, length) <= current_size <= end:
+                    return False
+                for offset, data, before in writes:
+                    f.seek(offset)
+                    current = f.read(len(data))
+                    done = len(os.path.commonprefix([current, data]))
+                    if len(current) < len(before) or current[done:] != before[done:len(current)]:
+                        return False
+        except OSError:
+            return False
+        return True
+
+    def delete_files(self, files_to_delete):
+        self.rewrite(files_to_delete=set(files_to_delete))
+
     def create_archive(self):
         with zipfile.ZipFile(self.filename, 'w', zipfile.ZIP_DEFLATED) as _:
             pass
 
-    def add_files(self, files_to_add):
+    def add_files(self, files_to_add, arcnames=None):
+        arcnames = arcnames or [os.path.basename(file_path) for file_path in files_to_add]
+        self.recover_journal()
         with zipfile.ZipFile(self.filename, 'a') as archive:
-            for file_path in files_to_add:
-                archive.write(file_path, os.path.basename(file_path))
+            append_zip_files(archive, files_to_add, arcnames,
+                             self.add_workers or os.cpu_count() or 1, self.compression)
 
     @property
     def supports_creation(self):
@@ -204,68 +1963,110 @@ class ZipHandler(ArchiveHandler):
         return True
 
     def rename_file(self, old_name, new_name):
-        temp_filename = self.filename + '.temp'
-        with zipfile.ZipFile(self.filename, 'r') as archive_read:
-            with zipfile.ZipFile(temp_filename, 'w') as archive_write:
-                for item in archive_read.infolist():
-                    if item.filename == old_name:
-                        data = archive_read.read(item.filename)
-                        archive_write.writestr(new_name, data)
-                    else:
-                        archive_write.writestr(item, archive_read.read(item.filename))
-        os.remove(self.filename)
-        os.rename(temp_filename, self.filename)
+        self.rewrite(renames={old_name: new_name})
 
     @property
     def supports_renaming(self):
         return True
 
     def encrypt_archive(self, password):
-        temp_filename = self.filename + '.temp'
-        with zipfile.ZipFile(self.filename, 'r') as zin:
-            with zipfile.ZipFile(temp_filename, 'w') as zout:
-                zout.comment = zin.comment
-                for item in zin.infolist():
-                    data = zin.read(item.filename)
-                    zout.writestr(item, data, zipfile.ZIP_DEFLATED)
-        os.remove(self.filename)
-        os.rename(temp_filename, self.filename)
-
-        with zipfile.ZipFile(self.filename, 'w') as zf:
-            zf.setpassword(password.encode())
-            for item in zf.infolist():
-                zf.writestr(item, zf.read(item.filename), zipfile.ZIP_DEFLATED)
+        with zipfile.ZipFile(self.filename, 'r') as archive:
+            # Members that already carry a password are left as they are.
+            names = [item.filename for item in archive.infolist() if not item.flag_bits & 0x01]
+        self.rewrite(passwords={name: password for name in names})
 
     def encrypt_files(self, files_to_encrypt, passwords):
-        temp_filename = self.filename + '.temp'
-        with zipfile.ZipFile(self.filename, 'r') as zin:
-            with zipfile.ZipFile(temp_filename, 'w') as zout:
-                zout.comment = zin.comment
-                for item in zin.infolist():
-                    if item.filename in files_to_encrypt:
-                        zout.writestr(item, zin.read(item.filename),
-                                      zipfile.ZIP_DEFLATED,
-                                      pwd=passwords[item.filename].encode())
-                    else:
-                        zout.writestr(item, zin.read(item.filename))
-        os.remove(self.filename)
-        os.rename(temp_filename, self.filename)
+        self.rewrite(passwords={name: passwords[name] for name in files_to_encrypt})
 
     @property
     def supports_encryption(self):
         return True
 
 
+def test_rar_member(archive, info, metrics):
+    with archive.open(info) as member:
+        return read_to_end(member, metrics)
+
+
 class RarHandler(ArchiveHandler):
+    format = 'rar'
+
     def get_file_list(self):
         with rarfile.RarFile(self.filename, 'r') as archive:
-            return archive.namelist()
+            return [(info.filename, info.file_size, info.compress_size) for info in archive.infolist()]
+
+    def open_member(self, name):
+        with rarfile.RarFile(self.filename, 'r') as archive:
+            info = archive.getinfo(name)
+        if info.is_dir():
+            raise ValueError(f"{name} is a directory")
+
+        def opener(stack):
+            archive = stack.enter_context(rarfile.RarFile(self.filename, 'r'))
+            return stack.enter_context(archive.open(info))
+        return io.BufferedReader(MemberStream(opener, info.file_size))
 
     def extract_files(self, files_to_extract, extract_dir, callback):
+        metrics = transfer_metrics(callback)
+        with rarfile.RarFile(self.filename, 'r') as archive:
+            wanted = set(files_to_extract)
+            members = [info for info in archive.infolist() if info.filename in wanted]
+            metrics.begin(sum(info.file_size for info in members))
+            if archive.is_solid():
+                # Every member of a solid archive depends on the ones before
+                # it, so hand the whole batch to a single unrar run.
+                with metrics.timed('extract'):
+                    archive.extractall(path=extract_dir, members=members)
+                metrics.advance(bytes_out=metrics.total, bytes_in=sum(info.compress_size for info in members))
+            else:
+                # unrar does the copying, so bytes are counted a member at a
+                # time.
+                for info in members:
+                    with metrics.member(info.filename):
+                        with metrics.timed('extract'):
+                            archive.extract(info, path=extract_dir)
+                        metrics.advance(bytes_out=info.file_size, bytes_in=info.compress_size)
+        metrics.finish()
+
+    def read_members(self):
+        with rarfile.RarFile(self.filename, 'r') as archive:
+            for info in archive.infolist():
+                mode = info.mode if info.host_os == rarfile.RAR_OS_UNIX else None
+                mtime = time.mktime(info.date_time + (0, 0, -1))
+                if info.is_dir():
+                    yield ArchiveMember(info.filename.rstrip('/'), 0, mtime, mode, 'dir'), None
+                    continue
+                with archive.open(info) as stream:
+                    yield ArchiveMember(info.filename, info.file_size, mtime, mode,
+                                        'link' if info.is_symlink() else 'file'), stream
+
+    def test_archive(self, callback=None, executor=None):
+        metrics = transfer_metrics(callback)
+        report = TestReport(self.filename, self.format, metrics)
         with rarfile.RarFile(self.filename, 'r') as archive:
-            for i, file in enumerate(files_to_extract, 1):
-                archive.extract(file, path=extract_dir)
-                callback.emit(i, len(files_to_extract), file)
+            members = sorted((info for info in archive.infolist() if not info.is_dir()),
+                             key=lambda info: info.file_size, reverse=True)
+            metrics.begin(sum(info.file_size for info in members))
+            if archive.is_solid():
+                # Each member needs the ones before it decoded, so a single
+                # unrar run checks the lot.
+                try:
+                    with metrics.timed('decode'):
+                        archive.testrar()
+                except rarfile.Error as e:
+                    report.error = str(e)
+                else:
+                    for info in members:
+                        report.record(info.filename, 'ok', info.file_size)
+                metrics.advance(bytes_out=metrics.total, bytes_in=sum(info.compress_size for info in members))
+            else:
+                # rarfile checks the CRC at the end of each member; compressed
+                # members are decoded by unrar processes running side by side.
+                self.run_tests(report, [
+                    (info.filename, functools.partial(test_rar_member, archive, info, metrics)) for info in members
+                ], executor)
+        metrics.finish()
+        return report
 
     def delete_files(self, files_to_delete):
         raise NotImplementedError("Deletion is not supported for RAR archives")
@@ -294,7 +2095,7 @@ class RarHandler(ArchiveHandler):
     def create_archive(self):
         return
 
-    def add_files(self, files_to_add):
+    def add_files(self, files_to_add, arcnames=None):
         return
 
     @property
@@ -306,19 +2107,456 @@ class RarHandler(ArchiveHandler):
         return False
 
 
+TAR_INDEX_VERSION = 2
+# Tar indexes live in the cache, one JSON file per archive named by a hash
+# of its real path, like the listing cache's.
+TAR_INDEX_DIR = os.path.join(CACHE_DIR, 'tarindex')
+TAR_INDEX_FILES = 256
+TAR_SNAPSHOT_INTERVAL = 16 * 1024 * 1024
+
+
+def tar_member_file(archive, tarinfo):
+    member = archive.extractfile(tarinfo)
+    if member is None:
+        raise ValueError(f"{tarinfo.name} is not a regular file")
+    return member
+
+
+def copy_tar_member_data(archive, source, metrics, tarinfo, targetpath):
+    # Stands in for TarFile.makefile on an uncompressed tar: the member's
+    # data sits as-is in `source`, so it is copied by the kernel; tarfile
+    # still sets the mode, owner and times afterwards.
+    if tarinfo.sparse is not None:
+        return tarfile.TarFile.makefile(archive, tarinfo, targetpath)
+    with open(targetpath, 'wb') as target:
+        copy_range(source, tarinfo.offset_data, tarinfo.size, target, metrics)
+
+
+class ChunkReader(io.RawIOBase):
+    # Read-only, forward-seekable file object over an iterator of chunks of
+    # an uncompressed stream, starting `position` bytes into that stream.
+    def __init__(self, chunks, position=0):
+        self.chunks = iter(chunks)
+        self.pending = memoryview(b"")
+        self.position = position
+        # Set while a member is copied out, to count its bytes.
+        self.metrics = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        # Fill `b` across chunk boundaries: tarfile takes a short read for
+        # the end of the archive.
+        filled = 0
+        while filled < len(b):
+            if not len(self.pending):
+                chunk = self.next_chunk()
+                if chunk is None:
+                    break
+                self.pending = memoryview(chunk)
+            n = min(len(b) - filled, len(self.pending))
+            b[filled:filled + n] = self.pending[:n]
+            self.pending = self.pending[n:]
+            filled += n
+        self.position += filled
+        if self.metrics is not None:
+            self.metrics.advance(bytes_out=filled)
+        return filled
+
+    def next_chunk(self):
+        if self.metrics is None:
+            return next(self.chunks, None)
+        with self.metrics.timed('decode'):
+            return next(self.chunks, None)
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence != os.SEEK_SET or offset < self.position:
+            raise io.UnsupportedOperation("ChunkReader can only seek forward")
+        while self.position < offset:
+            if not self.read(min(offset - self.position, COPY_CHUNK_SIZE)):
+                raise EOFError("Stream ended before the requested offset")
+        return self.position
+
+
+def file_chunks(filename, offset=0):
+    with open(filename, 'rb') as f:
+        f.seek(offset)
+        while True:
+            chunk = f.read(STREAM_BUFFER_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def gzip_chunks(filename, offset=0, uncompressed=0, decompressor=None, checkpoints=None, snapshots=None):
+    # Decompressed stream of a (multi-member) gzip file from a member start,
+    # or from a decompressor snapshot taken at compressed `offset`. Member
+    # starts are recorded in `checkpoints` and, every TAR_SNAPSHOT_INTERVAL
+    # bytes, copies of the decompressor in `snapshots`.
+    with open(filename, 'rb') as f:
+        f.seek(offset)
+        position = offset
+        pending = b""
+        next_snapshot = uncompressed + TAR_SNAPSHOT_INTERVAL
+        while True:
+            if not pending:
+                pending = f.read(STREAM_BUFFER_SIZE)
+                if not pending:
+                    return
+                position += len(pending)
+            if decompressor is None:
+                if not pending.strip(b'\x00'):
+                    return
+                decompressor = zlib.decompressobj(31)
+                if checkpoints is not None:
+                    checkpoints.append((position - len(pending), uncompressed))
+            data = decompressor.decompress(pending)
+            pending = b""
+            if data:
+                uncompressed += len(data)
+                yield data
+            if decompressor.eof:
+                pending = decompressor.unused_data
+                decompressor = None
+            elif snapshots is not None and uncompressed >= next_snapshot:
+                snapshots.append((position, uncompressed, decompressor.copy()))
+                next_snapshot = uncompressed + TAR_SNAPSHOT_INTERVAL
+
+
+def bzip2_chunks(filename, spans, uncompressed, workers, checkpoints=None):
+    decode = functools.partial(inflate_bzip2_block, filename)
+    for span, data in zip(spans, ordered_parallel_map(decode, spans, workers)):
+        if checkpoints is not None:
+            checkpoints.append((span[0], span[1], uncompressed))
+        uncompressed += len(data)
+        yield data
+
+
 class TarHandler(ArchiveHandler):
+    format = 'tar'
+    # Threads used to decode bzip2 blocks (None: one per CPU).
+    parallel_workers = None
+
+    def __init__(self, filename):
+        super().__init__(filename)
+        # Every member's header offset in the uncompressed stream plus the
+        # points decompression can restart from, so listings need no
+        # decompression and single members can be reached without inflating
+        # everything in front of them. Only gzip and bzip2 tars have restart
+        # points, so only their indexes are kept on disk.
+        self.realpath = os.path.realpath(filename)
+        self.index_filename = os.path.join(
+            TAR_INDEX_DIR, hashlib.sha1(self.realpath.encode('utf-8', 'surrogateescape')).hexdigest() + '.json')
+        self.index = None
+        # zlib can only resume from a live decompressor, which cannot be
+        # saved to disk; these are kept for the lifetime of the handler, so a
+        # reopened single-member .tar.gz starts from its one member again
+        # (see the README).
+        self.snapshots = []
+
     def get_file_list(self):
-        with tarfile.open(self.filename, 'r:*') as archive:
-            return [
-                (member.name, member.size)
-                for member in archive
-            ]
+        # Members of a compressed tar have no compressed size of their own.
+        return [(name, size, None) for name, size, _, _ in self.load_index()['members']]
+
+    def iter_file_list(self):
+        # Without a current index, members are passed on as the index build
+        # reaches them.
+        if self.current_index() is not None:
+            yield from self.get_file_list()
+            return
+        scan = self.scan_index(os.stat(self.filename))
+        while True:
+            try:
+                name, size, _, _ = next(scan)
+            except StopIteration as done:
+                self.save_index(done.value)
+                return
+            yield name, size, None
+
+    def current_index(self):
+        # The index in memory or in the sidecar, if it still matches the file.
+        stat = os.stat(self.filename)
+        if self.index is not None and self.index['size'] == stat.st_size and self.index['mtime_ns'] == stat.st_mtime_ns:
+            return self.index
+        try:
+            with open(self.index_filename) as f:
+                index = json.load(f)
+            if (index['version'], index['path'], index['size'], index['mtime_ns']) == \
+                    (TAR_INDEX_VERSION, self.realpath, stat.st_size, stat.st_mtime_ns):
+                self.index = index
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def load_index(self):
+        index = self.current_index()
+        if index is None:
+            index = self.save_index(self.build_index(os.stat(self.filename)))
+        return index
+
+    def save_index(self, index):
+        self.index = index
+        if index['compression'] not in ('gz', 'bz2'):
+            return index
+        directory = os.path.dirname(self.index_filename)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(self.index_filename + '.temp', 'w') as f:
+                json.dump(index, f)
+            os.replace(self.index_filename + '.temp', self.index_filename)
+            prune_cache_dir(directory, TAR_INDEX_FILES)
+        except OSError:
+            pass
+        return index
+
+    def build_index(self, stat):
+        scan = self.scan_index(stat)
+        while True:
+            try:
+                next(scan)
+            except StopIteration as done:
+                return done.value
+
+    def scan_index(self, stat):
+        # Yields each member's entry as it is read and returns the index.
+        with open(self.filename, 'rb') as f:
+            magic = f.read(3)
+        compression = 'tar'
+        checkpoints = []
+        self.snapshots = []
+        chunks = None
+        if magic[:2] == b'\x1f\x8b':
+            compression = 'gz'
+            chunks = gzip_chunks(self.filename, checkpoints=checkpoints, snapshots=self.snapshots)
+        elif magic == b'BZh':
+            compression = 'bz2'
+            try:
+                spans = bzip2_block_spans(self.filename)
+                chunks = bzip2_chunks(self.filename, spans, 0, self.workers(), checkpoints)
+            except ParallelFallback:
+                compression = 'stream'
+        else:
+            chunks = file_chunks(self.filename)
+
+        members = []
+        try:
+            if chunks is None:
+                raise tarfile.ReadError()
+            with tarfile.open(fileobj=ChunkReader(chunks), mode='r:') as archive:
+                for member in archive:
+                    members.append((member.name, member.size, member.offset, member.islnk()))
+                    yield members[-1]
+        except tarfile.ReadError:
+            # xz and anything else: keep the listing, but extraction has to
+            # decompress from the start. Members already passed on are not
+            # passed on again.
+            compression = 'stream'
+            checkpoints = []
+            seen = len(members)
+            members = []
+            with tarfile.open(self.filename, 'r:*') as archive:
+                for member in archive:
+                    members.append((member.name, member.size, member.offset, member.islnk()))
+                    if len(members) > seen:
+                        yield members[-1]
+        return {
+            'version': TAR_INDEX_VERSION,
+            'path': self.realpath,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'compression': compression,
+            'checkpoints': checkpoints,
+            'members': members,
+        }
+
+    def workers(self):
+        return self.parallel_workers or os.cpu_count() or 1
+
+    def restart_point(self, offset):
+        # Uncompressed position of the closest restart point at or before
+        # `offset`, and a function opening a reader there.
+        index = self.index
+        if index['compression'] == 'tar':
+            return offset, lambda: ChunkReader(file_chunks(self.filename, offset), offset)
+        if index['compression'] == 'gz':
+            best = max((c for c in index['checkpoints'] if c[1] <= offset), key=lambda c: c[1])
+            snapshot = max((s for s in self.snapshots if s[1] <= offset), key=lambda s: s[1], default=None)
+            if snapshot is not None and snapshot[1] > best[1]:
+                position, uncompressed, decompressor = snapshot
+                return uncompressed, lambda: ChunkReader(
+                    gzip_chunks(self.filename, position, uncompressed, decompressor.copy()), uncompressed)
+            return best[1], lambda: ChunkReader(gzip_chunks(self.filename, best[0], best[1]), best[1])
+        checkpoints = index['checkpoints']
+        i = bisect.bisect_right([c[2] for c in checkpoints], offset) - 1
+        spans = [(c[0], c[1]) for c in checkpoints[i:]]
+        uncompressed = checkpoints[i][2]
+        return uncompressed, lambda: ChunkReader(
+            bzip2_chunks(self.filename, spans, uncompressed, self.workers()), uncompressed)
+
+    def open_member(self, name):
+        index = self.load_index()
+        member = next((member for member in index['members'] if member[0] == name), None)
+        if member is None:
+            raise KeyError(f"filename {name!r} not found")
+        _, size, offset, islnk = member
+        if index['compression'] == 'stream' or islnk:
+            # Links are resolved against the members before them.
+            def opener(stack):
+                archive = stack.enter_context(tarfile.open(self.filename, 'r:*'))
+                return tar_member_file(archive, archive.getmember(name))
+            return io.BufferedReader(MemberStream(opener, size))
+        if index['compression'] == 'tar':
+            with open(self.filename, 'rb') as source:
+                source.seek(offset)
+                with tarfile.open(fileobj=source, mode='r:') as archive:
+                    tarinfo = archive.next()
+            if tarinfo.isreg() and tarinfo.sparse is None:
+                return io.BufferedReader(MappedMember(self.filename, tarinfo.offset_data, tarinfo.size))
+
+        def opener(stack):
+            reader = stack.enter_context(self.restart_point(offset)[1]())
+            reader.seek(offset)
+            archive = stack.enter_context(tarfile.open(fileobj=reader, mode='r:'))
+            return tar_member_file(archive, archive.next())
+        return io.BufferedReader(MemberStream(opener, size))
+
+    def test_archive(self, callback=None, executor=None):
+        # The members share one stream, so they are checked in a single pass
+        # over it (bzip2 blocks are still decoded side by side). tarfile
+        # checks the header checksums and gzip/bzip2/xz their own CRCs.
+        metrics = transfer_metrics(callback)
+        report = TestReport(self.filename, self.format, metrics)
+        index = self.load_index()
+        metrics.begin(sum(member[1] for member in index['members']))
+        seen = set()
+        try:
+            with contextlib.ExitStack() as stack:
+                if index['compression'] == 'stream':
+                    raw = stack.enter_context(open(self.filename, 'rb'))
+                    archive = stack.enter_context(tarfile.open(fileobj=MeteredReader(raw, metrics), mode='r:*'))
+                else:
+                    reader = stack.enter_context(self.restart_point(0)[1]())
+                    archive = stack.enter_context(tarfile.open(fileobj=reader, mode='r:'))
+                for tarinfo in archive:
+                    seen.add(tarinfo.name)
+                    if tarinfo.isreg():
+                        report.run(tarinfo.name, functools.partial(self.test_tar_member, archive, tarinfo, metrics))
+                # tarfile stops at the end-of-archive marker, or quietly at a
+                # header it cannot read; after the marker only zero padding
+                # is allowed, and the compressed stream has to end cleanly.
+                with metrics.timed('decode'):
+                    while True:
+                        chunk = archive.fileobj.read(STREAM_BUFFER_SIZE)
+                        if not chunk:
+                            break
+                        if chunk.strip(b'\0'):
+                            raise tarfile.ReadError(f"Unreadable header at offset {archive.offset}")
+        except OperationCancelled:
+            raise
+        except Exception as e:
+            report.error = str(e)
+        for name, _, _, _ in index['members']:
+            if name not in seen:
+                report.record(name, 'skipped', error="not reached")
+        metrics.finish()
+        return report
+
+    def read_members(self):
+        # One pass over the stream. Hard links need to reach back to their
+        # target, so archives with any are read through a seekable tarfile.
+        index = self.load_index()
+        with contextlib.ExitStack() as stack:
+            if index['compression'] == 'stream' or any(member[3] for member in index['members']):
+                archive = stack.enter_context(tarfile.open(self.filename, 'r:*'))
+            else:
+                reader = stack.enter_context(self.restart_point(0)[1]())
+                archive = stack.enter_context(tarfile.open(fileobj=reader, mode='r:'))
+            for tarinfo in archive:
+                member = ArchiveMember(tarinfo.name, tarinfo.size, tarinfo.mtime, tarinfo.mode, 'file')
+                if tarinfo.isdir():
+                    yield member._replace(size=0, kind='dir'), None
+                elif tarinfo.issym():
+                    target = tarinfo.linkname.encode('utf-8', 'surrogateescape')
+                    yield member._replace(size=len(target), kind='link'), io.BytesIO(target)
+                elif tarinfo.isreg() or tarinfo.islnk():
+                    with archive.extractfile(tarinfo) as stream:
+                        size = stream.seek(0, os.SEEK_END)
+                        stream.seek(0)
+                        yield member._replace(size=size), stream
+
+    def test_tar_member(self, archive, tarinfo, metrics):
+        with archive.extractfile(tarinfo) as member:
+            return read_to_end(member, metrics)
 
     def extract_files(self, files_to_extract, extract_dir, callback):
-        with tarfile.open(self.filename, 'r:*') as archive:
-            for i, file in enumerate(files_to_extract, 1):
-                archive.extract(file, path=extract_dir)
-                callback.emit(i, len(files_to_extract), file)
+        index = self.load_index()
+        if index['compression'] == 'tar':
+            with open(self.filename, 'rb') as source:
+                self.extract_indexed(index, files_to_extract, extract_dir, callback, source)
+        else:
+            self.extract_indexed(index, files_to_extract, extract_dir, callback)
+
+    def extract_indexed(self, index, files_to_extract, extract_dir, callback, source=None):
+        # `source` is the archive file itself when it is an uncompressed tar,
+        # so member data can be copied straight out of it.
+        members = {member[0]: member for member in index['members']}
+        targets = sorted((members[name] for name in files_to_extract), key=lambda member: member[2])
+        if index['compression'] == 'stream' or any(member[3] for member in targets):
+            # Hard links need the members before them to be resolved.
+            self.extract_sequential(files_to_extract, extract_dir, callback)
+            return
+        metrics = transfer_metrics(callback)
+        metrics.begin(sum(member[1] for member in targets))
+        reader = None
+        for name, size, offset, _ in targets:
+            restart, open_reader = self.restart_point(offset)
+            if reader is None or reader.tell() > offset or restart > reader.tell():
+                reader = open_reader()
+            reader.seek(offset)
+            with tarfile.open(fileobj=reader, mode='r:') as archive:
+                if source is not None:
+                    archive.makefile = functools.partial(copy_tar_member_data, archive, source, metrics)
+                member = archive.next()
+                with metrics.member(name), metrics.timed('write'):
+                    reader.metrics = metrics
+                    try:
+                        archive.extract(member, path=extract_dir)
+                    finally:
+                        reader.metrics = None
+        metrics.finish()
+
+    def extract_sequential(self, files_to_extract, extract_dir, callback):
+        # Progress is measured on the compressed file as it is read.
+        metrics = transfer_metrics(callback)
+        metrics.begin(os.path.getsize(self.filename), basis='in')
+        with open(self.filename, 'rb') as raw, tarfile.open(fileobj=MeteredReader(raw, metrics), mode='r:*') as archive:
+            # Looking members up by name would rescan (and for .tar.gz/.tar.xz
+            # re-decompress) the stream each time; extract them as the
+            # iteration reaches them instead and stop after the last one.
+            remaining = set(files_to_extract)
+            if isinstance(archive.fileobj, MeteredReader):
+                archive.makefile = functools.partial(copy_tar_member_data, archive, raw, metrics)
+            for member in archive:
+                if member.name not in remaining:
+                    continue
+                with metrics.member(member.name), metrics.timed('extract'):
+                    archive.extract(member, path=extract_dir)
+                remaining.discard(member.name)
+                if not remaining:
+                    break
+            if remaining:
+                raise KeyError(f"filename {sorted(remaining)[0]!r} not found")
+        metrics.finish()
 
     def delete_files(self, files_to_delete):
         return
@@ -347,7 +2585,7 @@ class TarHandler(ArchiveHandler):
     def create_archive(self):
         return
 
-    def add_files(self, files_to_add):
+    def add_files(self, files_to_add, arcnames=None):
         return
 
     @property
@@ -359,15 +2597,409 @@ class TarHandler(ArchiveHandler):
         return False
 
 
+STREAM_BUFFER_SIZE = 1024 * 1024
+
+
+def copy_stream_with_progress(f_in, f_out, metrics, buffer_size):
+    # The uncompressed size of a .gz/.bz2 stream is not known up front, so
+    # progress is measured on the compressed bytes `f_in` reads.
+    while True:
+        with metrics.timed('decode'):
+            chunk = f_in.read(buffer_size)
+        if not chunk:
+            break
+        with metrics.timed('write'):
+            f_out.write(chunk)
+        metrics.advance(bytes_out=len(chunk))
+
+
+GZIP_MAGIC = b'\x1f\x8b\x08'
+BZIP2_BLOCK_MAGIC = 0x314159265359
+BZIP2_EOS_MAGIC = 0x177245385090
+# bzip2 blocks are decoded whole in memory, so files whose blocks (or gzip
+# members) are on average larger than this are decompressed serially.
+PARALLEL_MEMBER_LIMIT = 64 * 1024 * 1024
+# Output of a gzip member decoded ahead of time stays in memory up to this
+# size and goes to a temporary file beyond it.
+GZIP_SPOOL_SIZE = 8 * 1024 * 1024
+GZIP_COMPRESS_CHUNK_SIZE = 4 * 1024 * 1024
+BZIP2_COMPRESS_CHUNK_SIZE = 900 * 1000
+
+
+class ParallelFallback(Exception):
+    pass
+
+
+def ordered_parallel_map(function, items, workers, ahead=None):
+    # zlib and bz2 release the GIL while they work, so threads are enough.
+    # At most `ahead` (by default 2 * workers) items are in flight or held
+    # at once and they come back in input order.
+    ahead = ahead or 2 * workers
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        for item in items:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= ahead:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def read_chunks(f, chunk_size):
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def scan_file(filename, pattern):
+    # Offsets of every occurrence of `pattern`, read in bounded chunks.
+    offsets = []
+    with open(filename, 'rb') as f:
+        base = 0
+        tail = b""
+        while True:
+            chunk = f.read(STREAM_BUFFER_SIZE)
+            if not chunk:
+                break
+            data = tail + chunk
+            start = base - len(tail)
+            i = data.find(pattern)
+            while i != -1:
+                if not offsets or offsets[-1] != start + i:
+                    offsets.append(start + i)
+                i = data.find(pattern, i + 1)
+            tail = data[-(len(pattern) - 1):] if len(pattern) > 1 else b""
+            base += len(chunk)
+    return offsets
+
+
+def gzip_header_plausible(header):
+    # Rules out most stray 1f 8b 08 bytes inside compressed data: reserved
+    # flag bits clear, a known XFL value and a known OS byte.
+    return (len(header) >= 10 and header[:3] == GZIP_MAGIC and not header[3] & 0xE0
+            and header[8] in (0, 2, 4) and (header[9] < 14 or header[9] == 255))
+
+
+def bgzf_members(filename, size):
+    # Member offsets of a BGZF file (bgzip, samtools), whose headers carry
+    # each member's length, so the chain is known without decoding. None
+    # when the file is not BGZF all the way through.
+    offsets = []
+    position = 0
+    with open(filename, 'rb') as f:
+        while position < size:
+            f.seek(position)
+            header = f.read(18)
+            if (not gzip_header_plausible(header) or not header[3] & 0x04
+                    or header[12:14] != b'BC' or header[14:16] != b'\x02\x00'):
+                return None
+            offsets.append(position)
+            position += struct.unpack('<H', header[16:18])[0] + 1
+    return offsets if position == size else None
+
+
+def inflate_gzip_member(filename, offset, write, stale=None):
+    # Decodes the gzip member at `offset`, handing the output to `write` a
+    # bounded piece at a time; zlib checks the CRC-32 and ISIZE trailer.
+    # Returns the member's end offset, or None when `offset` turns out not
+    # to start a member or `stale()` says it is no longer wanted.
+    decompressor = zlib.decompressobj(31)
+    consumed = 0
+    try:
+        with open(filename, 'rb') as f:
+            f.seek(offset)
+            while not decompressor.eof:
+                if stale is not None and stale():
+                    return None
+                chunk = f.read(STREAM_BUFFER_SIZE)
+                if not chunk:
+                    return None
+                consumed += len(chunk)
+                while chunk and not decompressor.eof:
+                    write(decompressor.decompress(chunk, STREAM_BUFFER_SIZE))
+                    chunk = decompressor.unconsumed_tail
+    except zlib.error:
+        return None
+    return offset + consumed - len(decompressor.unused_data)
+
+
+def bit_search_patterns(magic):
+    # (shift, key, key offset, first byte, first mask, last byte, last mask)
+    # for finding a 48-bit magic that starts `shift` bits into a byte.
+    patterns = []
+    for shift in range(8):
+        window = (magic << (8 - shift)).to_bytes(7, 'big')
+        if shift == 0:
+            patterns.append((0, window[:6], 0, 0, 0, 0, 0))
+        else:
+            patterns.append((shift, window[1:6], 1, window[0], 0xFF >> shift,
+                             window[6], (0xFF << (8 - shift)) & 0xFF))
+    return patterns
+
+
+def scan_bits(filename, magic):
+    positions = set()
+    patterns = bit_search_patterns(magic)
+    with open(filename, 'rb') as f:
+        base = 0
+        tail = b""
+        while True:
+            chunk = f.read(STREAM_BUFFER_SIZE)
+            if not chunk:
+                break
+            data = tail + chunk
+            start = base - len(tail)
+            for shift, key, key_offset, first, first_mask, last, last_mask in patterns:
+                i = data.find(key, key_offset)
+                while i != -1:
+                    k = i - key_offset
+                    if k + 6 < len(data) and (
+                        shift == 0 or (data[k] & first_mask == first & first_mask
+                                       and data[k + 6] & last_mask == last & last_mask)
+                    ):
+                        positions.add((start + k) * 8 + shift)
+                    i = data.find(key, i + 1)
+            tail = data[-7:]
+            base += len(chunk)
+        # A magic in the very last bytes has no byte after it to check.
+        f.seek(max(base - 6, 0))
+        end = f.read()
+        if len(end) == 6 and int.from_bytes(end, 'big') == magic:
+            positions.add((base - 6) * 8)
+    return sorted(positions)
+
+
+def inflate_bzip2_block(filename, span):
+    # Re-wrap the bits of a single bzip2 block as a standalone stream: the
+    # header, the block, then an end-of-stream marker whose combined CRC is
+    # the block's own CRC (that is what it works out to for one block).
+    start_bit, end_bit = span
+    first = start_bit // 8
+    with open(filename, 'rb') as f:
+        f.seek(first)
+        data = f.read((end_bit + 7) // 8 - first)
+    length = end_bit - start_bit
+    value = int.from_bytes(data, 'big') >> (len(data) * 8 - (end_bit - first * 8))
+    value &= (1 << length) - 1
+    crc = (value >> (length - 80)) & 0xFFFFFFFF
+    value = (value << 80) | (BZIP2_EOS_MAGIC << 32) | crc
+    length += 80
+    padding = -length % 8
+    value <<= padding
+    try:
+        return bz2.decompress(b'BZh9' + value.to_bytes((length + padding) // 8, 'big'))
+    except (OSError, ValueError):
+        # Corrupt, or the span was cut at block magic that occurred inside
+        # the data; the serial decoder sorts out which.
+        raise ParallelFallback()
+
+
+def bzip2_block_spans(filename):
+    blocks = scan_bits(filename, BZIP2_BLOCK_MAGIC)
+    ends = scan_bits(filename, BZIP2_EOS_MAGIC)
+    boundaries = sorted(blocks + ends)
+    spans = []
+    for start in blocks:
+        i = bisect.bisect_right(boundaries, start)
+        if i == len(boundaries):
+            raise ParallelFallback()
+        spans.append((start, boundaries[i]))
+    return spans
+
+
+def single_member_name(filename, suffixes):
+    # The one member of a .gz/.bz2 file is named the way gunzip/bunzip2 name
+    # their output: the compression suffix dropped (.tgz becomes .tar), or
+    # '.out' appended when the file has no such suffix.
+    base = os.path.basename(filename)
+    for suffix, replacement in suffixes:
+        if base.lower().endswith(suffix) and len(base) > len(suffix):
+            return base[:-len(suffix)] + replacement
+    return base + '.out'
+
+
+def gzip_stored_name(filename):
+    # The FNAME field of the first member's header, reduced to a bare file
+    # name, or None when the header has none.
+    with open(filename, 'rb') as f:
+        header = f.read(10)
+        if len(header) < 10 or header[:3] != GZIP_MAGIC or not header[3] & 0x08:
+            return None
+        if header[3] & 0x04:
+            extra_length = f.read(2)
+            if len(extra_length) < 2:
+                return None
+            f.seek(struct.unpack('<H', extra_length)[0], os.SEEK_CUR)
+        name, terminated, _ = f.read(4096).partition(b'\x00')
+    if not terminated:
+        return None
+    name = os.path.basename(name.decode('latin-1').replace('\\', '/'))
+    return name if name not in ('', '.', '..') else None
+
+
 class GzipHandler(ArchiveHandler):
+    format = 'gz'
+    buffer_size = STREAM_BUFFER_SIZE
+    # Threads used for multi-member/multi-block files (None: one per CPU).
+    parallel_workers = None
+
     def get_file_list(self):
-        return [os.path.basename(self.filename[:-3])]
+        # The uncompressed size is only known by decompressing everything.
+        return [(self.member_name(), None, os.path.getsize(self.filename))]
+
+    def member_name(self):
+        return gzip_stored_name(self.filename) or single_member_name(self.filename, (('.tgz', '.tar'), ('.gz', '')))
+
+    def edited_listing(self, listing, files_to_delete=(), renames=None, files_to_add=(), arcnames=None):
+        if files_to_add:
+            return [(listing[0][0], os.path.getsize(files_to_add[0]), os.path.getsize(self.filename))]
+        return listing
+
+    def open_member(self, name):
+        if name != self.member_name():
+            raise KeyError(f"filename {name!r} not found")
+        return io.BufferedReader(MemberStream(lambda stack: stack.enter_context(gzip.GzipFile(self.filename))))
 
     def extract_files(self, files_to_extract, extract_dir, callback):
-        with gzip.open(self.filename, 'rb') as f_in:
-            with open(os.path.join(extract_dir, files_to_extract[0]), 'wb') as f_out:
-                f_out.write(f_in.read())
-        callback.emit(1, 1, files_to_extract[0])
+        name = self.member_name()
+        missing = [member for member in files_to_extract if member != name]
+        if missing:
+            raise KeyError(f"filename {missing[0]!r} not found")
+        metrics = transfer_metrics(callback)
+        metrics.begin(os.path.getsize(self.filename), basis='in')
+        with metrics.member(name), open(os.path.join(extract_dir, name), 'wb') as f_out:
+            self.decompress_into(f_out, metrics)
+        metrics.finish()
+
+    def test_archive(self, callback=None, executor=None):
+        # The one member is decoded into nothing with the same parallel
+        # path extraction uses; the decoder checks the CRCs.
+        metrics = transfer_metrics(callback)
+        metrics.begin(os.path.getsize(self.filename), basis='in')
+        report = TestReport(self.filename, self.format, metrics)
+        sink = NullSink()
+        report.run(self.member_name(), lambda: self.decompress_into(sink, metrics) or sink.tell())
+        metrics.finish()
+        return report
+
+    def decompress_into(self, f_out, metrics):
+        workers = self.parallel_workers or os.cpu_count() or 1
+        if workers > 1:
+            try:
+                self.extract_parallel(f_out, metrics, workers)
+                return
+            except ParallelFallback:
+                f_out.seek(0)
+                f_out.truncate()
+                metrics.bytes_in = metrics.bytes_out = 0
+        with open(self.filename, 'rb') as raw, gzip.GzipFile(fileobj=MeteredReader(raw, metrics)) as f_in:
+            copy_stream_with_progress(f_in, f_out, metrics, self.buffer_size)
+
+    def extract_parallel(self, f_out, metrics, workers):
+        # Multi-member files (pigz/bgzip output, concatenated .gz) are decoded
+        # member by member. BGZF headers give the member boundaries outright;
+        # otherwise every plausible header is a candidate, and candidates
+        # ahead of the current member are decoded speculatively on a pool
+        # into bounded spools. The member the chain is actually at is always
+        # streamed straight to `f_out`, so a single-member file with stray
+        # magic bytes costs no more memory than the serial path.
+        size = os.path.getsize(self.filename)
+        candidates = bgzf_members(self.filename, size)
+        if candidates is None:
+            with open(self.filename, 'rb') as f:
+                candidates = []
+                for offset in scan_file(self.filename, GZIP_MAGIC):
+                    f.seek(offset)
+                    if gzip_header_plausible(f.read(10)):
+                        candidates.append(offset)
+        if len(candidates) < 2 or candidates[0] != 0 or size / len(candidates) > PARALLEL_MEMBER_LIMIT:
+            raise ParallelFallback()
+
+        def write(data):
+            with metrics.timed('write'):
+                f_out.write(data)
+            metrics.advance(bytes_out=len(data))
+
+        def decode_ahead(offset, spool):
+            return inflate_gzip_member(self.filename, offset, spool.write,
+                                       lambda: abandoned.is_set() or position > offset)
+
+        abandoned = threading.Event()
+        futures = {}
+        spools = {}
+        position = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                submitted = 0
+                while position < size:
+                    index = bisect.bisect_left(candidates, position)
+                    if index == len(candidates) or candidates[index] != position:
+                        with open(self.filename, 'rb') as f:
+                            f.seek(position)
+                            if f.read().strip(b'\x00'):
+                                raise ParallelFallback()
+                        break
+                    for offset in [offset for offset in futures if offset < position]:
+                        future = futures.pop(offset)
+                        future.cancel()
+                        future.add_done_callback(lambda future, spool=spools.pop(offset): spool.close())
+                    submitted = max(submitted, index + 1)
+                    while submitted < len(candidates) and submitted <= index + 2 * workers:
+                        offset = candidates[submitted]
+                        spools[offset] = tempfile.SpooledTemporaryFile(max_size=GZIP_SPOOL_SIZE)
+                        futures[offset] = executor.submit(decode_ahead, offset, spools[offset])
+                        submitted += 1
+                    if position in futures:
+                        with metrics.timed('decode'):
+                            end = futures.pop(position).result()
+                        spool = spools.pop(position)
+                        if end is not None:
+                            spool.seek(0)
+                            for chunk in read_chunks(spool, STREAM_BUFFER_SIZE):
+                                write(chunk)
+                        spool.close()
+                    else:
+                        with metrics.timed('decode'):
+                            end = inflate_gzip_member(self.filename, position, write)
+                    if end is None:
+                        raise ParallelFallback()
+                    metrics.advance(bytes_in=end - position)
+                    position = end
+            finally:
+                # Speculative decodes stop at their next chunk; their spools
+                # are closed once the pool has drained.
+                abandoned.set()
+                for future in futures.values():
+                    future.cancel()
+        for spool in spools.values():
+            spool.close()
+
+    def compress_file(self, file_path):
+        with open(file_path, 'rb') as f_in:
+            self.compress_stream(f_in)
+
+    def compress_stream(self, f_in):
+        # Independent gzip members compressed side by side; the concatenation
+        # is itself a valid .gz file.
+        workers = self.parallel_workers or os.cpu_count() or 1
+        with open(self.filename, 'wb') as f_out:
+            for member in ordered_parallel_map(gzip.compress, read_chunks(f_in, GZIP_COMPRESS_CHUNK_SIZE), workers):
+                f_out.write(member)
+
+    def write_members(self, members):
+        names = []
+        for member, stream in members:
+            if member.kind == 'dir':
+                continue
+            if names:
+                raise ValueError("A gzip file holds exactly one file")
+            self.compress_stream(stream)
+            names.append(member.name)
+        if not names:
+            self.create_archive()
+        return names
 
     def delete_files(self, files_to_delete):
         return
@@ -394,29 +3026,174 @@ class GzipHandler(ArchiveHandler):
         return False
 
     def create_archive(self):
-        return
+        with gzip.open(self.filename, 'wb') as _:
+            pass
 
-    def add_files(self, files_to_add):
-        return
+    def add_files(self, files_to_add, arcnames=None):
+        if len(files_to_add) != 1:
+            raise ValueError("A gzip file holds exactly one file")
+        self.compress_file(files_to_add[0])
 
     @property
     def supports_creation(self):
-        return False
+        return True
 
     @property
     def supports_adding(self):
-        return False
+        return True
+
+
+class Bzip2Reader(io.RawIOBase):
+    # Decodes concatenated bzip2 streams. bz2.BZ2File takes any stream after
+    # the first that fails to decode for trailing garbage and quietly ends
+    # there; here only bytes that do not start like a stream header are
+    # trailing garbage, and a damaged stream raises.
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.decompressor = bz2.BZ2Decompressor()
+        self.data = b""
+        self.started = False
+        self.done = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.done:
+            if self.decompressor.eof:
+                rest = self.decompressor.unused_data
+                while len(rest) < 4:
+                    chunk = self.fileobj.read(STREAM_BUFFER_SIZE)
+                    if not chunk:
+                        break
+                    rest += chunk
+                if not re.match(rb'BZh[1-9]', rest):
+                    self.done = True
+                    break
+                self.decompressor = bz2.BZ2Decompressor()
+                self.data = rest
+            if self.decompressor.needs_input and not self.data:
+                self.data = self.fileobj.read(STREAM_BUFFER_SIZE)
+                if not self.data:
+                    if not self.started:
+                        # An empty file holds no data at all.
+                        self.done = True
+                        break
+                    raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+            self.started = True
+            data = self.decompressor.decompress(self.data, len(b))
+            self.data = b""
+            if data:
+                b[:len(data)] = data
+                return len(data)
+        return 0
 
 
 class Bzip2Handler(ArchiveHandler):
+    format = 'bz2'
+    buffer_size = STREAM_BUFFER_SIZE
+    # Threads used for multi-member/multi-block files (None: one per CPU).
+    parallel_workers = None
+
     def get_file_list(self):
-        return [os.path.basename(self.filename[:-4])]
+        # The uncompressed size is only known by decompressing everything.
+        return [(self.member_name(), None, os.path.getsize(self.filename))]
+
+    def member_name(self):
+        return single_member_name(self.filename, (('.tbz2', '.tar'), ('.tbz', '.tar'), ('.bz2', '')))
+
+    def edited_listing(self, listing, files_to_delete=(), renames=None, files_to_add=(), arcnames=None):
+        if files_to_add:
+            return [(listing[0][0], os.path.getsize(files_to_add[0]), os.path.getsize(self.filename))]
+        return listing
+
+    def open_member(self, name):
+        if name != self.member_name():
+            raise KeyError(f"filename {name!r} not found")
+        return io.BufferedReader(MemberStream(
+            lambda stack: Bzip2Reader(stack.enter_context(open(self.filename, 'rb')))))
 
     def extract_files(self, files_to_extract, extract_dir, callback):
-        with bz2.open(self.filename, 'rb') as f_in:
-            with open(os.path.join(extract_dir, files_to_extract[0]), 'wb') as f_out:
-                f_out.write(f_in.read())
-        callback.emit(1, 1, files_to_extract[0])
+        name = self.member_name()
+        missing = [member for member in files_to_extract if member != name]
+        if missing:
+            raise KeyError(f"filename {missing[0]!r} not found")
+        metrics = transfer_metrics(callback)
+        metrics.begin(os.path.getsize(self.filename), basis='in')
+        with metrics.member(name), open(os.path.join(extract_dir, name), 'wb') as f_out:
+            self.decompress_into(f_out, metrics)
+        metrics.finish()
+
+    def test_archive(self, callback=None, executor=None):
+        # The one member is decoded into nothing with the same parallel
+        # path extraction uses; the decoder checks the CRCs.
+        metrics = transfer_metrics(callback)
+        metrics.begin(os.path.getsize(self.filename), basis='in')
+        report = TestReport(self.filename, self.format, metrics)
+        sink = NullSink()
+        report.run(self.member_name(), lambda: self.decompress_into(sink, metrics) or sink.tell())
+        metrics.finish()
+        return report
+
+    def decompress_into(self, f_out, metrics):
+        workers = self.parallel_workers or os.cpu_count() or 1
+        if workers > 1:
+            try:
+                self.extract_parallel(f_out, metrics, workers)
+                return
+            except ParallelFallback:
+                f_out.seek(0)
+                f_out.truncate()
+                metrics.bytes_in = metrics.bytes_out = 0
+        with open(self.filename, 'rb') as raw, Bzip2Reader(MeteredReader(raw, metrics)) as f_in:
+            copy_stream_with_progress(f_in, f_out, metrics, self.buffer_size)
+
+    def extract_parallel(self, f_out, metrics, workers):
+        # bzip2 blocks are independent and start with a 48-bit magic at any
+        # bit offset; each block is cut out, decoded on the pool and written
+        # back in order. bz2 checks every block CRC along the way.
+        size = os.path.getsize(self.filename)
+        spans = bzip2_block_spans(self.filename)
+        if len(spans) < 2 or size / len(spans) > PARALLEL_MEMBER_LIMIT:
+            raise ParallelFallback()
+        # A block can decode to around 45 MB when its run-length coding is
+        # at its most effective, so only one block per worker is decoded
+        # ahead of the writes.
+        decode = functools.partial(inflate_bzip2_block, self.filename)
+        blocks = ordered_parallel_map(decode, spans, workers, ahead=workers)
+        position = 0
+        for span in spans:
+            with metrics.timed('decode'):
+                data = next(blocks)
+            with metrics.timed('write'):
+                f_out.write(data)
+            metrics.advance(bytes_out=len(data), bytes_in=span[1] // 8 - position)
+            position = span[1] // 8
+
+    def compress_file(self, file_path):
+        with open(file_path, 'rb') as f_in:
+            self.compress_stream(f_in)
+
+    def compress_stream(self, f_in):
+        # One bzip2 stream per 900k block, compressed side by side (the same
+        # layout pbzip2 writes).
+        workers = self.parallel_workers or os.cpu_count() or 1
+        with open(self.filename, 'wb') as f_out:
+            for stream in ordered_parallel_map(bz2.compress, read_chunks(f_in, BZIP2_COMPRESS_CHUNK_SIZE), workers):
+                f_out.write(stream)
+
+    def write_members(self, members):
+        names = []
+        for member, stream in members:
+            if member.kind == 'dir':
+                continue
+            if names:
+                raise ValueError("A bzip2 file holds exactly one file")
+            self.compress_stream(stream)
+            names.append(member.name)
+        if not names:
+            self.create_archive()
+        return names
 
     def delete_files(self, files_to_delete):
         return
@@ -443,381 +3220,983 @@ class Bzip2Handler(ArchiveHandler):
         return False
 
     def create_archive(self):
-        return
+        with bz2.open(self.filename, 'wb') as _:
+            pass
 
-    def add_files(self, files_to_add):
-        return
+    def add_files(self, files_to_add, arcnames=None):
+        if len(files_to_add) != 1:
+            raise ValueError("A bzip2 file holds exactly one file")
+        self.compress_file(files_to_add[0])
 
     @property
     def supports_creation(self):
-        return False
+        return True
 
     @property
     def supports_adding(self):
-        return False
+        return True
 
 
-ARCHIVE_HANDLERS = {
-    '7z': SevenZipHandler,
-    'zip': ZipHandler,
-    'rar': RarHandler,
-    'tar': TarHandler,
-    'gz': GzipHandler,
-    'bz2': Bzip2Handler,
-}
-
-class MainWindow(QWidget):
+class HandlerRegistry:
+    # Extension -> handler class. Entries name the module a class lives in,
+    # which is only imported the first time that format is opened. Whether
+    # the format can be created is recorded here as well (it must agree with
+    # the handler's supports_creation), so listing the formats arc can write
+    # imports no backend.
     def __init__(self):
-        super().__init__()
-        self.setWindowTitle("Archive Viewer")
-        self.setGeometry(300, 300, 600, 400)
-        self.password_manager = keyring.get_keyring()
-        self.archive_filename = None
-        self.archive_handler = None
-
-        self.initUI()
-
-    def initUI(self):
-        # File selection
-        top_button_layout = QHBoxLayout()  # Layout for top buttons
-        top_button_layout.addWidget(QPushButton("Select Archive", self, clicked=self.openFile))
-        top_button_layout.addWidget(QPushButton("New Archive", self, clicked=self.createNewArchive))
-
-        # Center the top buttons
-        top_button_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
-
-        # File list
-        self.tree = QTreeWidget(self)
-        self.tree.setColumnCount(4)
-        self.tree.setHeaderLabels(["Select", "Filename", "Size", "Subdirectory"])
-        self.tree.header().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)  # Expand columns
-        self.tree.setGeometry(10, 80, self.width() - 20, self.height() - 180)
-        self.tree.itemClicked.connect(self.onTreeItemClicked)
-
-        # Action Buttons
-        bottom_button_layout = QHBoxLayout()  # Layout for bottom buttons
-        bottom_button_layout.addWidget(QPushButton("Extract", self, clicked=self.extractFiles))
-        bottom_button_layout.addWidget(QPushButton("Delete", self, clicked=self.deleteFiles))
-        bottom_button_layout.addWidget(QPushButton("Rename", self, clicked=self.renameFile))
-        bottom_button_layout.addWidget(QPushButton("Encrypt", self, clicked=self.encryptFiles))
-
-        # Center the bottom buttons
-        bottom_button_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
-
-        # Progress bar
-        self.progress_bar = QProgressBar(self)
-        self.progress_bar.setGeometry(10, self.height() - 40, 280, 15)  # Adjust position
-
-        # Status label
-        self.status_label = QLabel("Status: No archive selected", self)
-
-        # Layout the main widget
-        main_layout = QVBoxLayout()
-        main_layout.addLayout(top_button_layout)
-        main_layout.addWidget(self.tree)
-        main_layout.addLayout(bottom_button_layout)
-        main_layout.addWidget(self.status_label)
-        main_layout.addWidget(self.progress_bar)
-
-        self.setLayout(main_layout)
-
-    def openFile(self):
-        self.archive_filename = QFileDialog.getOpenFileName(
-            self, "Select Archive", "",
-            "All supported archives (*.7z *.zip *.rar *.tar *.gz *.bz2);;7z files (*.7z);;Zip files (*.zip);;Rar files (*.rar);;Tar files (*.tar);;Gzip files (*.gz);;Bzip2 files (*.bz2);;All files (*.*)"
-        )[0]
-
-        if self.archive_filename:
-            self.populateTree()
-            self.updateStatus(f"Loaded {len(self.archive_handler.get_file_list())} files from archive")
-
-    def createNewArchive(self):
-        self.archive_filename = QFileDialog.getSaveFileName(
-            self, "Create New Archive", "",
-            "7z files (*.7z);;Zip files (*.zip);;Rar files (*.rar);;Tar files (*.tar);;Gzip files (*.gz);;Bzip2 files (*.bz2);;All files (*.*)"
-        )[0]
-
-        if self.archive_filename:
-            self.createArchive()
-
-    def createArchive(self):
-        _, extension = os.path.splitext(self.archive_filename)
-        extension = extension[1:].lower()
-
-        if extension not in ARCHIVE_HANDLERS:
-            QMessageBox.warning(self, "Error", f"Unsupported file format: {extension}")
-            return
-
-        HandlerClass = ARCHIVE_HANDLERS[extension]
-        self.archive_handler = HandlerClass(self.archive_filename)
+        self.entries = {}
+        self.creatable = set()
 
-        if not self.archive_handler.supports_creation:
-            QMessageBox.warning(self, "Error", f"Creation of {extension} archives is not supported.")
-            return
-
-        try:
-            self.archive_handler.create_archive()
-            QMessageBox.information(self, "Success", f"New {extension} archive created successfully.")
-            self.populateTree()
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to create archive: {str(e)}")
+    def register(self, extension, module, name, creatable=False):
+        self.entries[extension] = (module, name)
+        if creatable:
+            self.creatable.add(extension)
 
-    def populateTree(self):
-        self.tree.clear()
-        try:
-            _, extension = os.path.splitext(self.archive_filename)
-            extension = extension[1:].lower()
+    def __contains__(self, extension):
+        return extension in self.entries
 
-            HandlerClass = ARCHIVE_HANDLERS[extension]
-            self.archive_handler = HandlerClass(self.archive_filename)
-            file_list = self.archive_handler.get_file_list()
+    def __iter__(self):
+        return iter(self.entries)
 
-            for file_path, file_size in file_list:
-                subdirectory = os.path.dirname(file_path)
-                subdirectory = subdirectory if subdirectory else ""  # Handle root files
+    def __len__(self):
+        return len(self.entries)
 
-                item = QTreeWidgetItem(self.tree)
-                item.setText(0, "☐")
-                item.setText(1, file_path)
-                item.setText(2, f"{file_size} bytes")
-                item.setText(3, subdirectory)
+    def __getitem__(self, extension):
+        module, name = self.entries[extension]
+        return getattr(importlib.import_module(module), name)
 
-            self.updateStatus(f"Loaded {len(file_list)} files from archive")
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to read archive: {str(e)}")
 
-    def onTreeItemClicked(self, item, column):
-        if column == 0:
-            if item.text(0) == "☐":
-                item.setText(0, "☑")
-            else:
-                item.setText(0, "☐")
+ARCHIVE_HANDLERS = HandlerRegistry()
+ARCHIVE_HANDLERS.register('7z', 'arc_7z', 'SevenZipHandler', creatable=True)
+ARCHIVE_HANDLERS.register('zip', __name__, 'ZipHandler', creatable=True)
+ARCHIVE_HANDLERS.register('rar', __name__, 'RarHandler')
+ARCHIVE_HANDLERS.register('tar', __name__, 'TarHandler')
+ARCHIVE_HANDLERS.register('gz', __name__, 'GzipHandler', creatable=True)
+ARCHIVE_HANDLERS.register('bz2', __name__, 'Bzip2Handler', creatable=True)
 
-    def updateStatus(self, message):
-        self.status_label.setText(f"Status: {message}")
 
-    def extractFiles(self):
-        if not self.archive_filename:
-            QMessageBox.warning(self, "Error", "No archive file selected.")
-            return
+def __getattr__(name):
+    # Handlers from backend modules stay reachable as arc.<Name>, loaded on
+    # first access.
+    for module, class_name in ARCHIVE_HANDLERS.entries.values():
+        if class_name == name and module != __name__:
+            return getattr(importlib.import_module(module), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-        selected_files = [self.tree.topLevelItem(i).text(1)
-                         for i in range(self.tree.topLevelItemCount())
-                         if self.tree.topLevelItem(i).text(0) == "☑"]
 
-        if not selected_files:
-            selected_files = [self.tree.topLevelItem(i).text(1)
-                             for i in range(self.tree.topLevelItemCount())]
+class Bitset:
+    # One bit per MemberTable row.
+    def __init__(self):
+        self.bits = bytearray()
+        self.size = 0
 
-        if not selected_files:
-            QMessageBox.information(self, "Info", "No files to extract.")
-            return
+    def __len__(self):
+        return self.size
 
-        extract_dir = QFileDialog.getExistingDirectory(
-            self, "Select Extraction Directory", os.path.expanduser("~")
-        )
+    def __getitem__(self, i):
+        return self.bits[i >> 3] >> (i & 7) & 1
 
-        if not extract_dir:
-            return
+    def __setitem__(self, i, value):
+        if value:
+            self.bits[i >> 3] |= 1 << (i & 7)
+        else:
+            self.bits[i >> 3] &= ~(1 << (i & 7))
 
-        def extraction_thread(files, extract_dir, callback):
-            try:
-                for i, file in enumerate(files, 1):
-                    self.archive_handler.extract_files(
-                        [file], extract_dir, callback
-                    )
-                callback.emit(len(files), len(files), "")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Error during extraction: {str(e)}")
-
-        class ExtractionProgress(QThread):
-            update_signal = pyqtSignal(int, int, str)
-
-            def __init__(self, files, extract_dir):
-                super().__init__()
-                self.files = files
-                self.extract_dir = extract_dir
-
-            def run(self):
-                extraction_thread(self.files, self.extract_dir, self.update_signal)
-
-        self.extraction_progress = ExtractionProgress(selected_files, extract_dir)
-        self.extraction_progress.update_signal.connect(self.updateProgressBar)
-        self.extraction_progress.start()
-        self.progress_bar.setValue(0)
-
-    def updateProgressBar(self, current, total, file):
-        self.progress_bar.setValue(int((current / total) * 100))
-        self.updateStatus(f"Extracting: {file}")
-        if current == total:
-            self.updateStatus(
-                f"Extraction completed. Files extracted to {self.extraction_progress.extract_dir}"
-            )
-            QMessageBox.information(
-                self, "Success",
-                f"Extraction completed. Files extracted to {self.extraction_progress.extract_dir}",
-            )
-            self.progress_bar.setValue(0)
+    def extend(self, count):
+        self.size += count
+        self.bits.extend(bytes((self.size + 7) // 8 - len(self.bits)))
 
-    def deleteFiles(self):
-        if not self.archive_filename:
-            QMessageBox.warning(self, "Error", "No archive file selected.")
-            return
+    def __iter__(self):
+        # Set bits in order; runs of empty bytes are skipped by the regex
+        # engine rather than one at a time.
+        for match in re.finditer(rb'[^\x00]', self.bits):
+            byte, base = match.group()[0], match.start() * 8
+            for bit in range(8):
+                if byte >> bit & 1:
+                    yield base + bit
 
-        selected_files = [
-            self.tree.topLevelItem(i).text(1)
-            for i in range(self.tree.topLevelItemCount())
-            if self.tree.topLevelItem(i).text(0) == "☑"
-        ]
+    def count(self):
+        return int.from_bytes(self.bits, 'little').bit_count()
 
-        if not selected_files:
-            QMessageBox.warning(self, "Error", "No files selected for deletion.")
-            return
 
-        if not self.archive_handler.supports_deletion:
-            QMessageBox.warning(
-                self, "Error", "Deletion is not supported for this archive format."
-            )
+class MemberTable:
+    # Flat, array-backed listing: row i is names[i] (None once deleted) with
+    # sizes[i] and compressed[i] bytes (-1 when unknown), and checked[i] set
+    # when the row is ticked. `version` changes with every edit to the names.
+    def __init__(self):
+        self.names = []
+        self.sizes = array.array('q')
+        self.compressed = array.array('q')
+        self.checked = Bitset()
+        self.version = 0
+
+    def __len__(self):
+        return len(self.names)
+
+    def extend(self, members):
+        first = len(self.names)
+        for name, size, compressed in members:
+            self.names.append(name)
+            self.sizes.append(-1 if size is None else size)
+            self.compressed.append(-1 if compressed is None else compressed)
+        self.checked.extend(len(members))
+        self.version += 1
+        return range(first, len(self.names))
+
+    def remove(self, row):
+        self.names[row] = None
+        self.checked[row] = 0
+        self.version += 1
+
+    def rename(self, row, name):
+        self.names[row] = name
+        self.version += 1
+
+    def checked_names(self):
+        return [self.names[i] for i in self.checked if self.names[i] is not None]
+
+
+def glob_to_regex(pattern):
+    # Like fnmatch.translate, minus the anchors, but wildcards (negated sets
+    # included) never cross a newline so the result can be run over the
+    # newline-joined listing.
+    parts = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        i += 1
+        if c == '*':
+            parts.append('[^\n]*')
+        elif c == '?':
+            parts.append('[^\n]')
+        elif c == '[':
+            end = i + 1 if pattern[i:i + 1] == '!' else i
+            end = pattern.find(']', end + 1 if pattern[end:end + 1] == ']' else end)
+            if end < 0:
+                parts.append('\\[')
+                continue
+            parts.append(glob_set_to_regex(pattern[i:end]))
+            i = end + 1
+        else:
+            parts.append(re.escape(c))
+    return ''.join(parts)
+
+
+def glob_set_to_regex(body):
+    # A [...] set the way fnmatch translates it: ranges are kept, empty ones
+    # dropped, and anything re would read as a nested set, a set operation
+    # ([, --, &&, ~~, ||) or the end of the set is escaped.
+    negated = body.startswith('!')
+    if negated:
+        body = body[1:]
+    chunks = []
+    start = 0
+    k = 1
+    while True:
+        k = body.find('-', k)
+        if k < 0:
+            break
+        chunks.append(body[start:k])
+        start = k + 1
+        k += 3
+    if body[start:]:
+        chunks.append(body[start:])
+    elif chunks:
+        chunks[-1] += '-'
+    for k in range(len(chunks) - 1, 0, -1):
+        if chunks[k - 1][-1] > chunks[k][0]:
+            chunks[k - 1] = chunks[k - 1][:-1] + chunks[k][1:]
+            del chunks[k]
+    body = '-'.join(re.sub(r'([\\\-\[\]&~|])', r'\\\1', chunk) for chunk in chunks)
+    if negated:
+        return '[^\n' + body + ']'
+    if not body:
+        return '(?!)'
+    if body.startswith('^'):
+        body = '\\' + body
+    return '[' + body + ']'
+
+
+class MemberIndex:
+    # Search structures over a MemberTable, each built on first use and
+    # dropped when the table's version moves:
+    # - a sorted array of names, answering patterns with a literal prefix by
+    #   bisection;
+    # - rows by lower-cased extension;
+    # - the live names joined by newlines, which patterns without a usable
+    #   prefix are run over in a single regex pass.
+    def __init__(self, table):
+        self.table = table
+        self.version = None
+        self.built = {}
+
+    def get(self, structure):
+        if self.version != self.table.version:
+            self.version = self.table.version
+            self.built = {}
+        if structure not in self.built:
+            self.built[structure] = getattr(self, 'build_' + structure)()
+        return self.built[structure]
+
+    def live_rows(self):
+        names = self.table.names
+        return [row for row in range(len(names)) if names[row] is not None]
+
+    def build_sorted(self):
+        names = self.table.names
+        rows = array.array('q', sorted(self.live_rows(), key=names.__getitem__))
+        return rows, [names[row] for row in rows]
+
+    def build_extensions(self):
+        names = self.table.names
+        extensions = collections.defaultdict(lambda: array.array('q'))
+        for row in self.live_rows():
+            head, dot, extension = names[row].rpartition('.')
+            if dot and head and head[-1] != '/' and '/' not in extension:
+                extensions['.' + extension.lower()].append(row)
+        return extensions
+
+    def build_text(self):
+        names = self.table.names
+        rows = array.array('q', self.live_rows())
+        starts = array.array('q', itertools.accumulate((len(names[row]) + 1 for row in rows[:-1]), initial=0))
+        return rows, starts, '\n'.join(names[row] for row in rows)
+
+    def search(self, query):
+        # "ext:jpg" (or "*.jpg"), "re:<regex>", or a glob; a glob without
+        # wildcards matches any path containing it.
+        if query.startswith('ext:'):
+            return self.extension(query[4:])
+        if query.startswith('re:'):
+            pattern = re.compile(query[3:], re.MULTILINE)
+            return self.regex(pattern, pattern)
+        if not any(c in query for c in '*?['):
+            query = '*' + query + '*'
+        if query.startswith('*.') and not any(c in query[2:] for c in '*?[/'):
+            return self.extension(query[2:])
+        body = glob_to_regex(query)
+        pattern = re.compile('^' + body + '$')
+        prefix = re.split(r'[*?\[]', query, maxsplit=1)[0]
+        if prefix:
+            return self.prefixed(prefix, pattern)
+        # A leading '*' only makes the scan backtrack; the check against
+        # each name still applies the whole pattern.
+        scan = body[len('[^\n]*'):] if query.startswith('*') else '^' + body
+        return self.regex(re.compile(scan, re.MULTILINE), pattern)
+
+    def extension(self, extension):
+        return list(self.get('extensions').get('.' + extension.lstrip('.').lower(), ()))
+
+    def prefixed(self, prefix, pattern):
+        rows, names = self.get('sorted')
+        first = bisect.bisect_left(names, prefix)
+        last = bisect.bisect_left(names, prefix + '\U0010ffff', first)
+        return sorted(rows[i] for i in range(first, last) if pattern.search(names[i]))
+
+    def regex(self, scan, pattern):
+        # The whole listing is scanned in C; each hit is checked against its
+        # own line, and the scan resumes at the next line so a match running
+        # across names cannot hide the next one.
+        matches = []
+        rows, starts, text = self.get('text')
+        position = 0
+        while True:
+            match = scan.search(text, position)
+            if match is None:
+                return matches
+            i = bisect.bisect_right(starts, match.start()) - 1
+            row = rows[i]
+            if pattern.search(self.table.names[row]):
+                matches.append(row)
+            if i + 1 == len(starts):
+                return matches
+            position = starts[i + 1]
+
+
+class DirectoryNode:
+    # `entries` holds the node's rows in display order: child DirectoryNodes
+    # and MemberTable rows of the files directly inside it. size, compressed,
+    # count and checked are totals over every file below the node.
+    __slots__ = ('name', 'parent', 'depth', 'row', 'entries', 'dirs', 'files', 'member',
+                 'size', 'compressed', 'count', 'checked', 'shown')
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent is not None else 0
+        self.row = 0
+        self.entries = []
+        self.dirs = {}
+        self.files = {}
+        # MemberTable row of the archive's own entry for this directory.
+        self.member = None
+        self.size = 0
+        self.compressed = 0
+        self.count = 0
+        self.checked = 0
+        # Entries the model has announced to the view so far.
+        self.shown = 0
+
+
+class DirectoryTree:
+    # Trie over the '/'-separated member paths of a MemberTable. Inserting or
+    # removing members touches only the directories on their paths, and the
+    # totals of a batch are carried up the tree once per directory.
+    def __init__(self, table):
+        self.table = table
+        self.root = DirectoryNode('')
+        # Per-directory [count, checked, size, compressed] deltas not yet
+        # added to the directories above; see flush().
+        self.totals = {}
+        # (node, position) of file rows turned into directories by insert().
+        self.replaced = []
+
+    def insert(self, rows):
+        names = self.table.names
+        directories = {}
+        for row in rows:
+            head, _, leaf = names[row].rpartition('/')
+            node = directories.get(head)
+            if node is None:
+                node = directories[head] = self.directory(head)
+            self.totals.setdefault(node, [0, 0, 0, 0])
+            if not leaf:
+                if node is not self.root:
+                    node.member = row
+            elif leaf in node.dirs:
+                node.dirs[leaf].member = row
+            else:
+                node.files[leaf] = row
+                node.entries.append(row)
+                self.account(node, row, 1)
+
+    def directory(self, path):
+        node = self.root
+        for part in path.split('/'):
+            if part:
+                node = node.dirs.get(part) or self.mkdir(node, part)
+        return node
+
+    def mkdir(self, node, name):
+        child = DirectoryNode(name, node)
+        row = node.files.pop(name, None)
+        if row is None:
+            child.row = len(node.entries)
+            node.entries.append(child)
+        else:
+            # 7z and tar store directories without the trailing slash, so the
+            # directory's own entry can arrive before its contents.
+            child.row = node.entries.index(row)
+            node.entries[child.row] = child
+            child.member = row
+            self.account(node, row, -1)
+            self.replaced.append((node, child.row))
+        node.dirs[name] = child
+        return child
+
+    def find(self, name):
+        # Directory holding `name` and the last path component, or None.
+        head, _, leaf = name.rpartition('/')
+        node = self.root
+        for part in head.split('/'):
+            if part:
+                node = node.dirs.get(part)
+                if node is None:
+                    return None, leaf
+        return node, leaf
+
+    def account(self, node, row, sign):
+        total = self.totals.setdefault(node, [0, 0, 0, 0])
+        total[0] += sign
+        total[1] += sign * self.table.checked[row]
+        if self.table.sizes[row] >= 0:
+            total[2] += sign * self.table.sizes[row]
+        if self.table.compressed[row] >= 0:
+            total[3] += sign * self.table.compressed[row]
+
+    def flush(self):
+        # Adds the pending deltas to each directory and everything above it.
+        # Returns every directory that was touched.
+        touched = set()
+        for node, (count, checked, size, compressed) in self.totals.items():
+            while node is not None:
+                node.count += count
+                node.checked += checked
+                node.size += size
+                node.compressed += compressed
+                touched.add(node)
+                node = node.parent
+        self.totals = {}
+        return touched
+
+    def detach(self, node, position):
+        entry = node.entries.pop(position)
+        if isinstance(entry, DirectoryNode):
+            del node.dirs[entry.name]
+        else:
+            leaf = self.table.names[entry].rpartition('/')[2]
+            if node.files.get(leaf) == entry:
+                del node.files[leaf]
+            self.account(node, entry, -1)
+        for later in node.entries[position:]:
+            if isinstance(later, DirectoryNode):
+                later.row -= 1
+
+    def check(self, node, row, checked):
+        if self.table.checked[row] == checked:
             return
+        self.table.checked[row] = checked
+        if node.member != row:
+            self.totals.setdefault(node, [0, 0, 0, 0])[1] += 1 if checked else -1
 
-        if QMessageBox.question(
-            self,
-            "Confirm Deletion",
-            f"Are you sure you want to delete {len(selected_files)} file(s) from the archive?",
-            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
-        ) == QMessageBox.StandardButton.Yes:
-            try:
-                self.archive_handler.delete_files(selected_files)
-                QMessageBox.information(
-                    self, "Success", f"Successfully deleted {len(selected_files)} file(s) from the archive."
-                )
-                self.populateTree()
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to delete files: {str(e)}")
-
-    def renameFile(self):
-        if not self.archive_filename:
-            QMessageBox.warning(self, "Error", "No archive file selected.")
-            return
+    def walk(self, node):
+        yield node
+        for entry in node.entries:
+            if isinstance(entry, DirectoryNode):
+                yield from self.walk(entry)
 
-        selected_items = self.tree.selectedItems()
-        if not selected_items:
-            QMessageBox.warning(self, "Error", "No file selected for renaming.")
-            return
 
-        if not self.archive_handler.supports_renaming:
-            QMessageBox.warning(
-                self, "Error", "Renaming is not supported for this archive format."
-            )
-            return
+DETECT_READ_SIZE = 4096
+# Longest first, so '.tar.gz' wins over '.gz'.
+NAME_FORMATS = [
+    ('.tar.gz', 'tar'), ('.tar.bz2', 'tar'), ('.tar.xz', 'tar'),
+    ('.tgz', 'tar'), ('.tbz2', 'tar'), ('.tbz', 'tar'), ('.txz', 'tar'),
+    ('.7z', '7z'), ('.zip', 'zip'), ('.rar', 'rar'), ('.tar', 'tar'), ('.gz', 'gz'), ('.bz2', 'bz2'),
+]
 
-        renamed_files = 0
-        skipped_files = 0
 
-        for item in selected_items:
-            old_name = item.text(1)
-            new_name, ok = QInputDialog.getText(
-                self, "Rename File", f"Enter new name for {old_name}:"
-            )
+def format_from_name(filename):
+    name = os.path.basename(filename).lower()
+    for suffix, format in NAME_FORMATS:
+        if name.endswith(suffix):
+            return format
+    return None
 
-            if ok:
-                if new_name == old_name:
-                    skipped_files += 1
-                    continue
 
-                try:
-                    self.archive_handler.rename_file(old_name, new_name)
-                    renamed_files += 1
-                except Exception as e:
-                    QMessageBox.critical(self, "Error", f"Failed to rename {old_name}: {str(e)}")
-                    skipped_files += 1
+def is_tar_header(block):
+    if len(block) < 512 or not block[0]:
+        return False
+    if block[257:262] == b'ustar':
+        return True
+    # Pre-POSIX tar has no magic; its header checksum has to add up.
+    try:
+        checksum = int(block[148:156].strip(b'\x00 ') or b'-1', 8)
+    except ValueError:
+        return False
+    return checksum == sum(block[:148]) + 8 * 0x20 + sum(block[156:512])
+
+
+def sniff_format(head, filename=''):
+    # `head` is the first few KB of the file. Compressed tars are told apart
+    # from a single compressed file by decoding the first header; bzip2
+    # cannot be decoded before a whole block (up to 900 KB) is in, so there
+    # the name decides.
+    if head[:4] in (b'PK\x03\x04', b'PK\x05\x06', b'PK\x07\x08'):
+        return 'zip'
+    if head.startswith(b"7z\xbc\xaf\x27\x1c"):
+        return '7z'
+    if head.startswith(b'Rar!\x1a\x07'):
+        return 'rar'
+    if head.startswith(b'\x1f\x8b'):
+        try:
+            block = zlib.decompressobj(31).decompress(head, 512)
+        except zlib.error:
+            return 'gz'
+        return 'tar' if is_tar_header(block) else 'gz'
+    if head.startswith(b'\xfd7zXZ\x00'):
+        try:
+            block = lzma.LZMADecompressor().decompress(head, 512)
+        except lzma.LZMAError:
+            return None
+        return 'tar' if is_tar_header(block) else None
+    if head.startswith(b'BZh'):
+        return 'tar' if format_from_name(filename) == 'tar' else 'bz2'
+    if is_tar_header(head):
+        return 'tar'
+    return None
+
+
+def sniff_file(filename):
+    with open(filename, 'rb') as f:
+        return sniff_format(f.read(DETECT_READ_SIZE), filename)
+
+
+def detect_format(filename):
+    # One small read per file, skipped when the listing cache has already
+    # seen this version of it. Files whose contents say nothing (new, empty
+    # or unrecognised) go by their name.
+    if not os.path.exists(filename):
+        return format_from_name(filename)
+    return LISTING_CACHE.format(filename) or sniff_file(filename) or format_from_name(filename)
+
+
+def open_archive(filename):
+    format = detect_format(filename)
+    if format not in ARCHIVE_HANDLERS:
+        raise ValueError(f"Unsupported file format: {os.path.splitext(filename)[1][1:].lower()}")
+    return ARCHIVE_HANDLERS[format](filename)
+
+
+def select_members(handler, names=(), patterns=()):
+    # Exact member names plus everything matching one of `patterns` (the
+    # GUI's search syntax); the whole archive when neither is given.
+    listing = handler.file_list()
+    if not names and not patterns:
+        return [name for name, _, _ in listing]
+    known = {name for name, _, _ in listing}
+    missing = [name for name in names if name not in known]
+    if missing:
+        raise KeyError(f"filename {missing[0]!r} not found")
+    rows = set()
+    if patterns:
+        table = MemberTable()
+        table.extend(listing)
+        index = MemberIndex(table)
+        for pattern in patterns:
+            rows.update(index.search(pattern))
+    selected = set(names)
+    return list(names) + [listing[row][0] for row in sorted(rows) if listing[row][0] not in selected]
+
+
+def list_archive(filename):
+    return open_archive(filename).file_list()
+
+
+def open_member(filename, name):
+    return open_archive(filename).open_member(name)
+
+
+def extract_archive(filename, extract_dir, names=(), patterns=(), callback=None):
+    handler = open_archive(filename)
+    members = select_members(handler, names, patterns)
+    if members:
+        os.makedirs(extract_dir, exist_ok=True)
+        handler.extract_files(members, extract_dir, callback)
+    return members
+
+
+# What sync() does to an archive: (file path, member name) pairs to add and
+# to replace, member names to remove, and the member names left alone.
+SyncPlan = collections.namedtuple('SyncPlan', 'added replaced removed unchanged')
+
+
+def file_crc32(file_path):
+    crc = 0
+    with open(file_path, 'rb') as f:
+        for chunk in read_chunks(f, COPY_CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def plan_sync(handler, directory):
+    # A member whose size differs from its file's has changed; one whose
+    # size and mtime both match has not. When only the mtime differs (the
+    # file was touched, or restored from elsewhere) the file's CRC-32 is
+    # checked against the one the archive recorded, so only those files are
+    # read. Empty directories get a member of their own (zip names it with
+    # a trailing slash, 7z without); other directories are implied by the
+    # members inside them.
+    stamps = handler.member_stamps() if os.path.exists(handler.filename) else {}
+    directories = set()
+    added, replaced, unchanged = [], [], []
+    for root, subdirectories, files in os.walk(directory):
+        subdirectories.sort()
+        relative = os.path.relpath(root, directory)
+        prefix = '' if relative == os.curdir else relative.replace(os.sep, '/') + '/'
+        directories.update(prefix + name for name in subdirectories)
+        files = [name for name in sorted(files) if os.path.isfile(os.path.join(root, name))]
+        if prefix and not subdirectories and not files:
+            arcname = prefix[:-1]
+            existing = [name for name in (arcname, prefix) if name in stamps and stamps[name][0] is None]
+            if existing:
+                unchanged.extend(existing)
             else:
-                skipped_files += 1
-
-        if renamed_files > 0:
-            QMessageBox.information(
-                self, "Success", f"Successfully renamed {renamed_files} file(s)."
-            )
-            self.populateTree()
-
-        if skipped_files > 0:
-            QMessageBox.information(
-                self, "Information", f"{skipped_files} file(s) were not renamed."
-            )
-
-    def encryptFiles(self):
-        if not self.archive_filename:
-            QMessageBox.warning(self, "Error", "No archive file selected.")
-            return
-
-        if not self.archive_handler.supports_encryption:
-            QMessageBox.warning(
-                self, "Error", "Encryption is not supported for this archive format."
-            )
-            return
-
-        selected_items = self.tree.selectedItems()
-        if not selected_items:
-            # Encrypt entire archive
-            password, ok = QInputDialog.getText(
-                self, "Encrypt Archive", "Enter master password for the archive:", echo=QLineEdit.EchoMode.Password
-            )
-            if ok:
-                try:
-                    self.password_manager.set(self.archive_filename, "master_password", password)
-                    self.archive_handler.encrypt_archive(password)
-                    QMessageBox.information(self, "Success", "Archive encrypted successfully.")
-                except Exception as e:
-                    QMessageBox.critical(self, "Error", f"Failed to encrypt archive: {str(e)}")
-        else:
-            # Encrypt selected files
-            files_to_encrypt = {}
-            for item in selected_items:
-                file_name = item.text(1)
-                password, ok = QInputDialog.getText(
-                    self, "Encrypt File", f"Enter password for {file_name}:", echo=QLineEdit.EchoMode.Password
-                )
-                if ok:
-                    self.password_manager.set(self.archive_filename, file_name, password)
-                    files_to_encrypt[file_name] = password
-
-            if files_to_encrypt:
-                try:
-                    self.archive_handler.encrypt_files(files_to_encrypt, files_to_encrypt)
-                    QMessageBox.information(
-                        self, "Success", f"Successfully encrypted {len(files_to_encrypt)} file(s)."
-                    )
-                except Exception as e:
-                    QMessageBox.critical(self, "Error", f"Failed to encrypt files: {str(e)}")
-
-        self.populateTree()
-
-    def addFiles(self):
-        if not self.archive_filename:
-            QMessageBox.warning(self, "Error", "No archive file selected. Please create or open an archive first.")
-            return
-
-        if not self.archive_handler.supports_adding:
-            QMessageBox.warning(self, "Error", "Adding files is not supported for this archive format.")
-            return
-
-        files_to_add = QFileDialog.getOpenFileNames(
-            self, "Select Files to Add", "", "All files (*.*)"
-        )[0]
-
-        if files_to_add:
+                added.append((root, arcname))
+        for name in files:
+            file_path = os.path.join(root, name)
+            arcname = prefix + name
+            if arcname not in stamps or stamps[arcname][0] is None:
+                added.append((file_path, arcname))
+                continue
+            size, mtime, crc = stamps[arcname]
+            # Symlinks are followed by zip but stored as links by 7z.
+            stats = [os.stat(file_path)] + ([os.lstat(file_path)] if os.path.islink(file_path) else [])
+            stats = [stat for stat in stats if stat.st_size == size]
+            if not stats:
+                replaced.append((file_path, arcname))
+            elif (mtime is not None and any(abs(stat.st_mtime - mtime) < handler.mtime_resolution for stat in stats)) \
+                    or (crc is not None and file_crc32(file_path) == crc):
+                unchanged.append(arcname)
+            else:
+                replaced.append((file_path, arcname))
+    seen = {arcname for file_path, arcname in added + replaced if not os.path.isdir(file_path)} | set(unchanged)
+    removed = [name for name, (size, _, _) in stamps.items()
+               if (name not in seen if size is not None else name.rstrip('/') not in directories)]
+    return SyncPlan(added, replaced, removed, unchanged)
+
+
+def sync_archive(filename, directory, dry_run=False, budget=None):
+    # Creates the archive first when it does not exist yet. `budget` is a
+    # CompressionPolicy budget for the files that get written.
+    if not os.path.isdir(directory):
+        raise NotADirectoryError(f"{directory} is not a directory")
+    handler = open_archive(filename)
+    if not handler.supports_adding or not handler.supports_deletion:
+        raise ValueError("Syncing is not supported for this archive format.")
+    if budget:
+        handler.compression = CompressionPolicy(budget)
+    if not os.path.exists(filename) and not dry_run:
+        handler.create_archive()
+    return handler.sync(directory, dry_run)
+
+
+def add_to_archive(filename, files_to_add, budget=None):
+    # Creates the archive first when it does not exist yet.
+    handler = open_archive(filename)
+    if not handler.supports_adding:
+        raise ValueError("Adding files is not supported for this archive format.")
+    if budget:
+        handler.compression = CompressionPolicy(budget)
+    if not os.path.exists(filename):
+        handler.create_archive()
+    transaction = handler.begin_edit()
+    transaction.add(files_to_add)
+    transaction.commit()
+    return files_to_add
+
+
+def delete_from_archive(filename, files_to_delete):
+    handler = open_archive(filename)
+    if not handler.supports_deletion:
+        raise ValueError("Deletion is not supported for this archive format.")
+    select_members(handler, files_to_delete)
+    transaction = handler.begin_edit()
+    transaction.delete(files_to_delete)
+    transaction.commit()
+    return files_to_delete
+
+
+def rename_in_archive(filename, renames):
+    handler = open_archive(filename)
+    if not handler.supports_renaming:
+        raise ValueError("Renaming is not supported for this archive format.")
+    select_members(handler, list(renames))
+    transaction = handler.begin_edit()
+    for old_name, new_name in renames.items():
+        transaction.rename(old_name, new_name)
+    transaction.commit()
+    return renames
+
+
+def test_archive(filename, callback=None, executor=None):
+    # Always returns a TestReport; an archive that cannot be opened at all
+    # is reported with `error` set.
+    metrics = transfer_metrics(callback)
+    try:
+        handler = open_archive(filename)
+        return handler.test_archive(metrics, executor)
+    except OperationCancelled:
+        raise
+    except Exception as e:
+        report = TestReport(filename, format_from_name(filename), metrics)
+        report.error = str(e)
+        return report
+
+
+def test_archives(filenames, workers=None):
+    # Yields (filename, TestReport) in order. The archives are opened side
+    # by side and all of their members go through one shared pool, so a
+    # few large archives still keep every core busy.
+    workers = workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for filename, report, _ in run_batch(lambda filename: test_archive(filename, None, executor),
+                                            filenames, workers):
+            yield filename, report
+
+
+def convert_archive(source, target, callback=None):
+    # Streams every member from the source handler straight into a new
+    # target archive: the source decodes on a thread of its own while the
+    # target encodes, with a bounded pipe in between, so nothing but the
+    # target is written and memory use does not grow with the archive.
+    source_handler = open_archive(source)
+    target_handler = open_archive(target)
+    if not target_handler.supports_creation:
+        raise ValueError(f"Cannot create {os.path.splitext(target)[1][1:]} archives")
+    metrics = transfer_metrics(callback)
+    metrics.begin(sum(size or 0 for _, size, _ in source_handler.file_list()))
+    try:
+        members = target_handler.write_members(MemberPipe(source_handler, metrics, target_handler.write_needs_sizes))
+    except BaseException:
+        if os.path.exists(target):
+            os.remove(target)
+        raise
+    metrics.finish()
+    return members
+
+
+def run_batch(function, archives, workers=None):
+    # Calls `function(archive)` for every archive side by side and yields
+    # (archive, result, error) in the order the archives were given.
+    workers = workers or min(len(archives), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = [executor.submit(function, archive) for archive in archives]
+        for archive, future in zip(archives, futures):
             try:
-                self.archive_handler.add_files(files_to_add)
-                QMessageBox.information(
-                    self, "Success", f"Successfully added {len(files_to_add)} file(s) to the archive."
-                )
-                self.populateTree()
+                yield archive, future.result(), None
             except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to add files: {str(e)}")
+                yield archive, None, e
+
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if size < 1024 or unit == 'TB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='arc', description="List, extract and edit 7z, zip, rar, tar, gz and bz2 archives. "
+                                "Run without arguments to open the GUI.")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="archives processed at once (default: one per core)")
+    parser.add_argument('--trace', metavar='DIR', help="write a JSON metrics trace per archive to DIR")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('list', help="list members")
+    command.add_argument('archives', nargs='+')
+    command.add_argument('-l', '--long', action='store_true', help="show sizes")
+
+    command = commands.add_parser('extract', help="extract members")
+    command.add_argument('archives', nargs='+')
+    command.add_argument('-C', '--directory', default='.', help="output directory; with several archives "
+                                                                "each goes into a subdirectory named after it")
+    command.add_argument('-n', '--name', action='append', default=[], help="member to extract (repeatable)")
+    command.add_argument('-m', '--match', action='append', default=[],
+                         help="extract members matching a pattern: *.txt, docs/*, ext:jpg, re:<regex>")
+
+    command = commands.add_parser('add', help="add files, creating the archive if needed")
+    command.add_argument('archive')
+    command.add_argument('files', nargs='+')
+    command.add_argument('--budget', choices=sorted(CompressionPolicy.BUDGETS),
+                         help="trade CPU for size when picking each file's codec (default: balanced for zip; "
+                              "7z uses LZMA2 at preset 7 unless a budget is given)")
+
+    command = commands.add_parser('sync', help="update an archive from a directory, rewriting only what changed")
+    command.add_argument('archive')
+    command.add_argument('directory')
+    command.add_argument('-n', '--dry-run', action='store_true', help="only show what would change")
+    command.add_argument('--budget', choices=sorted(CompressionPolicy.BUDGETS),
+                         help="trade CPU for size when picking each file's codec")
+
+    command = commands.add_parser('delete', help="delete members")
+    command.add_argument('archive')
+    command.add_argument('members', nargs='+')
+
+    command = commands.add_parser('rename', help="rename a member")
+    command.add_argument('archive')
+    command.add_argument('old_name')
+    command.add_argument('new_name')
+
+    command = commands.add_parser('cat', help="write a member to standard output")
+    command.add_argument('archive')
+    command.add_argument('member')
+    command.add_argument('-c', '--bytes', type=int, default=None, help="stop after this many bytes")
+
+    command = commands.add_parser('test', help="check that every member decodes, writing nothing to disk")
+    command.add_argument('archives', nargs='+')
+    command.add_argument('--report', metavar='FILE', help="write a JSON report with every member's status to FILE")
+
+    command = commands.add_parser('convert', help="repack archives in another format")
+    command.add_argument('archives', nargs='+')
+    command.add_argument('-t', '--to', required=True, choices=sorted(ARCHIVE_HANDLERS.creatable), help="target format")
+    command.add_argument('-C', '--directory', help="output directory (default: next to the source)")
+    command.add_argument('-f', '--force', action='store_true', help="overwrite existing targets")
+
+    command = commands.add_parser('detect', help="name the format of files from their contents")
+    command.add_argument('paths', nargs='+', help="files, or directories to scan")
+
+    commands.add_parser('gui', help="open the GUI")
+    return parser
+
+
+def walk_files(paths):
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, directories, files in os.walk(path):
+            directories.sort()
+            for name in sorted(files):
+                yield os.path.join(root, name)
+
+
+def conversion_target(source, extension, directory=None):
+    # The whole archive suffix goes, compound tar ones included: x.tar.gz
+    # becomes x.zip, not x.tar.zip.
+    name = os.path.basename(source)
+    stem = os.path.splitext(name)[0]
+    for suffix, _ in NAME_FORMATS:
+        if name.lower().endswith(suffix) and len(name) > len(suffix):
+            stem = name[:-len(suffix)]
+            break
+    return os.path.join(directory or os.path.dirname(source), f"{stem}.{extension}")
+
+
+def run_command(args):
+    # Returns the exit status: 0 when every archive went through.
+    def metered(operation):
+        # Runs `operation(archive, metrics)` and leaves a trace behind when
+        # asked to.
+        def run(archive):
+            metrics = TransferMetrics()
+            try:
+                return operation(archive, metrics), metrics
+            finally:
+                if args.trace:
+                    os.makedirs(args.trace, exist_ok=True)
+                    metrics.dump(os.path.join(args.trace, f"arc-{os.getpid()}-{os.path.basename(archive)}.json"),
+                                 command=args.command, archive=os.path.realpath(archive))
+        return run
+
+    if args.command == 'cat':
+        # Streams the member; nothing is extracted to disk.
+        try:
+            with open_member(args.archive, args.member) as member:
+                remaining = args.bytes
+                while remaining is None or remaining > 0:
+                    chunk = member.read(COPY_CHUNK_SIZE if remaining is None else min(COPY_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    sys.stdout.buffer.write(chunk)
+                    if remaining is not None:
+                        remaining -= len(chunk)
+            sys.stdout.buffer.flush()
+        except BrokenPipeError:
+            raise
+        except Exception as e:
+            print(f"{args.archive}: {e.args[0] if isinstance(e, KeyError) and e.args else e}", file=sys.stderr)
+            return 1
+        return 0
+    if args.command == 'list':
+        operation = metered(lambda archive, metrics: list_archive(archive))
+    elif args.command == 'extract':
+        def operation(archive, metrics):
+            extract_dir = args.directory
+            if len(args.archives) > 1:
+                extract_dir = os.path.join(extract_dir, os.path.splitext(os.path.basename(archive))[0])
+            return extract_archive(archive, extract_dir, args.name, args.match, metrics)
+        operation = metered(operation)
+    elif args.command == 'add':
+        args.archives = [args.archive]
+        operation = metered(lambda archive, metrics: add_to_archive(archive, args.files, args.budget))
+    elif args.command == 'sync':
+        args.archives = [args.archive]
+        operation = metered(lambda archive, metrics: sync_archive(archive, args.directory, args.dry_run,
+                                                                  args.budget))
+    elif args.command == 'delete':
+        args.archives = [args.archive]
+        operation = metered(lambda archive, metrics: delete_from_archive(archive, args.members))
+    elif args.command == 'rename':
+        args.archives = [args.archive]
+        operation = metered(lambda archive, metrics: rename_in_archive(archive, {args.old_name: args.new_name}))
+    elif args.command == 'test':
+        # Every archive's members share one pool.
+        executor = ThreadPoolExecutor(max_workers=args.jobs or os.cpu_count() or 1)
+        operation = metered(lambda archive, metrics: test_archive(archive, metrics, executor))
+    elif args.command == 'detect':
+        args.archives = list(walk_files(args.paths))
+        operation = metered(lambda archive, metrics: sniff_file(archive))
+    else:
+        def operation(archive, metrics):
+            target = conversion_target(archive, args.to, args.directory)
+            if os.path.exists(target) and not args.force:
+                raise FileExistsError(f"{target} already exists")
+            if args.directory:
+                os.makedirs(args.directory, exist_ok=True)
+            convert_archive(archive, target, metrics)
+            return target
+        operation = metered(operation)
+
+    status = 0
+    reports = []
+    for archive, outcome, error in run_batch(operation, args.archives, args.jobs):
+        if error is not None:
+            # KeyError's str() is the repr of its message.
+            print(f"{archive}: {error.args[0] if isinstance(error, KeyError) and error.args else error}",
+                  file=sys.stderr)
+            status = 1
+            continue
+        result, metrics = outcome
+        if args.command == 'list':
+            if len(args.archives) > 1:
+                print(f"{archive}:")
+            for name, size, compressed in result:
+                if args.long:
+                    print(f"{'-' if size is None else size:>12} {'-' if compressed is None else compressed:>12}  {name}")
+                else:
+                    print(name)
+        elif args.command == 'extract':
+            print(f"{archive}: extracted {len(result)} member(s), {format_size(metrics.bytes_out)} "
+                  f"in {metrics.elapsed():.2f}s ({format_size(metrics.rate())}/s)")
+        elif args.command == 'test':
+            reports.append(result.as_dict())
+            skipped = result.count('skipped')
+            summary = (f"{result.count('ok')} member(s) OK" + (f", {skipped} skipped" if skipped else "")
+                       + f", {format_size(metrics.bytes_out)} in {metrics.elapsed():.2f}s "
+                       f"({format_size(metrics.bytes_out / metrics.elapsed() if metrics.elapsed() > 0 else 0)}/s)")
+            if result.ok:
+                print(f"{archive}: OK, {summary}")
+            else:
+                status = 1
+                print(f"{archive}: FAILED, {summary}")
+                for name, message in result.failures():
+                    print(f"  {name or archive}: {message}")
+        elif args.command == 'convert':
+            print(f"{archive}: converted to {result}")
+        elif args.command == 'detect':
+            print(f"{result or '-':<4} {archive}")
+        elif args.command == 'rename':
+            print(f"{archive}: renamed {args.old_name} to {args.new_name}")
+        elif args.command == 'delete':
+            print(f"{archive}: deleted {len(result)} file(s)")
+        elif args.command == 'sync':
+            if args.dry_run:
+                for file_path, arcname in result.added:
+                    print(f"+ {arcname}")
+                for file_path, arcname in result.replaced:
+                    print(f"~ {arcname}")
+                for name in result.removed:
+                    print(f"- {name}")
+            print(f"{archive}: {len(result.added)} added, {len(result.replaced)} replaced, "
+                  f"{len(result.removed)} removed, {len(result.unchanged)} unchanged")
+        else:
+            print(f"{archive}: added {len(result)} file(s)")
+    if args.command == 'test':
+        executor.shutdown()
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump(reports, f, indent=1)
+    return status
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] == 'gui':
+        # Qt is only loaded for the GUI.
+        import arc_gui
+        return arc_gui.main()
+    try:
+        return run_command(build_parser().parse_args(argv))
+    except BrokenPipeError:
+        # Output piped into something like `head` that stopped reading.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
 
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    ex = MainWindow()
-    ex.show()
-    sys.exit(app.exec())
\ No newline at end of file
+    # arc_7z and arc_gui import from `arc`; let that be this module rather
+    # than a second copy of it.
+    sys.modules.setdefault('arc', sys.modules[__name__])
+    sys.exit(main())
@@ -0,0 +1,600 @@
+import os
+import io
+import pathlib
+import shutil
+import time
+import queue
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import py7zr
+import py7zr.callbacks
+import py7zr.io
+import py7zr.exceptions
+import py7zr.helpers
+from py7zr.archiveinfo import Folder
+from arc import (
+    COPY_CHUNK_SIZE, PIPE_DEPTH, ArchiveHandler, ArchiveMember, CompressionPolicy, MemberStream, OperationCancelled,
+    PipeReader, TestReport, file_sample, member_mode, ordered_parallel_map, transfer_metrics,
+)
+
+# The 7z backend. py7zr and its codec stack are the slowest imports arc
+# has, so this module is only loaded when a .7z archive is first opened.
+
+
+class SevenZipExtractCallback(py7zr.callbacks.ExtractCallback):
+    # py7zr calls these from its reporter thread. Updates carry the bytes
+    # decoded since the last one, at most once a second and at file end, and
+    # only for extracted members; members of different folders may overlap.
+    def __init__(self, targets, metrics):
+        self.targets = set(targets)
+        self.metrics = metrics
+        self.started = {}
+        self.error = None
+
+    def report_start_preparation(self):
+        pass
+
+    def report_start(self, processing_file_path, processing_bytes):
+        if processing_file_path in self.targets:
+            self.metrics.start_member(processing_file_path)
+            self.started[processing_file_path] = time.perf_counter()
+
+    def report_update(self, decompressed_bytes):
+        if self.error is None:
+            self.guard(self.metrics.advance, int(decompressed_bytes))
+
+    def report_end(self, processing_file_path, wrote_bytes):
+        started = self.started.pop(processing_file_path, None)
+        if started is not None:
+            self.metrics.end_member(processing_file_path, time.perf_counter() - started, 0, int(wrote_bytes))
+
+    def guard(self, function, *args):
+        # An exception would silently end the reporter thread; it is kept and
+        # raised once the extraction returns instead.
+        try:
+            function(*args)
+        except Exception as e:
+            self.error = e
+
+    def report_warning(self, message):
+        pass
+
+    def report_postprocess(self):
+        pass
+
+
+class SevenZipTestCallback(SevenZipExtractCallback):
+    # py7zr only reports a member as ended once its CRC has matched.
+    def __init__(self, targets, metrics, report):
+        super().__init__(targets, metrics)
+        self.report = report
+
+    def report_end(self, processing_file_path, wrote_bytes):
+        started = self.started.pop(processing_file_path, None)
+        if started is not None:
+            seconds = time.perf_counter() - started
+            self.metrics.end_member(processing_file_path, seconds, 0, int(wrote_bytes))
+            self.report.record(processing_file_path, 'ok', int(wrote_bytes), seconds)
+
+
+class SevenZipPipeWriter(py7zr.io.Py7zIO):
+    # Decompressor side of a pipe: py7zr writes the member into it and closes
+    # it when the member is complete.
+    def __init__(self, chunks, abort):
+        self.chunks = chunks
+        self.abort = abort
+        self.written = 0
+
+    def write(self, s):
+        data = bytes(s)
+        while True:
+            if self.abort.is_set():
+                raise InterruptedError("Archive rewrite was aborted")
+            try:
+                self.chunks.put(data, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        self.written += len(data)
+        return len(data)
+
+    def read(self, size=None):
+        return b""
+
+    def seekable(self):
+        return False
+
+    def seek(self, offset, whence=0):
+        return self.written
+
+    def flush(self):
+        pass
+
+    def size(self):
+        return self.written
+
+    def close(self):
+        self.chunks.put(None)
+
+
+class SevenZipPipeFactory(py7zr.io.WriterFactory):
+    def __init__(self, sizes):
+        self.sizes = sizes
+        self.pipes = queue.Queue()
+        self.abort = threading.Event()
+        self.error = None
+        self.current = None
+
+    def create(self, filename):
+        self.current = queue.Queue(maxsize=PIPE_DEPTH)
+        self.pipes.put(PipeReader(filename, self.sizes[filename], self.current, self))
+        return SevenZipPipeWriter(self.current, self.abort)
+
+    def run(self, archive_read, targets):
+        try:
+            archive_read.extract(targets=targets, factory=self)
+        except Exception as e:
+            self.error = e
+            if self.current is not None and not self.abort.is_set():
+                # Unblock the compressor waiting on the member that failed.
+                self.current.put(None)
+        finally:
+            self.pipes.put(None)
+
+
+def keep_stamps(archive_write, original):
+    # write() and writef() stamp a member with the scratch directory's or the
+    # current time; the header is only written on close, so the original's
+    # time and attributes are put back here.
+    properties = original.file_properties()
+    info = archive_write.header.files_info.files[-1]
+    for key in ('lastwritetime', 'attributes'):
+        if properties.get(key) is not None:
+            info[key] = properties[key]
+
+
+# New files are packed into independent blocks (7z folders) of about this
+# much input, so each block can be compressed on its own thread. Smaller
+# blocks spread better over the cores; larger ones compress better.
+SEVENZIP_BLOCK_SIZE = 16 * 1024 * 1024
+# Compressed blocks up to this size stay in memory until they are written.
+SEVENZIP_SPOOL_SIZE = 32 * 1024 * 1024
+
+
+# py7zr filters for CompressionPolicy's codecs; py7zr has no levels for
+# deflate and bzip2.
+SEVENZIP_CODECS = {
+    'stored': lambda level: [{'id': py7zr.FILTER_COPY}],
+    'deflate': lambda level: [{'id': py7zr.FILTER_DEFLATE}],
+    'bzip2': lambda level: [{'id': py7zr.FILTER_BZIP2}],
+    'lzma': lambda level: [{'id': py7zr.FILTER_LZMA2, 'preset': level}],
+}
+
+
+# append_blocks works on py7zr internals: the writer's file info, header and
+# folder bookkeeping. It is only used with the releases it was tested
+# against, and only when those internals are all there; otherwise files are
+# added through py7zr's public write() in one solid block.
+PY7ZR_TESTED = ((1, 1), (1, 2))
+PY7ZR_INTERNALS = {
+    'archive': ('_make_file_info', '_sanitize_archive_arcname', 'dereference', 'worker', 'header', 'files', 'fp'),
+    'worker': ('flush_archive',),
+    'header': ('_initialized', 'initialize', 'main_streams', 'files_info', 'filters', 'password'),
+    'folder': ('prepare_coderinfo', 'get_compressor', 'get_unpack_size'),
+}
+
+
+def append_blocks_supported(archive):
+    try:
+        version = tuple(int(part) for part in py7zr.__version__.split('.')[:2])
+    except (AttributeError, ValueError):
+        return False
+    if not PY7ZR_TESTED[0] <= version < PY7ZR_TESTED[1]:
+        return False
+    objects = {'archive': archive, 'worker': getattr(archive, 'worker', None),
+               'header': getattr(archive, 'header', None), 'folder': Folder}
+    return all(hasattr(objects[kind], name) for kind, names in PY7ZR_INTERNALS.items() for name in names)
+
+
+def pack_blocks(infos, block_size):
+    # Consecutive files, cut into runs of about block_size input bytes.
+    block = []
+    size = 0
+    for info in infos:
+        if block and size + info.get('uncompressed', 0) > block_size:
+            yield block
+            block = []
+            size = 0
+        block.append(info)
+        size += info.get('uncompressed', 0)
+    if block:
+        yield block
+
+
+def compress_block(filters, password, infos):
+    # One folder with a compressor of its own: LZMA releases the GIL, so
+    # blocks compress in parallel on threads.
+    folder = Folder()
+    folder.password = password
+    folder.prepare_coderinfo(filters)
+    compressor = folder.get_compressor()
+    spool = tempfile.SpooledTemporaryFile(max_size=SEVENZIP_SPOOL_SIZE)
+    streams = []
+    for info in infos:
+        if info['attributes'] & 0x400:
+            # Symlinks are stored as their target, as py7zr writes them.
+            source = io.BytesIO(os.readlink(info['origin']).encode('utf-8'))
+        else:
+            source = open(info['origin'], 'rb')
+        with source:
+            insize, _, crc = compressor.compress(source, spool)
+        streams.append((insize, crc))
+    compressor.flush(spool)
+    folder.unpacksizes = compressor.unpacksizes
+    folder.compressor = None
+    return folder, spool, streams, compressor.packsize, compressor.digest
+
+
+def append_blocks(archive, files, arcnames, workers, compression=None, block_size=SEVENZIP_BLOCK_SIZE):
+    # py7zr puts everything written in one session into a single solid
+    # folder and compresses it on the calling thread. Here the files are cut
+    # into blocks that are compressed concurrently, then appended to the
+    # archive as separate folders in order, with the header kept the way
+    # py7zr's own writer keeps it. With a CompressionPolicy, files are
+    # probed (on the pool as well) and only share blocks with files that got
+    # the same codec.
+    if not append_blocks_supported(archive):
+        for file_path, arcname in zip(files, arcnames):
+            archive.write(file_path, arcname)
+        return
+    infos = [archive._make_file_info(pathlib.Path(file_path), archive._sanitize_archive_arcname(arcname),
+                                     archive.dereference)
+             for file_path, arcname in zip(files, arcnames)]
+    if all(info['emptystream'] for info in infos):
+        for file_path, arcname in zip(files, arcnames):
+            archive.write(file_path, arcname)
+        return
+    header = archive.header
+    if header._initialized:
+        # Close the folder earlier writes in this session went into.
+        archive.worker.flush_archive(archive.fp, header.main_streams.unpackinfo.folders[-1])
+    else:
+        # Builds the header for a new archive; the folder it opens is
+        # replaced by the blocks below.
+        header.initialize()
+        header.main_streams.unpackinfo.folders.pop()
+        header.main_streams.unpackinfo.numfolders -= 1
+        header.main_streams.substreamsinfo.num_unpackstreams_folders.pop()
+    # Every folder from here on is finished here, not when the archive closes.
+    header._initialized = False
+    main_streams = header.main_streams
+    if main_streams.substreamsinfo.unpacksizes is None:
+        # An archive whose folders each hold one file records no file sizes
+        # of its own; they are the folders' sizes.
+        main_streams.substreamsinfo.unpacksizes = [folder.get_unpack_size()
+                                                   for folder in main_streams.unpackinfo.folders]
+    for info in infos:
+        if info['emptystream']:
+            header.files_info.files.append(info)
+            header.files_info.emptyfiles.append(True)
+            archive.files.append(info)
+    payload = [info for info in infos if not info['emptystream']]
+    if isinstance(compression, CompressionPolicy) and header.password is None:
+        def choose(info):
+            if info['attributes'] & 0x400:
+                return 'stored', None
+            return compression.choose(info['filename'], file_sample(info['origin'], compression.sample_size))
+        groups = {}
+        for info, choice in zip(payload, ordered_parallel_map(choose, payload, workers)):
+            groups.setdefault(choice, []).append(info)
+        blocks = ((SEVENZIP_CODECS[codec](level), block)
+                  for (codec, level), group in groups.items() for block in pack_blocks(group, block_size))
+    else:
+        blocks = ((header.filters, block) for block in pack_blocks(payload, block_size))
+    results = ordered_parallel_map(lambda block: (block[1],) + compress_block(block[0], header.password, block[1]),
+                                   blocks, workers)
+    for block, folder, spool, streams, packsize, digest in results:
+        with spool:
+            spool.seek(0)
+            shutil.copyfileobj(spool, archive.fp)
+        main_streams.unpackinfo.folders.append(folder)
+        main_streams.unpackinfo.numfolders += 1
+        main_streams.substreamsinfo.num_unpackstreams_folders.append(len(block))
+        for info, (insize, crc) in zip(block, streams):
+            info['digest'] = crc
+            main_streams.substreamsinfo.unpacksizes.append(insize)
+            main_streams.substreamsinfo.digests.append(crc)
+            main_streams.substreamsinfo.digestsdefined.append(True)
+            header.files_info.files.append(info)
+            header.files_info.emptyfiles.append(False)
+            archive.files.append(info)
+        main_streams.packinfo.numstreams += 1
+        main_streams.packinfo.packsizes.append(packsize)
+        if main_streams.packinfo.enable_digests:
+            main_streams.packinfo.crcs.append(digest)
+            main_streams.packinfo.digestdefined.append(True)
+
+
+# Windows attribute bits py7zr sets next to the unix mode, which it keeps in
+# the high half behind the 0x8000 extension flag.
+SEVENZIP_ATTRIBUTES = {'file': 0x20, 'dir': 0x10, 'link': 0x420}
+
+
+def extract_batches(archive, targets, batch_size):
+    # The targets in runs of whole folders holding about batch_size bytes
+    # between them (empty files go with the first), plus the directories.
+    batches = [[]]
+    directories = []
+    folders = {}
+    for info in archive.files:
+        if info.filename not in targets:
+            continue
+        if info.is_directory:
+            directories.append(info.filename)
+        elif info.emptystream:
+            batches[0].append(info.filename)
+        else:
+            folders.setdefault(id(info.folder), (info.folder, []))[1].append(info.filename)
+    size = 0
+    for folder, names in folders.values():
+        if size >= batch_size:
+            batches.append([])
+            size = 0
+        batches[-1].extend(names)
+        size += folder.get_unpack_size()
+    return [batch for batch in batches if batch], directories
+
+
+class SevenZipHandler(ArchiveHandler):
+    format = '7z'
+    # writef() needs the length of each member before it reads any of it.
+    write_needs_sizes = True
+    # Threads new blocks are compressed on (None: one per CPU), and how:
+    # None for py7zr's LZMA2, or a CompressionPolicy choosing for each file.
+    # A sample cannot show what a solid LZMA block gains across files, so
+    # by default the only question is whether a file is worth compressing.
+    add_workers = None
+    compression = CompressionPolicy(codecs=(('lzma', 7),))
+    # Threads batches of folders are extracted on (None: one per CPU).
+    extract_workers = None
+
+    def get_file_list(self):
+        with py7zr.SevenZipFile(self.filename, mode='r') as archive:
+            return [(info.filename, info.uncompressed, info.compressed) for info in archive.list()]
+
+    def open_member(self, name):
+        # Decoded on a thread and piped to the reader, so only the solid
+        # block up to the end of what is read gets decompressed.
+        with py7zr.SevenZipFile(self.filename, mode='r') as archive:
+            info = next((info for info in archive.list() if info.filename == name), None)
+        if info is None:
+            raise KeyError(f"filename {name!r} not found")
+        if info.is_directory:
+            raise ValueError(f"{name} is a directory")
+
+        def opener(stack):
+            archive = stack.enter_context(py7zr.SevenZipFile(self.filename, mode='r'))
+            factory = SevenZipPipeFactory({name: info.uncompressed})
+            reader = threading.Thread(target=factory.run, args=(archive, [name]), daemon=True)
+            reader.start()
+            stack.callback(reader.join)
+            stack.callback(factory.abort.set)
+            pipe = factory.pipes.get()
+            if pipe is None:
+                if factory.error is not None:
+                    raise factory.error
+                return io.BytesIO()
+            return pipe
+        return io.BufferedReader(MemberStream(opener, info.uncompressed))
+
+    def read_members(self):
+        # Directories come first; files follow in the order py7zr decodes
+        # them, one pass over the solid blocks.
+        with py7zr.SevenZipFile(self.filename, mode='r') as archive:
+            members = {}
+            for info in archive.files:
+                mtime = info.lastwritetime.totimestamp() if info.lastwritetime is not None else None
+                kind = 'dir' if info.is_directory else 'link' if info.is_symlink else 'file'
+                members[info.filename] = ArchiveMember(info.filename, info.uncompressed if kind != 'dir' else 0,
+                                                       mtime, info.posix_mode, kind)
+            for member in members.values():
+                if member.kind == 'dir':
+                    yield member, None
+            factory = SevenZipPipeFactory({name: member.size for name, member in members.items()})
+            reader = threading.Thread(
+                target=factory.run,
+                args=(archive, [name for name, member in members.items() if member.kind != 'dir']),
+                daemon=True,
+            )
+            reader.start()
+            try:
+                for pipe in iter(factory.pipes.get, None):
+                    yield members[pipe.name], pipe
+                    while not pipe.eof:
+                        pipe.read(COPY_CHUNK_SIZE)
+            finally:
+                factory.abort.set()
+                reader.join()
+            if factory.error is not None:
+                raise factory.error
+
+    def write_members(self, members):
+        names = []
+        with py7zr.SevenZipFile(self.filename, mode='w') as archive:
+            with tempfile.TemporaryDirectory() as empty_dir:
+                for member, stream in members:
+                    if member.kind == 'dir':
+                        archive.write(empty_dir, member.name)
+                    else:
+                        archive.writef(stream, member.name)
+                    # As in keep_stamps(), the header entry is corrected in place.
+                    info = archive.header.files_info.files[-1]
+                    if member.mtime is not None:
+                        info['lastwritetime'] = py7zr.helpers.ArchiveTimestamp.from_datetime(member.mtime)
+                    info['attributes'] = SEVENZIP_ATTRIBUTES[member.kind] | 0x8000 | member_mode(member) << 16
+                    names.append(member.name)
+        return names
+
+    def extract_files(self, files_to_extract, extract_dir, callback):
+        # py7zr cannot be stopped inside an extract() call, so the targets
+        # are extracted a batch of folders at a time on a pool, and a cancel
+        # (raised by the progress callback) ends the run at the next batch.
+        # Directories come last, so their times are not touched by the files
+        # going into them.
+        metrics = transfer_metrics(callback)
+        with py7zr.SevenZipFile(self.filename, mode='r') as archive:
+            targets = set(files_to_extract)
+            metrics.begin(sum(info.uncompressed for info in archive.list() if info.filename in targets))
+            batches, directories = extract_batches(archive, targets, SEVENZIP_BLOCK_SIZE)
+
+        def extract(batch):
+            metrics.report()
+            # Opened by name: py7zr only decodes folders in parallel when it
+            # can open the file again itself, so input bytes are not metered.
+            with py7zr.SevenZipFile(self.filename, mode='r') as archive:
+                # py7zr reports the bytes it decodes, so progress comes from
+                # inside each batch.
+                reporter = SevenZipExtractCallback(batch, metrics)
+                archive.extract(path=extract_dir, targets=batch, callback=reporter)
+                if reporter.error is not None:
+                    raise reporter.error
+
+        with ThreadPoolExecutor(max_workers=self.extract_workers or os.cpu_count() or 1) as executor:
+            futures = [executor.submit(extract, batch) for batch in batches]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                executor.shutdown(cancel_futures=True)
+                raise
+        if directories:
+            extract(directories)
+        metrics.finish()
+
+    def test_archive(self, callback=None, executor=None):
+        # Everything is decoded into null writers; py7zr runs one thread per
+        # solid block and checks each member's CRC.
+        metrics = transfer_metrics(callback)
+        report = TestReport(self.filename, self.format, metrics)
+        with py7zr.SevenZipFile(self.filename, mode='r') as archive:
+            members = [info for info in archive.list() if not info.is_directory]
+            metrics.begin(sum(info.uncompressed for info in members))
+            reporter = SevenZipTestCallback([info.filename for info in members], metrics, report)
+            try:
+                archive.extractall(callback=reporter, factory=py7zr.io.NullIOFactory())
+            except py7zr.exceptions.CrcError as e:
+                # Named when a member's CRC is off, not when a whole block's is.
+                if len(e.args) > 2 and e.args[2]:
+                    report.record(str(e.args[2]), 'failed', error="CRC mismatch")
+                else:
+                    report.error = "CRC mismatch"
+            except OperationCancelled:
+                raise
+            except Exception as e:
+                report.error = str(e)
+        # The reporter thread has caught up once the archive is closed.
+        if reporter.error is not None:
+            raise reporter.error
+        tested = {member[0] for member in report.members}
+        for info in members:
+            if info.filename not in tested:
+                report.record(info.filename, 'skipped', error="not reached")
+        metrics.finish()
+        return report
+
+    def rewrite(self, files_to_delete=(), renames=None, files_to_add=(), arcnames=None):
+        # Kept members are decompressed once, in archive order, and piped
+        # straight into the new archive's compressor a chunk at a time.
+        renames = renames or {}
+        arcnames = arcnames or [os.path.basename(file_path) for file_path in files_to_add]
+        temp_filename = self.filename + '.temp'
+        with open(self.filename, 'rb') as source, py7zr.SevenZipFile(source, mode='r') as archive_read:
+            kept = [info for info in archive_read.list() if info.filename not in files_to_delete]
+            originals = {original.filename: original for original in archive_read.files}
+            with py7zr.SevenZipFile(temp_filename, mode='w') as archive_write:
+                directories = [info.filename for info in kept if info.is_directory]
+                if directories:
+                    with tempfile.TemporaryDirectory() as empty_dir:
+                        for name in directories:
+                            archive_write.write(empty_dir, renames.get(name, name))
+                            keep_stamps(archive_write, originals[name])
+                factory = SevenZipPipeFactory({info.filename: info.uncompressed for info in kept})
+                reader = threading.Thread(
+                    target=factory.run,
+                    args=(archive_read, [info.filename for info in kept if not info.is_directory]),
+                    daemon=True,
+                )
+                reader.start()
+                try:
+                    for pipe in iter(factory.pipes.get, None):
+                        archive_write.writef(pipe, renames.get(pipe.name, pipe.name))
+                        keep_stamps(archive_write, originals[pipe.name])
+                finally:
+                    factory.abort.set()
+                    reader.join()
+                if factory.error is not None:
+                    raise factory.error
+                if files_to_add:
+                    append_blocks(archive_write, files_to_add, arcnames, self.add_workers or os.cpu_count() or 1,
+                                  self.compression)
+        os.remove(self.filename)
+        os.rename(temp_filename, self.filename)
+
+    def commit_edits(self, files_to_delete=(), renames=None, files_to_add=(), passwords=None, arcnames=None):
+        if passwords:
+            raise NotImplementedError("Encryption is not supported for 7z archives")
+        if files_to_delete or renames:
+            self.rewrite(files_to_delete=files_to_delete, renames=renames, files_to_add=files_to_add,
+                         arcnames=arcnames)
+        elif files_to_add:
+            self.add_files(files_to_add, arcnames)
+
+    def member_stamps(self):
+        with py7zr.SevenZipFile(self.filename, mode='r') as archive:
+            return {info.filename: (None, None, None) if info.is_directory
+                    else (info.uncompressed,
+                          info.lastwritetime.totimestamp() if info.lastwritetime is not None else None,
+                          info.crc32)
+                    for info in archive.files}
+
+    def delete_files(self, files_to_delete):
+        self.rewrite(files_to_delete=set(files_to_delete))
+
+    @property
+    def supports_deletion(self):
+        return True
+
+    def rename_file(self, old_name, new_name):
+        self.rewrite(renames={old_name: new_name})
+
+    @property
+    def supports_renaming(self):
+        return True
+
+    def encrypt_archive(self, password):
+        return
+
+    def encrypt_files(self, files_to_encrypt, passwords):
+        return
+
+    @property
+    def supports_encryption(self):
+        return False
+
+    def create_archive(self):
+        with py7zr.SevenZipFile(self.filename, 'w') as _:
+            pass
+
+    def add_files(self, files_to_add, arcnames=None):
+        arcnames = arcnames or [os.path.basename(file_path) for file_path in files_to_add]
+        with py7zr.SevenZipFile(self.filename, 'a') as archive:
+            append_blocks(archive, files_to_add, arcnames, self.add_workers or os.cpu_count() or 1, self.compression)
+
+    @property
+    def supports_creation(self):
+        return True
+
+    @property
+    def supports_adding(self):
+        return True
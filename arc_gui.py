@@ -0,0 +1,985 @@
+import sys
+from PyQt6.QtWidgets import (
+    QApplication, 
+    QWidget, 
+    QPushButton, 
+    QLabel, 
+    QLineEdit, 
+    QTreeView,
+    QAbstractItemView,
+    QFileDialog,
+    QMessageBox,
+    QInputDialog,
+    QProgressBar,
+    QHeaderView,
+    QHBoxLayout,
+    QVBoxLayout,
+    QSplitter,
+    QPlainTextEdit
+)
+from PyQt6.QtCore import Qt, QObject, pyqtSignal, QAbstractItemModel, QModelIndex
+from PyQt6.QtGui import QIcon, QFontDatabase
+import os
+import re
+import threading
+import collections
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from arc import (
+    LISTING_CACHE,
+    DirectoryNode,
+    DirectoryTree,
+    LazyModule,
+    MemberIndex,
+    MemberTable,
+    OperationCancelled,
+    TransferMetrics,
+    open_archive,
+)
+
+keyring = LazyModule('keyring')
+
+LISTING_CHUNK_SIZE = 20000
+# How much of a member the preview pane reads.
+PREVIEW_BYTES = 64 * 1024
+
+
+def preview_text(data, truncated):
+    # UTF-8 text is shown as it is, anything else as a hex dump. A character
+    # cut in half at the end of the preview does not make it binary.
+    text = None
+    if b'\0' not in data:
+        try:
+            text = data.decode('utf-8')
+        except UnicodeDecodeError as e:
+            if truncated and e.start >= len(data) - 3:
+                text = data[:e.start].decode('utf-8', errors='replace')
+    if text is None:
+        lines = []
+        for offset in range(0, len(data), 16):
+            row = data[offset:offset + 16]
+            printable = ''.join(chr(b) if 32 <= b < 127 else '.' for b in row)
+            lines.append(f"{offset:08x}  {row.hex(' '):<47}  {printable}")
+        text = '\n'.join(lines)
+    if truncated:
+        text += f"\n\n[first {PREVIEW_BYTES // 1024} KB shown]"
+    return text
+
+
+class ArchiveTreeModel(QAbstractItemModel):
+    # Directory hierarchy over a MemberTable. An index's internal pointer is
+    # the DirectoryNode whose entries it belongs to, so index(), parent() and
+    # rowCount() never look beyond one directory, and a directory's rows are
+    # only announced to the view once it is expanded.
+    headers = ["Name", "Size", "Compressed", "Files"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.table = MemberTable()
+        self.tree = DirectoryTree(self.table)
+        self.search_index = MemberIndex(self.table)
+        self.fetching = False
+
+    def clear(self):
+        self.beginResetModel()
+        self.table = MemberTable()
+        self.tree = DirectoryTree(self.table)
+        self.search_index = MemberIndex(self.table)
+        self.endResetModel()
+
+    def append(self, members):
+        self.insert_rows(self.table.extend(members))
+
+    def insert_rows(self, rows):
+        self.tree.insert(rows)
+        self.totals_changed()
+        for node, position in self.tree.replaced:
+            if position < node.shown:
+                self.dataChanged.emit(self.index(position, 0, self.index_of(node)),
+                                      self.index(position, len(self.headers) - 1, self.index_of(node)))
+        self.tree.replaced = []
+
+    def remove_members(self, names):
+        for name in names:
+            row = self.remove_from_tree(name)
+            if row is not None:
+                self.table.remove(row)
+        self.totals_changed()
+
+    def rename_members(self, renames):
+        rows = []
+        for old_name, new_name in renames.items():
+            row = self.remove_from_tree(old_name)
+            if row is not None:
+                self.table.rename(row, new_name)
+                rows.append(row)
+        self.insert_rows(rows)
+
+    def check_rows(self, rows, checked):
+        # Ticks or unticks the given MemberTable rows in one batch.
+        directories = set()
+        for row in rows:
+            node, leaf = self.tree.find(self.table.names[row])
+            if leaf in node.dirs:
+                node = node.dirs[leaf]
+            self.tree.check(node, row, checked)
+            directories.add(node)
+        for node in directories:
+            if node.shown:
+                self.dataChanged.emit(self.createIndex(0, 0, node), self.createIndex(node.shown - 1, 0, node),
+                                      [Qt.ItemDataRole.CheckStateRole])
+        self.totals_changed()
+
+    def remove_from_tree(self, name):
+        node, leaf = self.tree.find(name)
+        if node is None:
+            return None
+        if not leaf or leaf in node.dirs:
+            if leaf:
+                node = node.dirs[leaf]
+            row, node.member = node.member, None
+        else:
+            row = node.files.get(leaf)
+            if row is None:
+                return None
+            self.detach(node, node.entries.index(row))
+        # Directories that only existed to hold the member go with it.
+        while node.parent is not None and not node.entries and node.member is None:
+            self.detach(node.parent, node.row)
+            node = node.parent
+        self.tree.totals.setdefault(node, [0, 0, 0, 0])
+        return row
+
+    def detach(self, node, position):
+        if position < node.shown:
+            self.beginRemoveRows(self.index_of(node), position, position)
+            self.tree.detach(node, position)
+            node.shown -= 1
+            self.endRemoveRows()
+        else:
+            self.tree.detach(node, position)
+
+    def totals_changed(self):
+        # Parents first: a new directory has to be announced to the view
+        # before its own rows can be.
+        changed = {}
+        for node in sorted(self.tree.flush(), key=lambda node: node.depth):
+            if node.parent is not None and node.parent.dirs.get(node.name) is not node:
+                continue
+            if node.shown or node.parent is None:
+                # Directories the view has not opened yet are left for
+                # fetchMore().
+                self.fetchMore(self.index_of(node))
+            if node.parent is not None and node.row < node.parent.shown:
+                first, last = changed.get(node.parent, (node.row, node.row))
+                changed[node.parent] = (min(first, node.row), max(last, node.row))
+        # One signal per directory, covering the rows whose totals moved.
+        for parent, (first, last) in changed.items():
+            self.dataChanged.emit(self.createIndex(first, 0, parent),
+                                  self.createIndex(last, len(self.headers) - 1, parent))
+
+    def index_of(self, node, column=0):
+        if node.parent is None:
+            return QModelIndex()
+        return self.createIndex(node.row, column, node.parent)
+
+    def entry(self, index):
+        if not index.isValid():
+            return self.tree.root
+        return index.internalPointer().entries[index.row()]
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self.entry(parent)
+        if not isinstance(node, DirectoryNode) or not 0 <= row < node.shown:
+            return QModelIndex()
+        return self.createIndex(row, column, node)
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        return self.index_of(index.internalPointer())
+
+    def hasChildren(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return False
+        node = self.entry(parent)
+        return isinstance(node, DirectoryNode) and bool(node.entries)
+
+    def canFetchMore(self, parent):
+        node = self.entry(parent)
+        return not self.fetching and isinstance(node, DirectoryNode) and len(node.entries) > node.shown
+
+    def fetchMore(self, parent):
+        node = self.entry(parent)
+        if self.fetching or len(node.entries) <= node.shown:
+            return
+        # Views may ask for more rows again from inside the insert signals.
+        self.fetching = True
+        try:
+            self.beginInsertRows(parent, node.shown, len(node.entries) - 1)
+            node.shown = len(node.entries)
+            self.endInsertRows()
+        finally:
+            self.fetching = False
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        node = self.entry(parent)
+        return node.shown if isinstance(node, DirectoryNode) else 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.headers)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        entry = self.entry(index)
+        column = index.column()
+        if isinstance(entry, DirectoryNode):
+            if role == Qt.ItemDataRole.CheckStateRole and column == 0:
+                if entry.count and entry.checked == entry.count:
+                    return Qt.CheckState.Checked
+                return Qt.CheckState.PartiallyChecked if entry.checked else Qt.CheckState.Unchecked
+            if role != Qt.ItemDataRole.DisplayRole:
+                return None
+            return (entry.name, f"{entry.size} bytes", f"{entry.compressed} bytes", str(entry.count))[column]
+        if role == Qt.ItemDataRole.CheckStateRole and column == 0:
+            return Qt.CheckState.Checked if self.table.checked[entry] else Qt.CheckState.Unchecked
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if column == 0:
+            return self.table.names[entry].rsplit('/', 1)[-1]
+        if column == 1:
+            size = self.table.sizes[entry]
+            return f"{size} bytes" if size >= 0 else ""
+        if column == 2:
+            compressed = self.table.compressed[entry]
+            return f"{compressed} bytes" if compressed >= 0 else ""
+        return ""
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if role != Qt.ItemDataRole.CheckStateRole or index.column() != 0:
+            return False
+        checked = Qt.CheckState(value) != Qt.CheckState.Unchecked
+        node = index.internalPointer()
+        entry = self.entry(index)
+        if isinstance(entry, DirectoryNode):
+            for directory in self.tree.walk(entry):
+                if directory.member is not None:
+                    self.tree.check(directory, directory.member, checked)
+                for row in directory.entries:
+                    if not isinstance(row, DirectoryNode):
+                        self.tree.check(directory, row, checked)
+                if directory.shown:
+                    self.dataChanged.emit(self.index(0, 0, self.index_of(directory)),
+                                          self.index(directory.shown - 1, 0, self.index_of(directory)), [role])
+        else:
+            self.tree.check(node, entry, checked)
+            self.dataChanged.emit(index, index, [role])
+        self.totals_changed()
+        return True
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.column() == 0:
+            flags |= Qt.ItemFlag.ItemIsUserCheckable
+        return flags
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def name(self, index):
+        # Archive member behind `index`; None for directories the archive has
+        # no entry of its own for.
+        entry = self.entry(index)
+        if isinstance(entry, DirectoryNode):
+            return None if entry.member is None else self.table.names[entry.member]
+        return self.table.names[entry]
+
+
+class JobCancelled(OperationCancelled):
+    pass
+
+
+class Job:
+    # One queued archive operation. It doubles as the progress callback
+    # handed to the handlers: every emit() is also the point where a paused
+    # job waits and a cancelled one stops.
+    def __init__(self, scheduler, job_id, archive, description, function, on_success=None, on_failure=None,
+                 kind=None, queued=True):
+        self.scheduler = scheduler
+        self.id = job_id
+        self.archive = archive
+        self.description = description
+        # What the job does ("Extracting", "Adding", ...), for progress.
+        self.kind = kind or description
+        self.queued = queued
+        self.function = function
+        self.on_success = on_success
+        self.on_failure = on_failure
+        self.cancelled = threading.Event()
+        self.running = threading.Event()
+        self.running.set()
+        self.metrics = TransferMetrics(self)
+
+    def cancel(self):
+        self.cancelled.set()
+        self.running.set()
+
+    def pause(self):
+        self.running.clear()
+
+    def resume(self):
+        self.running.set()
+
+    def checkpoint(self):
+        self.running.wait()
+        if self.cancelled.is_set():
+            raise JobCancelled()
+
+    def emit(self, current, total, name):
+        self.checkpoint()
+        self.scheduler.job_progress.emit(self.id, current, total, name)
+
+
+class JobScheduler(QObject):
+    # Runs archive operations on a bounded thread pool. Jobs on the same
+    # archive run one at a time in submission order; jobs on different
+    # archives run side by side, and so do read-only jobs submitted with
+    # queued=False. Outcomes come back as signals and through the job's
+    # on_success/on_failure, which are called on the GUI thread.
+    job_started = pyqtSignal(int, str)
+    job_progress = pyqtSignal(int, 'qint64', 'qint64', str)
+    job_finished = pyqtSignal(int, object)
+    job_failed = pyqtSignal(int, str)
+    job_cancelled = pyqtSignal(int)
+
+    max_workers = 4
+
+    def __init__(self, parent=None, trace_dir=None):
+        super().__init__(parent)
+        # When set, every job leaves a JSON trace of its metrics here.
+        self.trace_dir = trace_dir or os.environ.get('ARC_TRACE_DIR')
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.pending = collections.defaultdict(collections.deque)
+        self.busy = set()
+        self.next_id = 1
+        self.job_finished.connect(self.finished)
+        self.job_failed.connect(self.failed)
+        self.job_cancelled.connect(self.forget)
+
+    def submit(self, archive, description, function, on_success=None, on_failure=None, kind=None, queued=True):
+        # `function` is called with the Job on a worker thread.
+        archive = os.path.realpath(archive)
+        with self.lock:
+            job = Job(self, self.next_id, archive, description, function, on_success, on_failure, kind, queued)
+            self.next_id += 1
+            self.jobs[job.id] = job
+            if not queued:
+                self.executor.submit(self.run, job)
+            elif archive in self.busy:
+                self.pending[archive].append(job)
+            else:
+                self.busy.add(archive)
+                self.executor.submit(self.run, job)
+        return job
+
+    def run(self, job):
+        outcome = 'finished'
+        try:
+            job.checkpoint()
+            self.job_started.emit(job.id, job.description)
+            result = job.function(job)
+            self.job_finished.emit(job.id, result)
+        except JobCancelled:
+            outcome = 'cancelled'
+            self.job_cancelled.emit(job.id)
+        except Exception as e:
+            outcome = 'failed'
+            self.job_failed.emit(job.id, str(e))
+        finally:
+            if self.trace_dir:
+                self.write_trace(job, outcome)
+            if job.queued:
+                self.next_job(job.archive)
+
+    def next_job(self, archive):
+        with self.lock:
+            if self.pending[archive]:
+                self.executor.submit(self.run, self.pending[archive].popleft())
+            else:
+                del self.pending[archive]
+                self.busy.discard(archive)
+
+    def write_trace(self, job, outcome):
+        try:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            job.metrics.dump(os.path.join(self.trace_dir, f"arc-{os.getpid()}-{job.id}.json"),
+                             job=job.id, description=job.description, archive=job.archive, outcome=outcome)
+        except OSError:
+            pass
+
+    def finished(self, job_id, result):
+        job = self.jobs.pop(job_id, None)
+        if job is not None and job.on_success is not None:
+            job.on_success(result)
+
+    def failed(self, job_id, error):
+        job = self.jobs.pop(job_id, None)
+        if job is not None and job.on_failure is not None:
+            job.on_failure(error)
+
+    def forget(self, job_id):
+        self.jobs.pop(job_id, None)
+
+    def active_jobs(self):
+        return list(self.jobs.values())
+
+    def cancel_all(self):
+        for job in self.active_jobs():
+            job.cancel()
+
+    def pause_all(self):
+        for job in self.active_jobs():
+            job.pause()
+
+    def resume_all(self):
+        for job in self.active_jobs():
+            job.resume()
+
+    def shutdown(self):
+        self.cancel_all()
+        self.executor.shutdown(wait=True)
+
+
+class MainWindow(QWidget):
+    # Listing rows read by a job, handed over in chunks so the window keeps
+    # painting while a large archive is still loading.
+    listing_chunk = pyqtSignal(object, list)
+
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Archive Viewer")
+        self.setGeometry(300, 300, 600, 400)
+        self.password_backend = None
+        self.archive_filename = None
+        self.archive_handler = None
+        self.listing_job = None
+        self.preview_job = None
+        # The operation the progress bar follows: the latest one to start.
+        self.foreground_job = None
+        self.scheduler = JobScheduler(self)
+        self.scheduler.job_started.connect(self.jobStarted)
+        self.scheduler.job_progress.connect(self.updateProgressBar)
+        self.scheduler.job_cancelled.connect(self.jobCancelled)
+        self.listing_chunk.connect(self.appendListing)
+
+        self.initUI()
+
+    @property
+    def password_manager(self):
+        # keyring's backend discovery is slow, so it waits until a password
+        # is actually stored.
+        if self.password_backend is None:
+            self.password_backend = keyring.get_keyring()
+        return self.password_backend
+
+    def initUI(self):
+        # File selection
+        top_button_layout = QHBoxLayout()  # Layout for top buttons
+        top_button_layout.addWidget(QPushButton("Select Archive", self, clicked=self.openFile))
+        top_button_layout.addWidget(QPushButton("New Archive", self, clicked=self.createNewArchive))
+
+        # Center the top buttons
+        top_button_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
+
+        # Search
+        search_layout = QHBoxLayout()
+        self.search_edit = QLineEdit(self)
+        self.search_edit.setPlaceholderText("Select files: *.txt, docs/*, ext:jpg, re:^src/.*\\.py$")
+        self.search_edit.returnPressed.connect(self.selectMatches)
+        search_layout.addWidget(self.search_edit)
+        search_layout.addWidget(QPushButton("Select Matches", self, clicked=self.selectMatches))
+        search_layout.addWidget(QPushButton("Clear Selection", self, clicked=self.clearSelection))
+
+        # File list
+        self.model = ArchiveTreeModel(self)
+        self.tree = QTreeView(self)
+        self.tree.setModel(self.model)
+        self.tree.setUniformRowHeights(True)  # Lets the view skip measuring every row
+        self.tree.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.tree.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.tree.header().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)  # Expand columns
+        self.tree.setGeometry(10, 80, self.width() - 20, self.height() - 180)
+        self.tree.selectionModel().currentRowChanged.connect(self.previewMember)
+
+        # Preview of the current member
+        self.preview = QPlainTextEdit(self)
+        self.preview.setReadOnly(True)
+        self.preview.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+        self.preview.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+        self.preview.setPlaceholderText("Select a file to preview it")
+
+        splitter = QSplitter(Qt.Orientation.Horizontal, self)
+        splitter.addWidget(self.tree)
+        splitter.addWidget(self.preview)
+        splitter.setStretchFactor(0, 3)
+        splitter.setStretchFactor(1, 2)
+
+        # Action Buttons
+        bottom_button_layout = QHBoxLayout()  # Layout for bottom buttons
+        bottom_button_layout.addWidget(QPushButton("Extract", self, clicked=self.extractFiles))
+        bottom_button_layout.addWidget(QPushButton("Delete", self, clicked=self.deleteFiles))
+        bottom_button_layout.addWidget(QPushButton("Rename", self, clicked=self.renameFile))
+        bottom_button_layout.addWidget(QPushButton("Encrypt", self, clicked=self.encryptFiles))
+        bottom_button_layout.addWidget(QPushButton("Pause", self, clicked=self.scheduler.pause_all))
+        bottom_button_layout.addWidget(QPushButton("Resume", self, clicked=self.scheduler.resume_all))
+        bottom_button_layout.addWidget(QPushButton("Cancel", self, clicked=self.scheduler.cancel_all))
+
+        # Center the bottom buttons
+        bottom_button_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
+
+        # Progress bar
+        self.progress_bar = QProgressBar(self)
+        self.progress_bar.setGeometry(10, self.height() - 40, 280, 15)  # Adjust position
+
+        # Status label
+        self.status_label = QLabel("Status: No archive selected", self)
+
+        # Layout the main widget
+        main_layout = QVBoxLayout()
+        main_layout.addLayout(top_button_layout)
+        main_layout.addLayout(search_layout)
+        main_layout.addWidget(splitter)
+        main_layout.addLayout(bottom_button_layout)
+        main_layout.addWidget(self.status_label)
+        main_layout.addWidget(self.progress_bar)
+
+        self.setLayout(main_layout)
+
+    def openFile(self):
+        self.archive_filename = QFileDialog.getOpenFileName(
+            self, "Select Archive", "",
+            "All supported archives (*.7z *.zip *.rar *.tar *.gz *.bz2 *.tgz *.tbz2 *.tbz *.txz *.xz);;7z files (*.7z);;Zip files (*.zip);;Rar files (*.rar);;Tar files (*.tar *.tar.gz *.tgz *.tar.bz2 *.tbz2 *.tbz *.tar.xz *.txz);;Gzip files (*.gz);;Bzip2 files (*.bz2);;All files (*.*)"
+        )[0]
+
+        if self.archive_filename:
+            self.populateTree()
+
+    def createNewArchive(self):
+        self.archive_filename = QFileDialog.getSaveFileName(
+            self, "Create New Archive", "",
+            "7z files (*.7z);;Zip files (*.zip);;Rar files (*.rar);;Tar files (*.tar);;Gzip files (*.gz);;Bzip2 files (*.bz2);;All files (*.*)"
+        )[0]
+
+        if self.archive_filename:
+            self.createArchive()
+
+    def createArchive(self):
+        _, extension = os.path.splitext(self.archive_filename)
+        extension = extension[1:].lower()
+
+        try:
+            self.archive_handler = open_archive(self.archive_filename)
+        except ValueError as e:
+            QMessageBox.warning(self, "Error", str(e))
+            return
+
+        if not self.archive_handler.supports_creation:
+            QMessageBox.warning(self, "Error", f"Creation of {extension} archives is not supported.")
+            return
+
+        def created(_):
+            QMessageBox.information(self, "Success", f"New {extension} archive created successfully.")
+            self.populateTree()
+
+        handler = self.archive_handler
+        self.scheduler.submit(
+            self.archive_filename, f"Creating {extension} archive...",
+            lambda job: handler.create_archive(),
+            on_success=created,
+            on_failure=lambda error: QMessageBox.critical(self, "Error", f"Failed to create archive: {error}"),
+            kind="Creating",
+        )
+
+    def populateTree(self):
+        self.model.clear()
+        self.previewMember(QModelIndex())
+        if self.listing_job is not None:
+            # Rows still on their way for the previous listing must not end
+            # up in this one.
+            self.listing_job.cancel()
+        try:
+            self.archive_handler = open_archive(self.archive_filename)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to read archive: {str(e)}")
+            return
+
+        def loaded(count):
+            if handler is self.archive_handler:
+                self.updateStatus(f"Loaded {count} files from archive")
+
+        handler = self.archive_handler
+        self.updateStatus("Loading archive...")
+        self.listing_job = self.scheduler.submit(
+            self.archive_filename, "Loading archive...",
+            functools.partial(self.readListing, handler),
+            on_success=loaded,
+            on_failure=lambda error: QMessageBox.critical(self, "Error", f"Failed to read archive: {error}"),
+            kind="Loading",
+        )
+
+    def readListing(self, handler, job):
+        # Rows reach the model a chunk at a time while the archive is still
+        # being read.
+        count = 0
+        for chunk in handler.file_list_chunks(LISTING_CHUNK_SIZE):
+            job.checkpoint()
+            self.listing_chunk.emit(job, chunk)
+            count += len(chunk)
+        return count
+
+    def appendListing(self, job, chunk):
+        if job is self.listing_job:
+            self.model.append(chunk)
+
+    def previewMember(self, current, previous=None):
+        if self.preview_job is not None:
+            self.preview_job.cancel()
+            self.preview_job = None
+        self.preview.clear()
+        name = self.model.name(current) if current.isValid() else None
+        if name is None or isinstance(self.model.entry(current), DirectoryNode):
+            return
+
+        def read_head(job):
+            # Only the head of the member is decoded, straight into memory.
+            job.checkpoint()
+            with handler.open_member(name) as member:
+                data = member.read(PREVIEW_BYTES + 1)
+            return data
+
+        def shown(data):
+            if job is self.preview_job:
+                self.preview_job = None
+                self.preview.setPlainText(preview_text(data[:PREVIEW_BYTES], len(data) > PREVIEW_BYTES))
+                self.updateStatus(f"Previewing {name}")
+
+        def failed(error):
+            if job is self.preview_job:
+                self.preview_job = None
+                self.preview.setPlainText(f"Cannot preview {name}: {error}")
+
+        handler = self.archive_handler
+        # Previews only read, so they do not wait behind other jobs on the
+        # archive.
+        job = self.preview_job = self.scheduler.submit(
+            self.archive_filename, f"Previewing {name}...", read_head,
+            on_success=shown, on_failure=failed, kind="Previewing", queued=False,
+        )
+
+    def selectMatches(self):
+        query = self.search_edit.text()
+        if not query:
+            return
+        try:
+            matches = self.model.search_index.search(query)
+        except re.error as e:
+            QMessageBox.warning(self, "Error", f"Invalid pattern: {str(e)}")
+            return
+        self.model.check_rows(matches, True)
+        self.updateStatus(f"Selected {len(matches)} file(s) matching {query}")
+
+    def clearSelection(self):
+        self.model.check_rows(list(self.model.table.checked), False)
+        self.updateStatus("Selection cleared")
+
+    def updateStatus(self, message):
+        self.status_label.setText(f"Status: {message}")
+
+    def extractFiles(self):
+        if not self.archive_filename:
+            QMessageBox.warning(self, "Error", "No archive file selected.")
+            return
+
+        selected_files = self.model.table.checked_names()
+
+        if not selected_files:
+            selected_files = [name for name in self.model.table.names if name is not None]
+
+        if not selected_files:
+            QMessageBox.information(self, "Info", "No files to extract.")
+            return
+
+        extract_dir = QFileDialog.getExistingDirectory(
+            self, "Select Extraction Directory", os.path.expanduser("~")
+        )
+
+        if not extract_dir:
+            return
+
+        def extracted(_):
+            self.progress_bar.setValue(0)
+            self.updateStatus(f"Extraction completed. Files extracted to {extract_dir}")
+            QMessageBox.information(
+                self, "Success", f"Extraction completed. Files extracted to {extract_dir}"
+            )
+
+        handler = self.archive_handler
+        self.progress_bar.setValue(0)
+        self.scheduler.submit(
+            self.archive_filename, f"Extracting {len(selected_files)} file(s)...",
+            lambda job: handler.extract_files(selected_files, extract_dir, job),
+            on_success=extracted,
+            on_failure=lambda error: QMessageBox.critical(self, "Error", f"Error during extraction: {error}"),
+            kind="Extracting",
+        )
+
+    def jobStarted(self, job_id, description):
+        # Previews run beside the queued operations and leave the progress
+        # bar to them.
+        job = self.scheduler.jobs.get(job_id)
+        if job is not None and job.queued:
+            self.foreground_job = job_id
+            self.progress_bar.setValue(0)
+            self.updateStatus(description)
+
+    def updateProgressBar(self, job_id, current, total, file):
+        if job_id != self.foreground_job:
+            return
+        if total:
+            self.progress_bar.setValue(int((current / total) * 100))
+        job = self.scheduler.jobs.get(job_id)
+        if job is None:
+            return
+        status = f"{job.kind}: {file}"
+        if job.metrics.rate():
+            status += f" ({job.metrics.rate() / (1024 * 1024):.1f} MB/s"
+            eta = job.metrics.eta()
+            if eta is not None:
+                minutes, seconds = divmod(int(eta), 60)
+                status += f", {minutes}:{seconds:02d} left"
+            status += ")"
+        self.updateStatus(status)
+
+    def jobCancelled(self, job_id):
+        if job_id != self.foreground_job:
+            return
+        self.progress_bar.setValue(0)
+        self.updateStatus("Operation cancelled")
+
+    def deleteFiles(self):
+        if not self.archive_filename:
+            QMessageBox.warning(self, "Error", "No archive file selected.")
+            return
+
+        selected_files = self.model.table.checked_names()
+
+        if not selected_files:
+            QMessageBox.warning(self, "Error", "No files selected for deletion.")
+            return
+
+        if not self.archive_handler.supports_deletion:
+            QMessageBox.warning(
+                self, "Error", "Deletion is not supported for this archive format."
+            )
+            return
+
+        if QMessageBox.question(
+            self,
+            "Confirm Deletion",
+            f"Are you sure you want to delete {len(selected_files)} file(s) from the archive?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+        ) == QMessageBox.StandardButton.Yes:
+            def deleted(_):
+                QMessageBox.information(
+                    self, "Success", f"Successfully deleted {len(selected_files)} file(s) from the archive."
+                )
+                if handler is self.archive_handler:
+                    self.model.remove_members(selected_files)
+
+            handler = self.archive_handler
+            transaction = handler.begin_edit()
+            transaction.delete(selected_files)
+            self.scheduler.submit(
+                self.archive_filename, f"Deleting {len(selected_files)} file(s)...",
+                lambda job: transaction.commit(),
+                on_success=deleted,
+                on_failure=lambda error: QMessageBox.critical(self, "Error", f"Failed to delete files: {error}"),
+                kind="Deleting",
+            )
+
+    def renameFile(self):
+        if not self.archive_filename:
+            QMessageBox.warning(self, "Error", "No archive file selected.")
+            return
+
+        selected_files = [name for name in map(self.model.name, self.tree.selectionModel().selectedRows()) if name is not None]
+        if not selected_files:
+            QMessageBox.warning(self, "Error", "No file selected for renaming.")
+            return
+
+        if not self.archive_handler.supports_renaming:
+            QMessageBox.warning(
+                self, "Error", "Renaming is not supported for this archive format."
+            )
+            return
+
+        transaction = self.archive_handler.begin_edit()
+        skipped_files = 0
+
+        for old_name in selected_files:
+            new_name, ok = QInputDialog.getText(
+                self, "Rename File", f"Enter new name for {old_name}:"
+            )
+
+            if ok and new_name != old_name:
+                try:
+                    transaction.rename(old_name, new_name)
+                except ValueError as e:
+                    QMessageBox.warning(self, "Error", f"Cannot rename {old_name}: {e}")
+                    skipped_files += 1
+            else:
+                skipped_files += 1
+
+        renamed_files = len(transaction)
+        if renamed_files > 0:
+            def renamed(_):
+                QMessageBox.information(
+                    self, "Success", f"Successfully renamed {renamed_files} file(s)."
+                )
+                if handler is self.archive_handler:
+                    self.model.rename_members(renames)
+
+            def failed(error):
+                QMessageBox.critical(self, "Error", f"Failed to rename files: {error}")
+                if handler is self.archive_handler:
+                    self.populateTree()
+
+            handler = self.archive_handler
+            renames = dict(transaction.renames)
+            self.scheduler.submit(
+                self.archive_filename, f"Renaming {renamed_files} file(s)...",
+                lambda job: transaction.commit(),
+                on_success=renamed,
+                on_failure=failed,
+                kind="Renaming",
+            )
+
+        if skipped_files > 0:
+            QMessageBox.information(
+                self, "Information", f"{skipped_files} file(s) were not renamed."
+            )
+
+    def encryptFiles(self):
+        if not self.archive_filename:
+            QMessageBox.warning(self, "Error", "No archive file selected.")
+            return
+
+        if not self.archive_handler.supports_encryption:
+            QMessageBox.warning(
+                self, "Error", "Encryption is not supported for this archive format."
+            )
+            return
+
+        def encrypted(message):
+            QMessageBox.information(self, "Success", message)
+            if handler is self.archive_handler:
+                self.populateTree()
+
+        handler = self.archive_handler
+        selected_files = [name for name in map(self.model.name, self.tree.selectionModel().selectedRows()) if name is not None]
+        if not selected_files:
+            # Encrypt entire archive
+            password, ok = QInputDialog.getText(
+                self, "Encrypt Archive", "Enter master password for the archive:", echo=QLineEdit.EchoMode.Password
+            )
+            if ok:
+                def encrypt_archive(job):
+                    handler.encrypt_archive(password)
+                    LISTING_CACHE.discard(handler.filename)
+                    return "Archive encrypted successfully."
+
+                self.password_manager.set(self.archive_filename, "master_password", password)
+                self.scheduler.submit(
+                    self.archive_filename, "Encrypting archive...",
+                    encrypt_archive,
+                    on_success=encrypted,
+                    on_failure=lambda error: QMessageBox.critical(self, "Error", f"Failed to encrypt archive: {error}"),
+                    kind="Encrypting",
+                )
+        else:
+            # Encrypt selected files
+            files_to_encrypt = {}
+            for file_name in selected_files:
+                password, ok = QInputDialog.getText(
+                    self, "Encrypt File", f"Enter password for {file_name}:", echo=QLineEdit.EchoMode.Password
+                )
+                if ok:
+                    self.password_manager.set(self.archive_filename, file_name, password)
+                    files_to_encrypt[file_name] = password
+
+            if files_to_encrypt:
+                def encrypt_files(job):
+                    transaction.commit()
+                    return f"Successfully encrypted {len(files_to_encrypt)} file(s)."
+
+                transaction = handler.begin_edit()
+                transaction.encrypt(files_to_encrypt)
+                self.scheduler.submit(
+                    self.archive_filename, f"Encrypting {len(files_to_encrypt)} file(s)...",
+                    encrypt_files,
+                    on_success=encrypted,
+                    on_failure=lambda error: QMessageBox.critical(self, "Error", f"Failed to encrypt files: {error}"),
+                    kind="Encrypting",
+                )
+
+    def addFiles(self):
+        if not self.archive_filename:
+            QMessageBox.warning(self, "Error", "No archive file selected. Please create or open an archive first.")
+            return
+
+        if not self.archive_handler.supports_adding:
+            QMessageBox.warning(self, "Error", "Adding files is not supported for this archive format.")
+            return
+
+        files_to_add = QFileDialog.getOpenFileNames(
+            self, "Select Files to Add", "", "All files (*.*)"
+        )[0]
+
+        if files_to_add:
+            def added(_):
+                QMessageBox.information(
+                    self, "Success", f"Successfully added {len(files_to_add)} file(s) to the archive."
+                )
+                if handler is self.archive_handler:
+                    self.populateTree()
+
+            handler = self.archive_handler
+            transaction = handler.begin_edit()
+            transaction.add(files_to_add)
+            self.scheduler.submit(
+                self.archive_filename, f"Adding {len(files_to_add)} file(s)...",
+                lambda job: transaction.commit(),
+                on_success=added,
+                on_failure=lambda error: QMessageBox.critical(self, "Error", f"Failed to add files: {error}"),
+                kind="Adding",
+            )
+
+    def closeEvent(self, event):
+        self.scheduler.shutdown()
+        super().closeEvent(event)
+
+
+def main():
+    app = QApplication(sys.argv)
+    ex = MainWindow()
+    ex.show()
+    return app.exec()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
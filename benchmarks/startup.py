@@ -0,0 +1,106 @@
+# Cold-start benchmark: times fresh interpreters importing arc and running
+# the CLI against small archives of each format, and reports which backend
+# modules each run ended up loading.
+#
+#   python benchmarks/startup.py [-n RUNS] [--json results.jsonl] [--budget-ms MS]
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+import zipfile
+import tarfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKENDS = ('py7zr', 'rarfile', 'tarfile', 'multiprocessing', 'keyring', 'PyQt6')
+PROBE = (
+    "import sys, arc\n"
+    "if len(sys.argv) > 1: arc.list_archive(sys.argv[1])\n"
+    "print(','.join(m for m in {backends!r} if m in sys.modules))\n"
+)
+
+
+def make_archives(directory):
+    sample = os.path.join(directory, 'sample.txt')
+    with open(sample, 'w') as f:
+        f.write('startup benchmark\n' * 100)
+    archives = {}
+    archives['zip'] = os.path.join(directory, 'sample.zip')
+    with zipfile.ZipFile(archives['zip'], 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.write(sample, 'sample.txt')
+    archives['tar.gz'] = os.path.join(directory, 'sample.tar.gz')
+    with tarfile.open(archives['tar.gz'], 'w:gz') as archive:
+        archive.add(sample, 'sample.txt')
+    try:
+        import py7zr
+    except ImportError:
+        pass
+    else:
+        archives['7z'] = os.path.join(directory, 'sample.7z')
+        with py7zr.SevenZipFile(archives['7z'], 'w') as archive:
+            archive.write(sample, 'sample.txt')
+    return archives
+
+
+def time_command(command, env, runs):
+    # One untimed run first so the bytecode cache is in place.
+    subprocess.run(command, env=env, check=True, capture_output=True)
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, env=env, check=True, capture_output=True)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time arc's cold start.")
+    parser.add_argument('-n', '--runs', type=int, default=10)
+    parser.add_argument('--json', help="append the results as one JSON line to this file")
+    parser.add_argument('--budget-ms', type=float, help="exit 1 when a CLI median is slower than this")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, XDG_CACHE_HOME=os.path.join(directory, 'cache'), QT_QPA_PLATFORM='offscreen')
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+        env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+        archives = make_archives(directory)
+        probe = PROBE.format(backends=BACKENDS)
+        scenarios = [('python (baseline)', [sys.executable, '-c', 'pass'], None),
+                     ('import arc', [sys.executable, '-c', 'import arc'], [sys.executable, '-c', probe])]
+        for name, path in archives.items():
+            scenarios.append((f'arc list {name}', [sys.executable, os.path.join(ROOT, 'arc.py'), 'list', path],
+                              [sys.executable, '-c', probe, path]))
+        scenarios.append(('import arc_gui', [sys.executable, '-c', 'import arc_gui'], None))
+
+        results = {}
+        status = 0
+        for name, command, probe_command in scenarios:
+            try:
+                timings = time_command(command, env, args.runs)
+            except subprocess.CalledProcessError as e:
+                print(f"{name:<22} failed: {e.stderr.decode(errors='replace').strip().splitlines()[-1:]}")
+                continue
+            loaded = ''
+            if probe_command is not None:
+                # With an empty listing cache, so the archive is really opened.
+                probe_env = dict(env, XDG_CACHE_HOME=tempfile.mkdtemp(dir=directory))
+                loaded = subprocess.run(probe_command, env=probe_env, check=True, capture_output=True,
+                                        text=True).stdout.strip()
+            median = statistics.median(timings)
+            results[name] = {'median_ms': median, 'min_ms': min(timings), 'loaded': loaded}
+            print(f"{name:<22} median {median:7.1f} ms  min {min(timings):7.1f} ms  loaded: {loaded or '-'}")
+            if args.budget_ms and name.startswith('arc list') and median > args.budget_ms:
+                status = 1
+
+    if args.json:
+        with open(args.json, 'a') as f:
+            f.write(json.dumps({'time': time.time(), 'python': sys.version.split()[0], 'results': results}) + '\n')
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+py7zr = pytest.importorskip('py7zr')
+
+import arc_7z
+
+
+def make_files(directory):
+    files = {}
+    for index in range(6):
+        name = f'file{index}.txt'
+        data = (b'line %d of a text file\n' % index) * (20000 * (index + 1))
+        (directory / name).write_bytes(data)
+        files[name] = data
+    (directory / 'random.bin').write_bytes(os.urandom(300000))
+    files['random.bin'] = (directory / 'random.bin').read_bytes()
+    (directory / 'empty.txt').write_bytes(b'')
+    files['empty.txt'] = b''
+    return files
+
+
+def check_archive(path, files, out):
+    with py7zr.SevenZipFile(path, 'r') as archive:
+        assert archive.testzip() is None
+    with py7zr.SevenZipFile(path, 'r') as archive:
+        archive.extractall(path=out)
+    assert {name: (out / name).read_bytes() for name in os.listdir(out)} == files
+
+
+@pytest.mark.parametrize('supported', [True, False])
+def test_append_blocks_round_trip(tmp_path, monkeypatch, supported):
+    if not supported:
+        monkeypatch.setattr(arc_7z, 'PY7ZR_TESTED', ((0, 0), (0, 0)))
+    source = tmp_path / 'source'
+    source.mkdir()
+    files = make_files(source)
+    path = tmp_path / 'out.7z'
+    names = sorted(files)
+    first, second = names[:4], names[4:]
+    with py7zr.SevenZipFile(path, 'w') as archive:
+        assert arc_7z.append_blocks_supported(archive) == supported
+        arc_7z.append_blocks(archive, [str(source / name) for name in first], first, 3, block_size=100000)
+    check_archive(path, {name: files[name] for name in first}, tmp_path / 'first')
+    with py7zr.SevenZipFile(path, 'a') as archive:
+        arc_7z.append_blocks(archive, [str(source / name) for name in second], second, 3,
+                             arc_7z.SevenZipHandler.compression, block_size=100000)
+    check_archive(path, files, tmp_path / 'second')
+
+
+def test_handler_add_files(tmp_path):
+    source = tmp_path / 'source'
+    source.mkdir()
+    files = make_files(source)
+    path = str(tmp_path / 'handler.7z')
+    handler = arc_7z.SevenZipHandler(path)
+    handler.create_archive()
+    handler.add_files([str(source / name) for name in sorted(files)])
+    check_archive(path, files, tmp_path / 'out')
@@ -0,0 +1,97 @@
+import zipfile
+
+import pytest
+
+import arc
+
+
+FILES = {'a.txt': b'alpha', 'b.txt': b'beta', 'c.txt': b'gamma'}
+
+
+@pytest.fixture
+def handler(tmp_path):
+    path = tmp_path / 'test.zip'
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in FILES.items():
+            archive.writestr(name, data)
+    return arc.ZipHandler(str(path))
+
+
+def contents(handler):
+    with zipfile.ZipFile(handler.filename) as archive:
+        assert len(archive.namelist()) == len(set(archive.namelist()))
+        return {item.filename: archive.read(item) for item in archive.infolist()}
+
+
+def new_file(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_mixed_batch(handler, tmp_path):
+    transaction = handler.begin_edit()
+    transaction.rename('a.txt', 'x.txt')
+    transaction.rename('x.txt', 'y.txt')
+    transaction.delete(['b.txt'])
+    transaction.add([new_file(tmp_path, 'd.txt', b'delta')])
+    transaction.rename('c.txt', 'b.txt')
+    transaction.rename('d.txt', 'e.txt')
+    assert transaction.renames == {'a.txt': 'y.txt', 'c.txt': 'b.txt'}
+    transaction.commit()
+    assert contents(handler) == {'y.txt': b'alpha', 'b.txt': b'gamma', 'e.txt': b'delta'}
+    assert len(transaction) == 0
+
+
+def test_rename_back_cancels(handler):
+    transaction = handler.begin_edit()
+    transaction.rename('a.txt', 'x.txt')
+    transaction.rename('x.txt', 'a.txt')
+    assert len(transaction) == 0
+    transaction.rename('a.txt', 'x.txt')
+    transaction.rename('b.txt', 'a.txt')
+    assert transaction.renames == {'a.txt': 'x.txt', 'b.txt': 'a.txt'}
+
+
+def test_rename_collisions(handler, tmp_path):
+    transaction = handler.begin_edit()
+    with pytest.raises(ValueError, match='already exists'):
+        transaction.rename('a.txt', 'b.txt')
+    transaction.rename('a.txt', 'x.txt')
+    with pytest.raises(ValueError, match='already exists'):
+        transaction.rename('c.txt', 'x.txt')
+    transaction.add([new_file(tmp_path, 'd.txt', b'delta')])
+    with pytest.raises(ValueError, match='already exists'):
+        transaction.rename('c.txt', 'd.txt')
+    with pytest.raises(ValueError, match='already exists'):
+        transaction.rename('d.txt', 'b.txt')
+    assert transaction.renames == {'a.txt': 'x.txt'}
+    assert transaction.arcnames == ['d.txt']
+
+
+def test_delete_drops_queued_add(handler, tmp_path):
+    transaction = handler.begin_edit()
+    transaction.add([new_file(tmp_path, 'd.txt', b'delta'), new_file(tmp_path, 'e.txt', b'epsilon')])
+    transaction.delete(['d.txt'])
+    assert transaction.arcnames == ['e.txt']
+    assert transaction.files_to_delete == set()
+    transaction.commit()
+    assert contents(handler) == dict(FILES, **{'e.txt': b'epsilon'})
+
+
+def test_delete_of_replaced_member(handler, tmp_path):
+    # sync() replaces a member by deleting it and adding the new copy.
+    transaction = handler.begin_edit()
+    transaction.delete(['a.txt'])
+    transaction.add([new_file(tmp_path, 'a.txt', b'new alpha')])
+    transaction.commit()
+    assert contents(handler) == dict(FILES, **{'a.txt': b'new alpha'})
+
+    transaction = handler.begin_edit()
+    transaction.rename('b.txt', 'x.txt')
+    transaction.encrypt({'x.txt': 'secret'})
+    transaction.delete(['x.txt'])
+    assert transaction.files_to_delete == {'b.txt'}
+    assert transaction.renames == {} and transaction.passwords == {}
+    transaction.commit()
+    assert contents(handler) == {'c.txt': b'gamma', 'a.txt': b'new alpha'}
@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+import arc
+
+
+@pytest.mark.parametrize('source, expected', [
+    ('x.tar.gz', 'x.zip'), ('x.tgz', 'x.zip'), ('x.tar.bz2', 'x.zip'), ('x.tbz2', 'x.zip'), ('x.tbz', 'x.zip'),
+    ('x.tar.xz', 'x.zip'), ('x.txz', 'x.zip'), ('X.TAR.GZ', 'X.zip'), ('x.tar', 'x.zip'), ('x.7z', 'x.zip'),
+    ('notes.txt.gz', 'notes.txt.zip'), ('x.v1.rar', 'x.v1.zip'), ('.tar.gz', '.tar.zip'), ('plain', 'plain.zip'),
+])
+def test_conversion_target(source, expected):
+    assert conversion_name(source) == expected
+
+
+def conversion_name(source):
+    return os.path.basename(arc.conversion_target(os.path.join('dir', source), 'zip'))
+
+
+def test_conversion_target_directory():
+    assert arc.conversion_target('dir/x.tar.gz', '7z', 'out') == os.path.join('out', 'x.7z')
+
+
+def test_convert_offers_only_creatable_formats(tmp_path):
+    for extension in arc.ARCHIVE_HANDLERS:
+        handler = arc.ARCHIVE_HANDLERS[extension](str(tmp_path / f'x.{extension}'))
+        assert handler.supports_creation == (extension in arc.ARCHIVE_HANDLERS.creatable)
+    with pytest.raises(SystemExit):
+        arc.build_parser().parse_args(['convert', 'x.zip', '-t', 'tar'])
+    assert arc.build_parser().parse_args(['convert', 'x.tar.gz', '-t', '7z']).to == '7z'
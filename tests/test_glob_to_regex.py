@@ -0,0 +1,48 @@
+import fnmatch
+import itertools
+import random
+import re
+import warnings
+
+import pytest
+
+import arc
+
+
+NAMES = ['', 'a', 'b', 'z', '-', '!', '^', '[', ']', '\\', '&', '~', '|', 'ab', 'a]', '[]', 'a-b', 'x&&y', 'dir/file.txt',
+         'dir/file.TXT']
+PATTERNS = ['*', '?', '*.txt', 'dir/*', '[ab]', '[!ab]', '[]]', '[!]]', '[]a]', '[a-c]', '[c-a]', '[a-]', '[-a]',
+            '[!-a]', '[^a]', '[!^]', '[\\]', '[a\\-z]', '[', '[!', '[a', 'a[', '[[]', '[![]', '[a[]', '[[a]', '[a[b]]',
+            '[&&]', '[a&&b]', '[~~]', '[||]', '[--]', '[a--]', '[!--]', '[a-c--z]', '[z-a-c]', '[%--]', '*[[]*',
+            '[[:alpha:]]', '[[=a=]]', '[[.a.]]']
+
+
+def anchored(pattern):
+    return re.compile('^' + arc.glob_to_regex(pattern) + '$')
+
+
+@pytest.mark.parametrize('pattern', PATTERNS)
+def test_matches_fnmatch(pattern):
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        regex = anchored(pattern)
+    for name in NAMES:
+        assert bool(regex.match(name)) == fnmatch.fnmatchcase(name, pattern), (pattern, name)
+
+
+def test_random_patterns_match_fnmatch():
+    rng = random.Random(13)
+    alphabet = 'ab-![]^\\&~|*?'
+    for _ in range(5000):
+        pattern = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 8)))
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            regex = anchored(pattern)
+        for length in range(3):
+            for name in map(''.join, itertools.product('a-[]!', repeat=length)):
+                assert bool(regex.match(name)) == fnmatch.fnmatchcase(name, pattern), (pattern, name)
+
+
+@pytest.mark.parametrize('pattern', ['*', '?', '[!a]', '[!c-d]'])
+def test_wildcards_stay_on_one_line(pattern):
+    assert not anchored(pattern + 'b').match('a\nb')
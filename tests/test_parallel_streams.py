@@ -0,0 +1,99 @@
+import bz2
+import errno
+import gzip
+import io
+import os
+
+import pytest
+
+import arc
+
+
+def chunks(count=4):
+    return [os.urandom(1000) + (b'line %d\n' % i) * 20000 for i in range(count)]
+
+
+def decompress(handler_class, path, workers):
+    handler = handler_class(str(path))
+    handler.parallel_workers = workers
+    f_out = io.BytesIO()
+    handler.decompress_into(f_out, arc.transfer_metrics(None))
+    return f_out.getvalue()
+
+
+def outcome(handler_class, path, workers):
+    try:
+        return decompress(handler_class, path, workers)
+    except (OSError, EOFError, ValueError) as e:
+        return type(e)
+
+
+CODECS = [(arc.GzipHandler, 'test.gz', gzip.compress), (arc.Bzip2Handler, 'test.bz2', bz2.compress)]
+
+
+@pytest.mark.parametrize('handler_class, name, compress', CODECS)
+def test_multi_member(tmp_path, handler_class, name, compress):
+    data = chunks()
+    path = tmp_path / name
+    path.write_bytes(b''.join(compress(chunk) for chunk in data))
+    assert decompress(handler_class, path, 4) == b''.join(data)
+    f_out = io.BytesIO()
+    handler_class(str(path)).extract_parallel(f_out, arc.transfer_metrics(None), 4)
+    assert f_out.getvalue() == b''.join(data)
+
+
+@pytest.mark.parametrize('handler_class, name, compress', CODECS)
+def test_corrupt_member(tmp_path, handler_class, name, compress):
+    members = [compress(chunk) for chunk in chunks()]
+    damaged = bytearray(members[2])
+    damaged[len(damaged) // 2] ^= 0xFF
+    members[2] = bytes(damaged)
+    path = tmp_path / name
+    path.write_bytes(b''.join(members))
+    with pytest.raises((OSError, EOFError, ValueError)):
+        decompress(handler_class, path, 1)
+    assert outcome(handler_class, path, 4) == outcome(handler_class, path, 1)
+
+
+@pytest.mark.parametrize('garbage', [b'\x00' * 100, b'not compressed data' * 10])
+@pytest.mark.parametrize('handler_class, name, compress', CODECS)
+def test_trailing_garbage(tmp_path, handler_class, name, compress, garbage):
+    data = chunks()
+    path = tmp_path / name
+    path.write_bytes(b''.join(compress(chunk) for chunk in data) + garbage)
+    assert outcome(handler_class, path, 4) == outcome(handler_class, path, 1)
+
+
+class FullDisk(io.RawIOBase):
+    def writable(self):
+        return True
+
+    def write(self, data):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+
+@pytest.mark.parametrize('handler_class, name, compress', CODECS)
+def test_write_errors_are_not_retried(tmp_path, handler_class, name, compress):
+    path = tmp_path / name
+    path.write_bytes(b''.join(compress(chunk) for chunk in chunks()))
+    handler = handler_class(str(path))
+    handler.parallel_workers = 4
+    with pytest.raises(OSError) as error:
+        # A fallback to the serial decoder would have to seek back first.
+        handler.decompress_into(FullDisk(), arc.transfer_metrics(None))
+    assert error.value.errno == errno.ENOSPC
+
+
+def test_ordered_parallel_map_bounds_in_flight():
+    running = []
+    consumed = []
+
+    def work(item):
+        running.append(item)
+        return item
+
+    results = arc.ordered_parallel_map(work, range(20), 3, ahead=3)
+    for result in results:
+        consumed.append(result)
+        assert len(running) <= len(consumed) + 3
+    assert consumed == list(range(20))
@@ -0,0 +1,73 @@
+import bz2
+import os
+import struct
+import zlib
+
+import pytest
+
+import arc
+
+
+PAYLOAD = b'some payload\n' * 1000
+
+
+def write_gzip(path, name=b''):
+    # FNAME is written as given, path and all, the way other tools may.
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    with open(path, 'wb') as f:
+        f.write(b'\x1f\x8b\x08' + (b'\x08' if name else b'\x00') + b'\x00' * 4 + b'\x00\x03')
+        if name:
+            f.write(name + b'\x00')
+        f.write(compressor.compress(PAYLOAD) + compressor.flush())
+        f.write(struct.pack('<II', zlib.crc32(PAYLOAD), len(PAYLOAD)))
+
+
+@pytest.mark.parametrize('filename, expected', [
+    ('notes.txt.gz', 'notes.txt'),
+    ('NOTES.TXT.GZ', 'NOTES.TXT'),
+    ('backup.tgz', 'backup.tar'),
+    ('payload.bin', 'payload.bin.out'),
+    ('logs.gz.1', 'logs.gz.1.out'),
+    ('.gz', '.gz.out'),
+])
+def test_gzip_member_named_from_filename(tmp_path, filename, expected):
+    path = tmp_path / filename
+    write_gzip(path)
+    handler = arc.GzipHandler(str(path))
+    assert handler.get_file_list()[0][0] == expected
+    with handler.open_member(expected) as f:
+        assert f.read() == PAYLOAD
+    with pytest.raises(KeyError):
+        handler.open_member(filename)
+
+
+def test_gzip_member_named_from_header(tmp_path):
+    path = tmp_path / 'payload.bin'
+    write_gzip(path, name=b'../report.csv')
+    handler = arc.GzipHandler(str(path))
+    assert handler.get_file_list()[0][0] == 'report.csv'
+    out = tmp_path / 'out'
+    out.mkdir()
+    handler.extract_files(['report.csv'], str(out), None)
+    assert os.listdir(out) == ['report.csv']
+    assert (out / 'report.csv').read_bytes() == PAYLOAD
+
+
+@pytest.mark.parametrize('filename, expected', [
+    ('notes.txt.bz2', 'notes.txt'),
+    ('backup.tbz2', 'backup.tar'),
+    ('backup.tbz', 'backup.tar'),
+    ('payload.bin', 'payload.bin.out'),
+    ('logs.bz2.1', 'logs.bz2.1.out'),
+])
+def test_bzip2_member_named_from_filename(tmp_path, filename, expected):
+    path = tmp_path / filename
+    path.write_bytes(bz2.compress(PAYLOAD))
+    handler = arc.Bzip2Handler(str(path))
+    assert handler.get_file_list()[0][0] == expected
+    out = tmp_path / 'out'
+    out.mkdir()
+    handler.extract_files([expected], str(out), None)
+    assert (out / expected).read_bytes() == PAYLOAD
+    with pytest.raises(KeyError):
+        handler.extract_files([filename], str(out), None)
@@ -0,0 +1,66 @@
+import os
+import time
+
+import pytest
+
+import arc
+
+
+def make_tree(root):
+    (root / 'docs').mkdir(parents=True)
+    (root / 'docs' / 'a.txt').write_bytes(b'alpha' * 100)
+    (root / 'b.txt').write_bytes(b'beta')
+    (root / 'c.txt').write_bytes(b'gamma')
+    (root / 'empty').mkdir()
+    (root / 'nested' / 'inner').mkdir(parents=True)
+
+
+def member_names(path):
+    return sorted(name.rstrip('/') for name, *_ in arc.open_archive(str(path)).get_file_list())
+
+
+@pytest.mark.parametrize('name', ['test.zip', 'test.7z'])
+def test_sync_plan(tmp_path, name):
+    source = tmp_path / 'source'
+    make_tree(source)
+    path = tmp_path / name
+
+    plan = arc.sync_archive(str(path), str(source))
+    assert sorted(arcname for _, arcname in plan.added) == ['b.txt', 'c.txt', 'docs/a.txt', 'empty',
+                                                             'nested/inner']
+    assert plan.replaced == plan.removed == plan.unchanged == []
+    assert member_names(path) == ['b.txt', 'c.txt', 'docs/a.txt', 'empty', 'nested/inner']
+
+    plan = arc.plan_sync(arc.open_archive(str(path)), str(source))
+    assert plan.added == plan.replaced == plan.removed == []
+
+    (source / 'b.txt').write_bytes(b'beta, longer now')
+    # Same bytes, newer mtime: found unchanged by its CRC.
+    later = time.time() + 3600
+    os.utime(source / 'c.txt', (later, later))
+    (source / 'docs' / 'a.txt').unlink()
+    (source / 'docs' / 'new.txt').write_bytes(b'new')
+    (source / 'empty').rmdir()
+    (source / 'nested' / 'inner' / 'file.txt').write_bytes(b'inside')
+
+    plan = arc.sync_archive(str(path), str(source))
+    assert sorted(arcname for _, arcname in plan.added) == ['docs/new.txt', 'nested/inner/file.txt']
+    assert [arcname for _, arcname in plan.replaced] == ['b.txt']
+    # A directory's own member stays for as long as the directory does.
+    assert sorted(name.rstrip('/') for name in plan.removed) == ['docs/a.txt', 'empty']
+    assert 'c.txt' in plan.unchanged
+    assert member_names(path) == ['b.txt', 'c.txt', 'docs/new.txt', 'nested/inner', 'nested/inner/file.txt']
+    with arc.open_archive(str(path)).open_member('b.txt') as member:
+        assert member.read() == b'beta, longer now'
+
+
+def test_dry_run_leaves_archive_alone(tmp_path):
+    source = tmp_path / 'source'
+    make_tree(source)
+    path = tmp_path / 'test.zip'
+    arc.sync_archive(str(path), str(source))
+    before = path.read_bytes()
+    (source / 'd.txt').write_bytes(b'delta')
+    plan = arc.sync_archive(str(path), str(source), dry_run=True)
+    assert [arcname for _, arcname in plan.added] == ['d.txt']
+    assert path.read_bytes() == before
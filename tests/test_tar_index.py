@@ -0,0 +1,93 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import tarfile
+
+import pytest
+
+import arc
+
+
+FILES = {f'dir/file{i}.bin': os.urandom(1000) + bytes([i]) * 60000 for i in range(12)}
+
+
+def tar_bytes():
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as archive:
+        for name, data in FILES.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def pieces(data, size):
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+# Multi-member gzip (as bgzip writes) and one bzip2 stream per block both
+# have restart points all through the file.
+COMPRESSED = {
+    'test.tar.gz': lambda data: b''.join(gzip.compress(piece) for piece in pieces(data, 100000)),
+    'test.tar.bz2': lambda data: b''.join(bz2.compress(piece) for piece in pieces(data, 100000)),
+}
+UNINDEXED = {
+    'test.tar': lambda data: data,
+    'test.tar.xz': lzma.compress,
+}
+
+
+@pytest.fixture(autouse=True)
+def index_dir(tmp_path, monkeypatch):
+    directory = tmp_path / 'cache'
+    monkeypatch.setattr(arc, 'TAR_INDEX_DIR', str(directory))
+    return directory
+
+
+@pytest.mark.parametrize('name', sorted(COMPRESSED))
+def test_index_is_kept_in_cache(tmp_path, index_dir, monkeypatch, name):
+    path = tmp_path / name
+    path.write_bytes(COMPRESSED[name](tar_bytes()))
+    handler = arc.TarHandler(str(path))
+    assert [member[:2] for member in handler.get_file_list()] == [(member, len(data)) for member, data in FILES.items()]
+    assert sorted(os.listdir(tmp_path)) == sorted(['cache', name])
+    assert [entry.name for entry in index_dir.iterdir()] == [os.path.basename(handler.index_filename)]
+    assert len(handler.index['checkpoints']) > 1
+
+    def rebuilt(stat):
+        raise AssertionError("index rebuilt")
+    reopened = arc.TarHandler(str(path))
+    monkeypatch.setattr(reopened, 'build_index', rebuilt)
+    assert reopened.get_file_list() == handler.get_file_list()
+
+
+@pytest.mark.parametrize('name', sorted(COMPRESSED))
+def test_restart_extraction(tmp_path, name):
+    path = tmp_path / name
+    path.write_bytes(COMPRESSED[name](tar_bytes()))
+    arc.TarHandler(str(path)).get_file_list()
+    handler = arc.TarHandler(str(path))
+    last = list(FILES)[-1]
+    offset = next(member[2] for member in handler.load_index()['members'] if member[0] == last)
+    start, _ = handler.restart_point(offset)
+    assert 0 < start <= offset
+    with handler.open_member(last) as member:
+        assert member.read() == FILES[last]
+    handler.extract_files([last, 'dir/file3.bin'], str(tmp_path / 'out'), None)
+    assert (tmp_path / 'out' / last).read_bytes() == FILES[last]
+    assert (tmp_path / 'out' / 'dir' / 'file3.bin').read_bytes() == FILES['dir/file3.bin']
+
+
+@pytest.mark.parametrize('name', sorted(UNINDEXED))
+def test_no_index_without_restart_points(tmp_path, index_dir, name):
+    path = tmp_path / name
+    path.write_bytes(UNINDEXED[name](tar_bytes()))
+    handler = arc.TarHandler(str(path))
+    assert len(handler.get_file_list()) == len(FILES)
+    last = list(FILES)[-1]
+    with handler.open_member(last) as member:
+        assert member.read() == FILES[last]
+    assert not index_dir.exists()
+    assert os.listdir(tmp_path) == [name]
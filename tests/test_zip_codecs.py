@@ -0,0 +1,30 @@
+import os
+import zipfile
+
+import pytest
+
+import arc
+
+
+@pytest.mark.parametrize('codecs', [(('deflate', 1),), (('deflate', 9),), (('bzip2', 9),), (('lzma', 0),),
+                                    (('lzma', 9),)])
+def test_policy_codecs_round_trip(tmp_path, codecs):
+    files = {'text.txt': b'a line of text\n' * 20000, 'random.bin': os.urandom(100000), 'empty': b''}
+    for name, data in files.items():
+        (tmp_path / name).write_bytes(data)
+    compression = arc.CompressionPolicy(codecs=codecs)
+    added = tmp_path / 'added.zip'
+    handler = arc.ZipHandler(str(added))
+    handler.compression = compression
+    handler.create_archive()
+    handler.add_files([str(tmp_path / name) for name in files], list(files))
+    converted = tmp_path / 'converted.zip'
+    writer = arc.ZipHandler(str(converted))
+    writer.compression = compression
+    writer.write_members(arc.ZipHandler(str(added)).read_members())
+    for path in (added, converted):
+        with zipfile.ZipFile(path) as archive:
+            assert archive.testzip() is None
+            assert {item.filename: archive.read(item) for item in archive.infolist()} == files
+            assert archive.getinfo('text.txt').compress_type == arc.ZIP_CODECS[codecs[0][0]]
+            assert archive.getinfo('random.bin').compress_type == zipfile.ZIP_STORED
@@ -0,0 +1,91 @@
+import os
+import shutil
+import zipfile
+
+import pytest
+
+import arc
+
+
+def make_zip(path, files):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+
+
+def interrupted_edit(monkeypatch, handler, cut, **edit):
+    # Runs an in-place edit that "crashes" after `cut` bytes of its journal
+    # have reached the archive.
+    journals = []
+    monkeypatch.setattr(handler, 'write_journal', lambda writes, length: journals.append((writes, length)))
+    assert handler.edit_in_place(**edit)
+    monkeypatch.undo()
+    writes, length = journals[0]
+    handler.write_journal(writes, length)
+    with open(handler.filename, 'r+b') as target:
+        for offset, data in writes:
+            target.seek(offset)
+            target.write(data[:cut])
+            cut -= min(cut, len(data))
+
+
+@pytest.mark.parametrize('cut', [0, 3, 40, 10 ** 6])
+def test_crashed_edit_is_finished_by_next_write(tmp_path, monkeypatch, cut):
+    files = {'a.txt': b'alpha' * 100, 'b.txt': b'beta' * 100, 'c.txt': b'gamma' * 100}
+    path = tmp_path / 'test.zip'
+    make_zip(path, files)
+    handler = arc.ZipHandler(str(path))
+    interrupted_edit(monkeypatch, handler, cut, files_to_delete={'c.txt'}, renames={'a.txt': 'x.txt'})
+    assert os.path.exists(handler.journal_filename)
+
+    (tmp_path / 'd.txt').write_bytes(b'delta')
+    arc.ZipHandler(str(path)).add_files([str(tmp_path / 'd.txt')])
+    assert not os.path.exists(handler.journal_filename)
+    with zipfile.ZipFile(path) as archive:
+        assert archive.testzip() is None
+        assert {item.filename: archive.read(item) for item in archive.infolist()} == {
+            'x.txt': files['a.txt'], 'b.txt': files['b.txt'], 'd.txt': b'delta'}
+
+
+def test_stale_journal_is_dropped(tmp_path, monkeypatch):
+    files = {'a.txt': b'alpha' * 100, 'b.txt': b'beta' * 100}
+    path = tmp_path / 'test.zip'
+    make_zip(path, files)
+    backup = tmp_path / 'backup.zip'
+    shutil.copy(path, backup)
+    handler = arc.ZipHandler(str(path))
+    interrupted_edit(monkeypatch, handler, 0, files_to_delete={'b.txt'})
+    # The user restores another copy before anything writes to the archive.
+    other = {'a.txt': b'other' * 100, 'b.txt': b'files' * 100}
+    make_zip(path, other)
+    restored = path.read_bytes()
+
+    arc.ZipHandler(str(path)).rewrite(renames={'a.txt': 'y.txt'})
+    assert not os.path.exists(handler.journal_filename)
+    with zipfile.ZipFile(path) as archive:
+        assert {item.filename: archive.read(item) for item in archive.infolist()} == {
+            'y.txt': other['a.txt'], 'b.txt': other['b.txt']}
+
+    make_zip(path, other)
+    assert path.read_bytes() == restored
+    with open(handler.journal_filename, 'w') as f:
+        f.write('{"writes": [[0, ""]], "length": 0}')
+    arc.ZipHandler(str(path)).recover_journal()
+    assert path.read_bytes() == restored
+    assert not os.path.exists(handler.journal_filename)
+
+
+def test_reads_leave_journal_alone(tmp_path, monkeypatch):
+    files = {'a.txt': b'alpha' * 100, 'b.txt': b'beta' * 100}
+    path = tmp_path / 'test.zip'
+    make_zip(path, files)
+    handler = arc.ZipHandler(str(path))
+    interrupted_edit(monkeypatch, handler, 0, renames={'a.txt': 'z.txt'})
+    before = path.read_bytes()
+    os.chmod(path, 0o444)
+    try:
+        assert [name for name, *_ in arc.ZipHandler(str(path)).get_file_list()] == ['a.txt', 'b.txt']
+    finally:
+        os.chmod(path, 0o644)
+    assert path.read_bytes() == before
+    assert os.path.exists(handler.journal_filename)
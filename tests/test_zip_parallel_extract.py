@@ -0,0 +1,50 @@
+import os
+import zipfile
+
+import pytest
+
+import arc
+
+
+def make_zip(tmp_path, count=12):
+    files = {f'dir{i % 3}/file{i}.bin': os.urandom(2000 * (i + 1)) + b'x' * 50000 for i in range(count)}
+    path = tmp_path / 'test.zip'
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return path, files
+
+
+@pytest.mark.parametrize('pool', ['thread', 'process'])
+def test_parallel_extract(tmp_path, monkeypatch, pool):
+    path, files = make_zip(tmp_path)
+    monkeypatch.setattr(arc, 'PARALLEL_EXTRACT_MIN_BYTES', 0)
+    monkeypatch.setattr(arc, 'PROCESS_EXTRACT_MIN_BYTES', 0)
+    handler = arc.ZipHandler(str(path))
+    handler.extract_pool = pool
+    handler.extract_workers = 3
+    for run in range(2):
+        out = tmp_path / f'{pool}{run}'
+        handler.extract_files(list(files), str(out), None)
+        for name, data in files.items():
+            assert (out / name).read_bytes() == data
+
+
+def test_small_selections_use_threads(tmp_path, monkeypatch):
+    path, files = make_zip(tmp_path)
+    monkeypatch.setattr(arc, 'PARALLEL_EXTRACT_MIN_BYTES', 0)
+    kinds = []
+    real_pool = arc.extract_pool
+    monkeypatch.setattr(arc, 'extract_pool', lambda kind, workers: kinds.append(kind) or real_pool(kind, workers))
+    handler = arc.ZipHandler(str(path))
+    handler.extract_pool = 'process'
+    handler.extract_workers = 2
+    handler.extract_files(list(files), str(tmp_path / 'out'), None)
+    assert kinds == ['thread']
+
+
+def test_pools_are_reused():
+    executor, manager = arc.extract_pool('thread', 2)
+    assert manager is None
+    assert arc.extract_pool('thread', 1)[0] is executor
+    assert arc.extract_pool('thread', 2)[0] is executor
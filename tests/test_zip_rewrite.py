@@ -0,0 +1,77 @@
+import os
+import zipfile
+
+import pytest
+
+import arc
+
+
+FILES = {'a.txt': b'alpha\n' * 5000, 'dir/b.bin': os.urandom(50000), 'c.txt': b'', 'd.txt': b'delta' * 10}
+
+
+def make_zip(path, compression=zipfile.ZIP_DEFLATED):
+    with zipfile.ZipFile(path, 'w', compression) as archive:
+        archive.writestr('dir/', b'')
+        for name, data in FILES.items():
+            archive.writestr(name, data)
+
+
+def contents(path, pwd=None):
+    with zipfile.ZipFile(path) as archive:
+        if pwd is not None:
+            archive.setpassword(pwd)
+        assert archive.testzip() is None
+        return {item.filename: archive.read(item) for item in archive.infolist() if not item.is_dir()}
+
+
+@pytest.mark.parametrize('compression', [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED, zipfile.ZIP_BZIP2,
+                                         zipfile.ZIP_LZMA])
+def test_rewrite_copies_members_raw(tmp_path, compression):
+    path = tmp_path / 'test.zip'
+    make_zip(path, compression)
+    handler = arc.ZipHandler(str(path))
+    handler.in_place = False
+    handler.rewrite(files_to_delete={'d.txt'}, renames={'a.txt': 'renamed/a.txt'})
+    expected = dict(FILES)
+    expected['renamed/a.txt'] = expected.pop('a.txt')
+    del expected['d.txt']
+    assert contents(path) == expected
+    with zipfile.ZipFile(path) as archive:
+        assert all(item.compress_type == compression for item in archive.infolist() if not item.is_dir())
+
+
+def test_encrypted_members_read_back_with_password(tmp_path):
+    path = tmp_path / 'test.zip'
+    make_zip(path)
+    handler = arc.ZipHandler(str(path))
+    handler.encrypt_files(['a.txt', 'dir/b.bin'], {'a.txt': 'secret', 'dir/b.bin': 'secret'})
+    with zipfile.ZipFile(path) as archive:
+        flags = {item.filename: item.flag_bits & 0x01 for item in archive.infolist()}
+        with pytest.raises(RuntimeError):
+            archive.read('a.txt')
+    assert flags == {'dir/': 0, 'a.txt': 1, 'dir/b.bin': 1, 'c.txt': 0, 'd.txt': 0}
+    assert contents(path, b'secret') == FILES
+
+    arc.ZipHandler(str(path)).encrypt_archive('secret')
+    assert contents(path, b'secret') == FILES
+    with zipfile.ZipFile(path) as archive:
+        assert all(item.flag_bits & 0x01 for item in archive.infolist() if not item.is_dir())
+
+
+def test_large_members_are_not_encrypted(tmp_path, monkeypatch):
+    path = tmp_path / 'test.zip'
+    make_zip(path)
+    before = path.read_bytes()
+    monkeypatch.setattr(arc, 'ZIPCRYPTO_MAX_BYTES', 1000)
+    with pytest.raises(ValueError, match='too large to encrypt'):
+        arc.ZipHandler(str(path)).encrypt_files(['a.txt'], {'a.txt': 'secret'})
+    assert path.read_bytes() == before
+    assert not os.path.exists(str(path) + '.temp')
+    arc.ZipHandler(str(path)).encrypt_files(['d.txt'], {'d.txt': 'secret'})
+    assert contents(path, b'secret') == FILES
+
+
+def test_zip64_for_unknown_and_large_sizes():
+    assert arc.zip64_for(None)
+    assert arc.zip64_for(zipfile.ZIP64_LIMIT)
+    assert not arc.zip64_for(1024)